@@ -1,29 +1,99 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
+import time
 from dotenv import load_dotenv
 import logging
 
-# Import services
-from services.recipe_recommender import RecipeRecommender
-from services.health_analyzer import HealthAnalyzer
-from services.consumption_predictor import ConsumptionPredictor
-from services.personalization_engine import PersonalizationEngine
+# Services are imported by LazyService on first use, keeping NumPy and the catalogue out of startup
+from services.lazy_service import LazyService
+from services.batch_executor import BatchExecutor
+from services.batch_jobs import BatchJobManager, JobQueueFull, JobsUnavailable
+from services.micro_batcher import MicroBatcher
+from services.profile_store import SEGMENT_FIELDS
+from services.result_cache import ResultCache
+from services.json_encoder import create_json_provider
+from services.metrics import PROMETHEUS_CONTENT_TYPE, metrics
+from services.batch_stream import DEFAULT_CHUNK_SIZE, MAX_LINE_BYTES, iter_ndjson, stream_results
 
 load_dotenv()
 
 app = Flask(__name__)
+app.json = create_json_provider(app)
 CORS(app)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize AI services
-recipe_recommender = RecipeRecommender()
-health_analyzer = HealthAnalyzer()
-consumption_predictor = ConsumptionPredictor()
-personalization_engine = PersonalizationEngine()
+# AI services, each built on its first request (AI_SERVICE_LOADING=eager builds them at import)
+recipe_recommender = LazyService('services.recipe_recommender:RecipeRecommender')
+health_analyzer = LazyService('services.health_analyzer:HealthAnalyzer')
+consumption_predictor = LazyService('services.consumption_predictor:ConsumptionPredictor')
+personalization_engine = LazyService('services.personalization_engine:PersonalizationEngine')
+anomaly_detector = LazyService('services.anomaly_detector:AnomalyDetector')
+SERVICES = (recipe_recommender, health_analyzer, consumption_predictor, personalization_engine, anomaly_detector)
+
+
+def load_services() -> None:
+    """Build every service now, e.g. in the gunicorn master before it forks the workers"""
+    for service in SERVICES:
+        service.get()
+
+
+AI_SERVICE_LOADING = os.getenv('AI_SERVICE_LOADING', 'lazy').lower()
+if AI_SERVICE_LOADING not in ('lazy', 'eager'):
+    raise ValueError(f"Unknown AI_SERVICE_LOADING: {AI_SERVICE_LOADING}")
+if AI_SERVICE_LOADING == 'eager':
+    load_services()
+
+# Batch processors by batch type; each maps a list of items to a list of results
+BATCH_PROCESSORS = {
+    'health_metrics': health_analyzer.method('assess_risk_batch'),
+    'consumption': consumption_predictor.method('predict_many'),
+}
+# Batch types that also accept columnar payloads (Arrow IPC or a .npy zip); each maps columns to result columns
+COLUMN_PROCESSORS = {
+    'health_metrics': health_analyzer.method('assess_risk_table'),
+}
+batch_executor = BatchExecutor(BATCH_PROCESSORS, column_processors=COLUMN_PROCESSORS)
+batch_jobs = BatchJobManager.from_env(batch_executor)
+
+# Micro-batching: concurrent single-item calls share one vectorized call.
+# MICRO_BATCH_ENDPOINTS lists the endpoints to batch (recommend, assess_risk)
+MICRO_BATCH_ENDPOINTS = {name.strip() for name in os.getenv('MICRO_BATCH_ENDPOINTS', '').split(',') if name.strip()}
+MICRO_BATCH_SETTINGS = {
+    'max_batch': int(os.getenv('MICRO_BATCH_MAX_SIZE', 64)),
+    'max_wait_ms': float(os.getenv('MICRO_BATCH_MAX_WAIT_MS', 2)),
+}
+recommend_batcher = MicroBatcher(recipe_recommender.method('get_recommendations_batch'), name='recommend',
+                                 **MICRO_BATCH_SETTINGS)
+assess_risk_batcher = MicroBatcher(health_analyzer.method('assess_risk_batch'), name='assess_risk',
+                                   **MICRO_BATCH_SETTINGS)
+
+# Result caches for the deterministic per-request services, keyed on canonical inputs
+recommend_cache = ResultCache.from_env('recommend', lambda: recipe_recommender.cache_version)
+assess_risk_cache = ResultCache.from_env('assess_risk', lambda: health_analyzer.RULES_VERSION)
+
+BATCH_STREAM_CHUNK_SIZE = int(os.getenv('BATCH_STREAM_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+BATCH_STREAM_MAX_LINE_BYTES = int(os.getenv('BATCH_STREAM_MAX_LINE_BYTES', MAX_LINE_BYTES))
+
+# Request latency per route, method and status, exported at /metrics
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.in_flight().inc()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - g.request_started)
+    return response
+
+@app.teardown_request
+def end_request(exception=None):
+    if 'request_started' in g:
+        metrics.in_flight().dec()
 
 # Health check
 @app.route('/health', methods=['GET'])
@@ -38,7 +108,15 @@ def recommend_recipes():
         user_id = data.get('user_id')
         preferences = data.get('preferences', {})
         
-        recommendations = recipe_recommender.get_recommendations(user_id, preferences)
+        cache_key = recommend_cache.key(recipe_recommender.cache_key(preferences, user_id))
+        recommendations = recommend_cache.get(cache_key)
+        if recommendations is None:
+            # The micro-batched path scores preferences only, so users with interaction factors skip it
+            if 'recommend' in MICRO_BATCH_ENDPOINTS and not recipe_recommender.personalizes(user_id):
+                recommendations = recommend_batcher.submit(preferences)
+            else:
+                recommendations = recipe_recommender.get_recommendations(user_id, preferences)
+            recommend_cache.put(cache_key, recommendations)
         
         return jsonify({
             'success': True,
@@ -55,7 +133,14 @@ def assess_health_risk():
         data = request.json
         health_metrics = data.get('metrics', {})
         
-        risk_assessment = health_analyzer.assess_risk(health_metrics)
+        cache_key = assess_risk_cache.key(health_analyzer.cache_key(health_metrics))
+        risk_assessment = assess_risk_cache.get(cache_key)
+        if risk_assessment is None:
+            if 'assess_risk' in MICRO_BATCH_ENDPOINTS:
+                risk_assessment = assess_risk_batcher.submit(health_metrics)
+            else:
+                risk_assessment = health_analyzer.assess_risk(health_metrics)
+            assess_risk_cache.put(cache_key, risk_assessment)
         
         return jsonify({
             'success': True,
@@ -83,6 +168,55 @@ def predict_consumption():
         logger.error(f"Error in consumption prediction: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Incremental Consumption Endpoint: only new readings are sent
+@app.route('/api/consumption/append', methods=['POST'])
+def append_consumption():
+    try:
+        data = request.json
+        user_id = data.get('user_id')
+        readings = data.get('readings', [])
+        
+        # State is kept per user; without an id every caller would share one
+        if not user_id:
+            return jsonify({'success': False, 'error': 'user_id is required'}), 400
+        
+        if data.get('reset'):
+            consumption_predictor.reset_state(user_id)
+        
+        prediction = consumption_predictor.append_readings(user_id, readings)
+        
+        return jsonify({
+            'success': True,
+            'data': prediction
+        }), 200
+    except Exception as e:
+        logger.error(f"Error in incremental consumption prediction: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# IoT Anomaly Endpoint: dispenser readings, one or a micro-batch, checked for over-pours and leaks
+@app.route('/api/iot/readings', methods=['POST'])
+def process_iot_readings():
+    try:
+        data = request.json
+        readings = data.get('readings', [])
+        
+        result = anomaly_detector.process_readings(readings)
+        
+        return jsonify({
+            'success': True,
+            'data': result
+        }), 200
+    except Exception as e:
+        logger.error(f"Error in IoT anomaly detection: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/iot/devices/<device_id>/state', methods=['GET'])
+def get_iot_device_state(device_id):
+    state = anomaly_detector.device_state(device_id)
+    if state is None:
+        return jsonify({'success': False, 'error': 'Device not found'}), 404
+    return jsonify({'success': True, 'data': state}), 200
+
 # Personalization Endpoint
 @app.route('/api/personalization/profile', methods=['POST'])
 def create_personalization_profile():
@@ -101,21 +235,60 @@ def create_personalization_profile():
         logger.error(f"Error in personalization: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Bulk Personalization Endpoint: one call for a whole school district or restaurant chain
+@app.route('/api/personalization/profiles/bulk', methods=['POST'])
+def create_personalization_profiles():
+    try:
+        data = request.json
+        users = data.get('users', [])
+        
+        profiles = personalization_engine.create_profiles(
+            [user.get('user_id') for user in users],
+            [user.get('user_data', {}) for user in users]
+        )
+        
+        return jsonify({
+            'success': True,
+            'data': profiles
+        }), 200
+    except Exception as e:
+        logger.error(f"Error in bulk personalization: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Cohort Segmentation Endpoint: profile counts by state, district, age group and BMI category
+@app.route('/api/personalization/segments', methods=['GET'])
+def personalization_segments():
+    try:
+        filters = {field: request.args[field] for field in SEGMENT_FIELDS if field in request.args}
+        
+        return jsonify({
+            'success': True,
+            'data': personalization_engine.segment_counts(filters)
+        }), 200
+    except Exception as e:
+        logger.error(f"Error in profile segmentation: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # Batch Processing Endpoint
 @app.route('/api/batch/process', methods=['POST'])
 def process_batch():
     try:
+        # Imported on use like the services: services.columnar needs NumPy
+        from services.columnar import columnar_format
+        
+        payload_format = columnar_format(request.mimetype)
+        if payload_format is not None:
+            return process_columnar_batch(payload_format)
+        
         data = request.json
         batch_type = data.get('type')
         batch_data = data.get('data', [])
         
-        if batch_type == 'health_metrics':
-            results = [health_analyzer.assess_risk(item) for item in batch_data]
-        elif batch_type == 'consumption':
-            results = [consumption_predictor.predict(item['user_id'], item.get('data', [])) for item in batch_data]
-        else:
+        if batch_type not in BATCH_PROCESSORS:
             return jsonify({'success': False, 'error': 'Unknown batch type'}), 400
         
+        results = batch_executor.run(batch_type, batch_data)
+        
         return jsonify({
             'success': True,
             'data': results
@@ -124,6 +297,137 @@ def process_batch():
         logger.error(f"Error in batch processing: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def process_columnar_batch(payload_format: str):
+    """/api/batch/process with an Arrow or .npy zip body: ?type= names the batch, Accept picks the response format"""
+    from services.columnar import JSON, UnsupportedColumnarFormat, read_columns, response_format, write_columns
+    
+    batch_type = request.args.get('type')
+    if batch_type not in BATCH_PROCESSORS:
+        return jsonify({'success': False, 'error': 'Unknown batch type'}), 400
+    if batch_type not in COLUMN_PROCESSORS:
+        return jsonify({'success': False, 'error': f'Batch type {batch_type} does not accept columnar payloads'}), 415
+    
+    # ValueError covers malformed payloads and columns of the wrong type or shape
+    try:
+        columns = read_columns(request.get_data(cache=False), payload_format)
+        results = batch_executor.run_columns(batch_type, columns)
+    except UnsupportedColumnarFormat as e:
+        return jsonify({'success': False, 'error': str(e)}), 415
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    output_format = response_format(request.headers.get('Accept'), payload_format)
+    if output_format == JSON:
+        return jsonify({'success': True, 'data': results}), 200
+    return Response(write_columns(results, output_format), content_type=output_format)
+
+# Streaming Batch Endpoint: NDJSON in (one item per line), NDJSON out (one result per line)
+@app.route('/api/batch/stream', methods=['POST'])
+def stream_batch():
+    batch_type = request.args.get('type')
+    if batch_type not in BATCH_PROCESSORS:
+        return jsonify({'success': False, 'error': 'Unknown batch type'}), 400
+    
+    chunk_size = request.args.get('chunk_size', BATCH_STREAM_CHUNK_SIZE, type=int)
+    chunk_size = max(1, min(chunk_size, BATCH_STREAM_CHUNK_SIZE))
+    
+    items = iter_ndjson(request.stream, BATCH_STREAM_MAX_LINE_BYTES)
+    process = lambda chunk: batch_executor.run(batch_type, chunk)
+    return Response(
+        stream_with_context(stream_results(items, process, chunk_size)),
+        mimetype='application/x-ndjson'
+    )
+
+# Micro-batching statistics (achieved batch sizes per endpoint)
+@app.route('/api/batching/stats', methods=['GET'])
+def batching_stats():
+    return jsonify({
+        'success': True,
+        'data': {
+            'endpoints': sorted(MICRO_BATCH_ENDPOINTS),
+            'recommend': recommend_batcher.get_stats(),
+            'assess_risk': assess_risk_batcher.get_stats(),
+        }
+    }), 200
+
+# Result cache statistics (hits, misses, evictions per cache)
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        'success': True,
+        'data': {
+            'recommend': recommend_cache.get_stats(),
+            'assess_risk': assess_risk_cache.get_stats(),
+        }
+    }), 200
+
+# Prometheus metrics: request latency, service stage timings, batch sizes
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+# Asynchronous Batch Jobs: submit, poll progress, page through results
+@app.route('/api/jobs', methods=['POST'])
+def submit_batch_job():
+    try:
+        data = request.json
+        batch_type = data.get('type')
+        batch_data = data.get('data', [])
+        
+        if batch_type not in BATCH_PROCESSORS:
+            return jsonify({'success': False, 'error': 'Unknown batch type'}), 400
+        
+        job = batch_jobs.submit(batch_type, batch_data)
+        
+        return jsonify({
+            'success': True,
+            'data': job
+        }), 202
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 429
+    except JobsUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error submitting batch job: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_batch_job(job_id):
+    try:
+        job = batch_jobs.status(job_id)
+    except JobsUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'data': job}), 200
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def get_batch_job_results(job_id):
+    try:
+        offset = request.args.get('offset', 0, type=int)
+        limit = min(request.args.get('limit', 1000, type=int), 10000)
+        
+        page = batch_jobs.results(job_id, offset, limit)
+        if page is None:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        
+        return jsonify({'success': True, 'data': page}), 200
+    except JobsUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error reading batch job results: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_batch_job(job_id):
+    try:
+        cancelled = batch_jobs.cancel(job_id)
+    except JobsUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    if not cancelled:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True}), 200
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     app.run(debug=os.getenv('DEBUG', False), port=port, host='0.0.0.0')
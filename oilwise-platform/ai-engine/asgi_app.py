@@ -0,0 +1,454 @@
+"""
+ASGI entry point for the AI engine
+
+Serves the same routes and JSON contracts as app.py, without a framework
+dependency, so one process can hold thousands of open connections. The
+services are the ones declared in app.py, built on the service pool at
+startup; CPU-bound calls run on that shared thread pool
+(ASGI_SERVICE_THREADS), and large batches still go through the
+BatchExecutor, whose process pool is shared by every connection.
+
+Run with:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 1
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs
+
+from app import (
+    BATCH_PROCESSORS, COLUMN_PROCESSORS, MICRO_BATCH_ENDPOINTS, anomaly_detector, assess_risk_batcher,
+    assess_risk_cache, batch_executor, batch_jobs, consumption_predictor, health_analyzer, load_services,
+    personalization_engine, recipe_recommender, recommend_batcher, recommend_cache,
+)
+from services.batch_jobs import JobQueueFull, JobsUnavailable
+from services.json_encoder import response_encoder
+from services.metrics import PROMETHEUS_CONTENT_TYPE, metrics
+from services.profile_store import SEGMENT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = int(os.getenv('ASGI_MAX_BODY_BYTES', 64 * 1024 * 1024))
+service_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('ASGI_SERVICE_THREADS', 0)) or min(32, (os.cpu_count() or 1) * 4),
+    thread_name_prefix='ai-engine-service',
+)
+
+
+class BinaryBody(NamedTuple):
+    """A non-JSON response payload, e.g. columnar batch results"""
+    body: bytes
+    content_type: str
+
+
+Response = Tuple[Dict[str, Any], int]
+ROUTES = []
+
+
+def route(method: str, pattern: str, error_message: str = 'Error handling request'):
+    """Register a handler; error_message mirrors the log message of the Flask route"""
+    def register(handler: Callable) -> Callable:
+        # Metrics label the route as Flask does, e.g. /api/jobs/<job_id>
+        rule = re.sub(r'\(\?P<(\w+)>[^)]*\)', r'<\1>', pattern)
+        ROUTES.append((method, re.compile(f'^{pattern}$'), handler, error_message, rule))
+        return handler
+    return register
+
+
+async def run_service(func: Callable, *args) -> Any:
+    """Run a CPU-bound service call on the shared pool, off the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(service_pool, func, *args)
+
+
+async def cached(cache, inputs: Any, compute: Callable) -> Any:
+    """Serve from a ResultCache, awaiting compute() on a miss; lookups may hit a shared Redis"""
+    key = cache.key(inputs)
+    value = await run_service(cache.get, key) if cache.shared_client is not None else cache.get(key)
+    if value is None:
+        value = await compute()
+        if cache.shared_client is not None:
+            await run_service(cache.put, key, value)
+        else:
+            cache.put(key, value)
+    return value
+
+
+@route('GET', '/health')
+async def health_check(request) -> Response:
+    return {'status': 'OK', 'service': 'OilWise AI Engine'}, 200
+
+
+@route('POST', '/api/recipes/recommend', 'Error in recipe recommendation')
+async def recommend_recipes(request) -> Response:
+    data = await request.json()
+    user_id = data.get('user_id')
+    preferences = data.get('preferences', {})
+
+    async def compute():
+        if 'recommend' in MICRO_BATCH_ENDPOINTS and not recipe_recommender.personalizes(user_id):
+            return await recommend_batcher.submit_async(preferences)
+        return await run_service(recipe_recommender.get_recommendations, user_id, preferences)
+
+    recommendations = await cached(recommend_cache, recipe_recommender.cache_key(preferences, user_id), compute)
+
+    return {'success': True, 'data': recommendations}, 200
+
+
+@route('POST', '/api/health/assess-risk', 'Error in health risk assessment')
+async def assess_health_risk(request) -> Response:
+    data = await request.json()
+    health_metrics = data.get('metrics', {})
+
+    async def compute():
+        if 'assess_risk' in MICRO_BATCH_ENDPOINTS:
+            return await assess_risk_batcher.submit_async(health_metrics)
+        return await run_service(health_analyzer.assess_risk, health_metrics)
+
+    risk_assessment = await cached(assess_risk_cache, health_analyzer.cache_key(health_metrics), compute)
+
+    return {'success': True, 'data': risk_assessment}, 200
+
+
+@route('POST', '/api/consumption/predict', 'Error in consumption prediction')
+async def predict_consumption(request) -> Response:
+    data = await request.json()
+    user_id = data.get('user_id')
+    historical_data = data.get('historical_data', [])
+
+    prediction = await run_service(consumption_predictor.predict, user_id, historical_data)
+
+    return {'success': True, 'data': prediction}, 200
+
+
+@route('POST', '/api/consumption/append', 'Error in incremental consumption prediction')
+async def append_consumption(request) -> Response:
+    data = await request.json()
+    user_id = data.get('user_id')
+    readings = data.get('readings', [])
+
+    if not user_id:
+        return {'success': False, 'error': 'user_id is required'}, 400
+
+    if data.get('reset'):
+        await run_service(consumption_predictor.reset_state, user_id)
+
+    prediction = await run_service(consumption_predictor.append_readings, user_id, readings)
+
+    return {'success': True, 'data': prediction}, 200
+
+
+@route('POST', '/api/iot/readings', 'Error in IoT anomaly detection')
+async def process_iot_readings(request) -> Response:
+    data = await request.json()
+    readings = data.get('readings', [])
+
+    result = await run_service(anomaly_detector.process_readings, readings)
+
+    return {'success': True, 'data': result}, 200
+
+
+@route('GET', '/api/iot/devices/(?P<device_id>[^/]+)/state')
+async def get_iot_device_state(request, device_id: str) -> Response:
+    state = await run_service(anomaly_detector.device_state, device_id)
+    if state is None:
+        return {'success': False, 'error': 'Device not found'}, 404
+    return {'success': True, 'data': state}, 200
+
+
+@route('POST', '/api/personalization/profile', 'Error in personalization')
+async def create_personalization_profile(request) -> Response:
+    data = await request.json()
+    user_id = data.get('user_id')
+    user_data = data.get('user_data', {})
+
+    profile = await run_service(personalization_engine.create_profile, user_id, user_data)
+
+    return {'success': True, 'data': profile}, 200
+
+
+@route('POST', '/api/personalization/profiles/bulk', 'Error in bulk personalization')
+async def create_personalization_profiles(request) -> Response:
+    data = await request.json()
+    users = data.get('users', [])
+
+    profiles = await run_service(
+        personalization_engine.create_profiles,
+        [user.get('user_id') for user in users],
+        [user.get('user_data', {}) for user in users],
+    )
+
+    return {'success': True, 'data': profiles}, 200
+
+
+@route('GET', '/api/personalization/segments', 'Error in profile segmentation')
+async def personalization_segments(request) -> Response:
+    filters = {field: request.arg(field) for field in SEGMENT_FIELDS if request.arg(field) is not None}
+
+    segments = await run_service(personalization_engine.segment_counts, filters)
+
+    return {'success': True, 'data': segments}, 200
+
+
+@route('POST', '/api/batch/process', 'Error in batch processing')
+async def process_batch(request) -> Response:
+    from services.columnar import columnar_format
+
+    payload_format = columnar_format(request.header('content-type'))
+    if payload_format is not None:
+        return await process_columnar_batch(request, payload_format)
+
+    data = await request.json()
+    batch_type = data.get('type')
+    batch_data = data.get('data', [])
+
+    if batch_type not in BATCH_PROCESSORS:
+        return {'success': False, 'error': 'Unknown batch type'}, 400
+
+    results = await run_service(batch_executor.run, batch_type, batch_data)
+
+    return {'success': True, 'data': results}, 200
+
+
+async def process_columnar_batch(request, payload_format: str) -> Response:
+    from services.columnar import JSON, UnsupportedColumnarFormat, read_columns, response_format, write_columns
+
+    batch_type = request.arg('type')
+    if batch_type not in BATCH_PROCESSORS:
+        return {'success': False, 'error': 'Unknown batch type'}, 400
+    if batch_type not in COLUMN_PROCESSORS:
+        return {'success': False, 'error': f'Batch type {batch_type} does not accept columnar payloads'}, 415
+
+    try:
+        columns = await run_service(read_columns, await request.body(), payload_format)
+        results = await run_service(batch_executor.run_columns, batch_type, columns)
+    except UnsupportedColumnarFormat as e:
+        return {'success': False, 'error': str(e)}, 415
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+
+    output_format = response_format(request.header('accept'), payload_format)
+    if output_format == JSON:
+        return {'success': True, 'data': results}, 200
+    return BinaryBody(await run_service(write_columns, results, output_format), output_format), 200
+
+
+@route('GET', '/api/batching/stats')
+async def batching_stats(request) -> Response:
+    return {
+        'success': True,
+        'data': {
+            'endpoints': sorted(MICRO_BATCH_ENDPOINTS),
+            'recommend': recommend_batcher.get_stats(),
+            'assess_risk': assess_risk_batcher.get_stats(),
+        }
+    }, 200
+
+
+@route('GET', '/api/cache/stats')
+async def cache_stats(request) -> Response:
+    return {
+        'success': True,
+        'data': {
+            'recommend': recommend_cache.get_stats(),
+            'assess_risk': assess_risk_cache.get_stats(),
+        }
+    }, 200
+
+
+@route('GET', '/metrics')
+async def prometheus_metrics(request) -> Tuple[str, int]:
+    # Rendering may merge the other workers' snapshots from METRICS_DIR
+    return await run_service(metrics.render), 200
+
+
+@route('POST', '/api/jobs', 'Error submitting batch job')
+async def submit_batch_job(request) -> Response:
+    data = await request.json()
+    batch_type = data.get('type')
+    batch_data = data.get('data', [])
+
+    if batch_type not in BATCH_PROCESSORS:
+        return {'success': False, 'error': 'Unknown batch type'}, 400
+
+    try:
+        job = await run_service(batch_jobs.submit, batch_type, batch_data)
+    except JobQueueFull as e:
+        return {'success': False, 'error': str(e)}, 429
+
+    return {'success': True, 'data': job}, 202
+
+
+@route('GET', '/api/jobs/(?P<job_id>[^/]+)')
+async def get_batch_job(request, job_id: str) -> Response:
+    job = await run_service(batch_jobs.status, job_id)
+    if job is None:
+        return {'success': False, 'error': 'Job not found'}, 404
+    return {'success': True, 'data': job}, 200
+
+
+@route('GET', '/api/jobs/(?P<job_id>[^/]+)/results', 'Error reading batch job results')
+async def get_batch_job_results(request, job_id: str) -> Response:
+    offset = request.int_arg('offset', 0)
+    limit = min(request.int_arg('limit', 1000), 10000)
+
+    page = await run_service(batch_jobs.results, job_id, offset, limit)
+    if page is None:
+        return {'success': False, 'error': 'Job not found'}, 404
+
+    return {'success': True, 'data': page}, 200
+
+
+@route('DELETE', '/api/jobs/(?P<job_id>[^/]+)')
+async def cancel_batch_job(request, job_id: str) -> Response:
+    if not await run_service(batch_jobs.cancel, job_id):
+        return {'success': False, 'error': 'Job not found'}, 404
+    return {'success': True}, 200
+
+
+class Request:
+    """The parts of an ASGI HTTP request the handlers need"""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self._receive = receive
+        self._body = None
+        self.rule = 'unmatched'
+
+    async def body(self) -> bytes:
+        if self._body is None:
+            chunks, size = [], 0
+            while True:
+                message = await self._receive()
+                chunk = message.get('body', b'')
+                size += len(chunk)
+                if size > MAX_BODY_BYTES:
+                    raise RequestTooLarge(f'Request body exceeds {MAX_BODY_BYTES} bytes')
+                chunks.append(chunk)
+                if not message.get('more_body'):
+                    break
+            self._body = b''.join(chunks)
+        return self._body
+
+    async def json(self) -> Any:
+        # Large batch bodies take a while to decode; keep that off the event loop too
+        return await run_service(json.loads, await self.body())
+
+    def header(self, name: str) -> Optional[str]:
+        # ASGI header names are lowercase bytes; the first occurrence wins
+        key = name.lower().encode()
+        for header_name, value in self.scope.get('headers', ()):
+            if header_name == key:
+                return value.decode('latin-1')
+        return None
+
+    def arg(self, name: str) -> Optional[str]:
+        # Like request.args[name]: blank values count as given
+        values = parse_qs(self.scope.get('query_string', b'').decode(), keep_blank_values=True).get(name)
+        return values[0] if values else None
+
+    def int_arg(self, name: str, default: int) -> int:
+        values = parse_qs(self.scope.get('query_string', b'').decode()).get(name)
+        try:
+            return int(values[0]) if values else default
+        except ValueError:
+            # Same as Flask's request.args.get(type=int)
+            return default
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    started = time.perf_counter()
+    in_flight = metrics.in_flight()
+    in_flight.inc()
+    try:
+        request = Request(scope, receive)
+        payload, status = await _dispatch(request)
+        if isinstance(payload, BinaryBody):
+            body, content_type = payload.body, payload.content_type.encode()
+        elif isinstance(payload, str):
+            # /metrics: Prometheus text
+            body, content_type = payload.encode(), PROMETHEUS_CONTENT_TYPE.encode()
+        else:
+            # Same encoding as Flask's jsonify: sorted keys, compact, trailing newline
+            body, content_type = response_encoder.dumps(payload) + b'\n', b'application/json'
+        await _send_response(send, status, body, content_type)
+    finally:
+        in_flight.dec()
+    metrics.observe_request(request.rule, scope['method'], status, time.perf_counter() - started)
+
+
+async def _send_response(send, status: int, body: bytes, content_type: bytes) -> None:
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+            (b'access-control-allow-methods', b'GET, POST, DELETE, OPTIONS'),
+            (b'access-control-allow-headers', b'Content-Type, Authorization'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _dispatch(request: Request) -> Response:
+    method, path = request.scope['method'], request.scope['path']
+    path_matched = False
+    for route_method, pattern, handler, error_message, rule in ROUTES:
+        match = pattern.match(path)
+        if match is None:
+            continue
+        path_matched = True
+        request.rule = rule
+        if route_method != method:
+            continue
+
+        try:
+            return await handler(request, **match.groupdict())
+        except RequestTooLarge as e:
+            return {'success': False, 'error': str(e)}, 413
+        except JobsUnavailable as e:
+            return {'success': False, 'error': str(e)}, 503
+        except Exception as e:
+            logger.error(f"{error_message}: {str(e)}")
+            return {'success': False, 'error': str(e)}, 500
+
+    if path_matched:
+        if method == 'OPTIONS':
+            # CORS preflight, as answered by Flask-CORS
+            return {}, 200
+        return {'success': False, 'error': 'Method not allowed'}, 405
+    return {'success': False, 'error': 'Not found'}, 404
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Build the lazy services on the pool, not on the event loop when the first request needs them;
+            # startup completes at once, so /health is healthy while they load
+            asyncio.get_running_loop().run_in_executor(service_pool, load_services)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            batch_jobs.shutdown()
+            recommend_batcher.shutdown()
+            assess_risk_batcher.shutdown()
+            batch_executor.shutdown()
+            service_pool.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
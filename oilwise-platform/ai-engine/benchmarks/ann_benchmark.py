@@ -0,0 +1,111 @@
+"""Offline recall@10 and latency benchmark: IVF / IVF-PQ vs the exact recipe scorer
+
+Run from the ai-engine directory:
+    python -m benchmarks.ann_benchmark --recipes 200000 --probes 1 2 4 8 16 32 --pq 10
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Dict, Any, List
+
+import numpy as np
+
+from services.ann_index import IVFRecipeIndex
+from services.recipe_index import RecipeIndex
+
+
+def synthetic_catalogue(n_recipes: int, dim: int = 50, n_topics: int = 200, seed: int = 0):
+    """Clustered recipe vectors (recipes share topic structure) with oil content 0-10"""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    labels = rng.integers(0, n_topics, n_recipes)
+    features = topics[labels] + 0.6 * rng.standard_normal((n_recipes, dim)).astype(np.float32)
+    oil_content = rng.uniform(0, 10, n_recipes).astype(np.float32)
+    return features, oil_content
+
+
+def measure(index: RecipeIndex, queries: np.ndarray, k: int) -> Dict[str, Any]:
+    """Per-query latency percentiles and the returned row ids"""
+    results = []
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        rows, _ = index.top_k(query, k)
+        latencies[i] = time.perf_counter() - started
+        results.append(rows)
+
+    return {
+        'rows': results,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p95_ms': float(np.percentile(latencies, 95) * 1000),
+        'mean_ms': float(latencies.mean() * 1000),
+    }
+
+
+def recall(approx: List[np.ndarray], exact: List[np.ndarray], k: int) -> float:
+    hits = sum(len(np.intersect1d(a, e)) for a, e in zip(approx, exact))
+    return hits / (k * len(exact))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--lists', type=int, default=None)
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--pq', type=int, default=0, help='Also benchmark IVF-PQ with this many subspaces')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    features, oil_content = synthetic_catalogue(args.recipes, seed=args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = features[rng.choice(args.recipes, args.queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    exact_index = RecipeIndex(features, oil_content)
+    exact = measure(exact_index, queries, args.k)
+    report = {
+        'recipes': args.recipes,
+        'queries': args.queries,
+        'k': args.k,
+        'exact': {key: value for key, value in exact.items() if key != 'rows'},
+        'ann': [],
+    }
+    print(f"exact: p50 {exact['p50_ms']:.3f} ms  p95 {exact['p95_ms']:.3f} ms")
+
+    variants = [('ivf', 0)] + ([('ivfpq', args.pq)] if args.pq else [])
+    for name, pq in variants:
+        started = time.perf_counter()
+        index = IVFRecipeIndex(features, oil_content, n_lists=args.lists, pq_subspaces=pq, seed=args.seed)
+        build_s = time.perf_counter() - started
+        print(f"{name}: {index.n_lists} lists, trained in {build_s:.1f}s")
+
+        for n_probe in args.probes:
+            index.n_probe = n_probe
+            result = measure(index, queries, args.k)
+            row = {
+                'backend': name,
+                'n_lists': index.n_lists,
+                'n_probe': n_probe,
+                'build_s': build_s,
+                'recall_at_k': recall(result['rows'], exact['rows'], args.k),
+                'p50_ms': result['p50_ms'],
+                'p95_ms': result['p95_ms'],
+                'speedup_p50': exact['p50_ms'] / result['p50_ms'],
+            }
+            report['ann'].append(row)
+            print(f"  n_probe={n_probe:<4d} recall@{args.k} {row['recall_at_k']:.3f}  "
+                  f"p50 {row['p50_ms']:.3f} ms  p95 {row['p95_ms']:.3f} ms  x{row['speedup_p50']:.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
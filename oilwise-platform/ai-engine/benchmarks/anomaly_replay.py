@@ -0,0 +1,203 @@
+"""Replay a recorded reading log through the streaming anomaly detector
+
+Run from the ai-engine directory:
+    python -m benchmarks.anomaly_replay --log readings.jsonl
+    python -m benchmarks.anomaly_replay --generate readings.jsonl --devices 100000 --readings 2000000
+
+The log holds one reading per line, oldest first: JSON lines with
+device_id (or the dispenser's deviceId) and value, or CSV with a
+device_id,value header. --generate first writes a synthetic log of
+per-device pour sizes with labelled over-pours ("spike") and sustained
+leak episodes ("leak").
+
+The log is replayed once reading by reading through observe() and once
+in micro-batches through observe_batch(), reporting events per second,
+the anomalies found and the state memory per device. Exits non-zero if
+the two replays disagree on any anomaly or final device state. For a
+labelled log it also reports spike recall, leak episodes caught and
+false alarms on unlabelled readings.
+"""
+import argparse
+import csv
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.anomaly_detector import AnomalyDetector
+
+LEAK_LENGTH = 30
+
+
+def generate_log(path: str, n_devices: int, n_readings: int, seed: int, spike_rate: float = 0.002,
+                 leak_devices: float = 0.05) -> None:
+    """Interleaved pour readings with labelled spikes and leak episodes, as JSON lines"""
+    rng = np.random.default_rng(seed)
+    devices = rng.integers(0, n_devices, n_readings)
+    mean = rng.uniform(5, 40, n_devices)
+    sd = mean * rng.uniform(0.08, 0.2, n_devices)
+    values = rng.normal(mean[devices], sd[devices])
+
+    # Position of each reading within its device's stream
+    order = np.argsort(devices, kind='stable')
+    counts = np.bincount(devices, minlength=n_devices)
+    position = np.empty(n_readings, dtype=np.int64)
+    position[order] = np.arange(n_readings) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    labels = np.full(n_readings, '', dtype=object)
+    # Over-pours: 3-6x the usual amount, once the device has a history
+    spikes = (rng.random(n_readings) < spike_rate) & (position >= 20)
+    values[spikes] *= rng.uniform(3, 6, spikes.sum())
+    labels[spikes] = 'spike'
+
+    # Leaks: a run of readings 1.5 standard deviations above the usual amount
+    leaking = rng.random(n_devices) < leak_devices
+    starts = np.where(leaking & (counts >= 50 + LEAK_LENGTH),
+                      rng.integers(50, np.maximum(counts - LEAK_LENGTH, 51)), -1)
+    in_leak = ~spikes & (starts[devices] >= 0) & (position >= starts[devices]) & \
+        (position < starts[devices] + LEAK_LENGTH)
+    values[in_leak] += 1.5 * sd[devices[in_leak]]
+    labels[in_leak] = 'leak'
+
+    values = np.maximum(values, 0)
+    with open(path, 'w') as f:
+        for device, value, label in zip(devices.tolist(), values.round(2).tolist(), labels.tolist()):
+            record = {'device_id': f'dispenser-{device}', 'value': value}
+            if label:
+                record['label'] = label
+            f.write(json.dumps(record) + '\n')
+
+
+def read_log(path: str) -> Tuple[List[str], np.ndarray, List[str]]:
+    """Device ids, values and labels ('' when unlabelled) of a JSON lines or CSV log"""
+    device_ids, values, labels = [], [], []
+    with open(path) as f:
+        first = f.readline()
+        f.seek(0)
+        rows = csv.DictReader(f) if not first.lstrip().startswith('{') else (json.loads(line) for line in f
+                                                                             if line.strip())
+        for row in rows:
+            device_ids.append(str(row.get('device_id') or row.get('deviceId')))
+            values.append(float(row['value']))
+            labels.append(row.get('label') or '')
+    return device_ids, np.array(values, dtype=np.float64), labels
+
+
+def replay_single(detector: AnomalyDetector, device_ids: List[str], values: np.ndarray) -> List[Dict[str, Any]]:
+    events = []
+    observe = detector.observe
+    for index, (device_id, value) in enumerate(zip(device_ids, values.tolist())):
+        for event in observe(device_id, value):
+            event['index'] = index
+            events.append(event)
+    return events
+
+
+def replay_batches(detector: AnomalyDetector, device_ids: List[str], values: np.ndarray,
+                   batch_size: int) -> List[Dict[str, Any]]:
+    events = []
+    for start in range(0, len(values), batch_size):
+        for event in detector.observe_batch(device_ids[start:start + batch_size], values[start:start + batch_size]):
+            event['index'] += start
+            events.append(event)
+    return events
+
+
+def quality(events: List[Dict[str, Any]], device_ids: List[str], labels: List[str]) -> Optional[Dict[str, Any]]:
+    """Spike recall, leak episodes caught and false alarms, for a labelled log"""
+    labels = np.array(labels, dtype=object)
+    if not (labels != '').any():
+        return None
+    flagged = {(event['index'], event['type']) for event in events}
+    spike_indices = np.flatnonzero(labels == 'spike').tolist()
+    caught_spikes = sum((index, 'spike') in flagged for index in spike_indices)
+
+    episodes: Dict[str, List[int]] = {}
+    for index in np.flatnonzero(labels == 'leak').tolist():
+        episodes.setdefault(device_ids[index], []).append(index)
+    caught_leaks = sum(any((index, 'leak') in flagged for index in indices) for indices in episodes.values())
+
+    false_alarms = sum(labels[event['index']] == '' for event in events)
+    return {
+        'spikes': len(spike_indices),
+        'spike_recall': caught_spikes / len(spike_indices) if spike_indices else None,
+        'leak_episodes': len(episodes),
+        'leak_episodes_caught': caught_leaks,
+        'false_alarms': false_alarms,
+        'false_alarm_rate': false_alarms / int((labels == '').sum()),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--log', help='Reading log to replay (JSON lines or CSV)')
+    parser.add_argument('--generate', help='Write a synthetic labelled log to this path and replay it')
+    parser.add_argument('--devices', type=int, default=10000)
+    parser.add_argument('--readings', type=int, default=500000)
+    parser.add_argument('--batch-size', type=int, default=1000, help='Readings per observe_batch() call')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+    if not (args.log or args.generate):
+        parser.error('one of --log or --generate is required')
+
+    logging.disable(logging.ERROR)
+    path = args.generate or args.log
+    if args.generate:
+        started = time.perf_counter()
+        generate_log(path, args.devices, args.readings, args.seed)
+        print(f"generated {args.readings:,} readings from {args.devices:,} devices in "
+              f"{time.perf_counter() - started:.1f} s -> {path}")
+
+    device_ids, values, labels = read_log(path)
+    report: Dict[str, Any] = {'readings': len(values), 'devices': len(set(device_ids))}
+
+    single = AnomalyDetector()
+    started = time.perf_counter()
+    single_events = replay_single(single, device_ids, values)
+    single_s = time.perf_counter() - started
+
+    batched = AnomalyDetector()
+    started = time.perf_counter()
+    batch_events = replay_batches(batched, device_ids, values, args.batch_size)
+    batch_s = time.perf_counter() - started
+
+    stats = batched.stats()
+    report['observe'] = {'seconds': single_s, 'events_per_s': len(values) / single_s}
+    report['observe_batch'] = {'batch_size': args.batch_size, 'seconds': batch_s,
+                               'events_per_s': len(values) / batch_s}
+    report['anomalies'] = stats['events']
+    report['state_bytes_per_device'] = stats['state_bytes'] / max(stats['devices'], 1)
+    print(f"observe():       {report['observe']['events_per_s']:12,.0f} readings/s")
+    print(f"observe_batch(): {report['observe_batch']['events_per_s']:12,.0f} readings/s "
+          f"(batches of {args.batch_size})")
+    print(f"{stats['devices']:,} devices, {report['state_bytes_per_device']:.0f} state bytes each | "
+          f"anomalies: {stats['events']}")
+
+    identical = ([(e['index'], e['type']) for e in single_events] == [(e['index'], e['type']) for e in batch_events]
+                 and np.array_equal(single._state, batched._state))
+    report['single_and_batch_identical'] = identical
+    print(f"observe() and observe_batch(): {'identical anomalies and states' if identical else 'MISMATCH'}")
+
+    report['quality'] = quality(batch_events, device_ids, labels)
+    if report['quality']:
+        q = report['quality']
+        recall = f"{q['spike_recall']:.1%}" if q['spike_recall'] is not None else 'n/a'
+        print(f"spike recall {recall} of {q['spikes']} | leak episodes caught {q['leak_episodes_caught']}/"
+              f"{q['leak_episodes']} | false alarms {q['false_alarms']} ({q['false_alarm_rate']:.3%})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if not identical:
+        print("FAILED: per-reading and micro-batch replays disagree")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Throughput scaling benchmark: BatchExecutor process pool from 1 to N workers
+
+Run from the ai-engine directory:
+    python -m benchmarks.batch_executor_benchmark --rows 400000 --users 20000 --workers 1 2 4 8
+
+Each batch type is run inline and then through a persistent pool per
+worker count (warmed up first, as in a long-lived gunicorn worker).
+Exits non-zero if any pooled result differs from the inline result.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from benchmarks.consumption_kernel_benchmark import synthetic_histories
+from benchmarks.health_batch_benchmark import synthetic_metrics
+from services.batch_executor import BatchExecutor, build_processors
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=400000, help='health_metrics batch size')
+    parser.add_argument('--users', type=int, default=20000, help='consumption batch size')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    processors = build_processors()
+    batches = {
+        'health_metrics': synthetic_metrics(args.rows, args.seed),
+        'consumption': [{'user_id': str(i), 'data': h} for i, h in enumerate(synthetic_histories(args.users, args.seed))],
+    }
+
+    report = {'cpu_count': os.cpu_count(), 'chunk_size': args.chunk_size, 'batches': {}}
+    failed = False
+    for batch_type, items in batches.items():
+        started = time.perf_counter()
+        expected = processors[batch_type](items)
+        inline_s = time.perf_counter() - started
+        rows = {'items': len(items), 'inline_s': inline_s, 'pool': []}
+        print(f"{batch_type}: {len(items)} items, inline {inline_s:.2f}s ({len(items) / inline_s:,.0f} items/s)")
+
+        for workers in sorted(set(args.workers)):
+            executor = BatchExecutor(processors, mode='process', workers=workers,
+                                     chunk_size=args.chunk_size, min_parallel=0)
+            try:
+                executor.run(batch_type, items[:args.chunk_size * workers])
+                started = time.perf_counter()
+                actual = executor.run(batch_type, items)
+                elapsed = time.perf_counter() - started
+            finally:
+                executor.shutdown()
+
+            matches = actual == expected
+            failed |= not matches
+            rows['pool'].append({
+                'workers': workers,
+                'seconds': elapsed,
+                'items_per_s': len(items) / elapsed,
+                'speedup_vs_inline': inline_s / elapsed,
+                'parity': matches,
+            })
+            print(f"  {workers:>3d} workers  {elapsed:7.2f}s  {len(items) / elapsed:12,.0f} items/s  "
+                  f"x{inline_s / elapsed:.2f}{'' if matches else '  MISMATCH'}")
+        report['batches'][batch_type] = rows
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if failed:
+        print("FAILED: pooled results differ from inline results")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
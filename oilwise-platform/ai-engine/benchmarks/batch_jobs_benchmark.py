@@ -0,0 +1,92 @@
+"""Responsiveness benchmark: interactive latency while an async batch job runs
+
+Run from the ai-engine directory:
+    python -m benchmarks.batch_jobs_benchmark --rows 200000
+
+Measures /api/health/assess-risk latency idle and while a large
+health_metrics job runs through /api/jobs, then pages through the job's
+results and checks them against assess_risk_batch. Exits non-zero on a
+mismatch.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.health_batch_benchmark import synthetic_metrics
+
+
+def latencies(client, n: int):
+    samples = np.empty(n)
+    for i in range(n):
+        started = time.perf_counter()
+        client.post('/api/health/assess-risk', json={'metrics': {'bmi': 31, 'daily_oil_intake': 50}})
+        samples[i] = time.perf_counter() - started
+    return {'p50_ms': float(np.percentile(samples, 50) * 1000), 'p95_ms': float(np.percentile(samples, 95) * 1000)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    from app import app, batch_jobs, health_analyzer
+    client = app.test_client()
+    rows = synthetic_metrics(args.rows, args.seed)
+
+    idle = latencies(client, args.requests)
+
+    started = time.perf_counter()
+    response = client.post('/api/jobs', data=json.dumps({'type': 'health_metrics', 'data': rows}),
+                           content_type='application/json')
+    submit_ms = (time.perf_counter() - started) * 1000
+    job_id = response.get_json()['data']['job_id']
+
+    busy = latencies(client, args.requests)
+    while batch_jobs.status(job_id)['status'] in ('queued', 'running'):
+        time.sleep(0.05)
+    job = batch_jobs.status(job_id)
+
+    actual, offset = [], 0
+    while offset is not None:
+        page = client.get(f'/api/jobs/{job_id}/results?offset={offset}&limit=10000').get_json()['data']
+        actual.extend(page['data'])
+        offset = page['next_offset']
+    batch_jobs.shutdown()
+
+    expected = json.loads(json.dumps(health_analyzer.assess_risk_batch(rows)))
+    report = {
+        'rows': args.rows,
+        'submit_ms': submit_ms,
+        'job_s': job['finished_at'] - job['started_at'],
+        'idle': idle,
+        'during_job': busy,
+        'status': job['status'],
+        'parity': actual == expected,
+    }
+
+    print(f"submit returned in {submit_ms:.1f} ms; job ran {report['job_s']:.2f}s ({job['status']})")
+    print(f"assess-risk idle:       p50 {idle['p50_ms']:.2f} ms  p95 {idle['p95_ms']:.2f} ms")
+    print(f"assess-risk during job: p50 {busy['p50_ms']:.2f} ms  p95 {busy['p95_ms']:.2f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if not report['parity']:
+        print("FAILED: paged job results differ from assess_risk_batch")
+        return 1
+    print(f"parity OK on {args.rows} rows")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
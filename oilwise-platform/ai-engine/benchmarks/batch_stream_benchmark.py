@@ -0,0 +1,128 @@
+"""Peak-memory and time-to-first-result benchmark: /api/batch/stream vs /api/batch/process
+
+Run from the ai-engine directory:
+    python -m benchmarks.batch_stream_benchmark --rows 200000
+
+Drives both endpoints in-process with the same
+health_metrics rows and checks that the streamed results match the
+buffered ones. Exits non-zero on a mismatch.
+"""
+import argparse
+import io
+import json
+import logging
+import sys
+import time
+import tracemalloc
+
+from werkzeug.test import EnvironBuilder
+
+from benchmarks.health_batch_benchmark import synthetic_metrics
+
+
+class NDJSONSource(io.RawIOBase):
+    """Request body generated lazily, so the input itself is never held in memory"""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            row = next(self.rows, None)
+            if row is None:
+                return 0
+            self.pending = (json.dumps(row) + '\n').encode()
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def digest(result) -> int:
+    """Order-independent fingerprint of one result (jsonify sorts keys, the stream does not)"""
+    return hash(json.dumps(result, sort_keys=True))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    from app import app
+    client = app.test_client()
+    rows = synthetic_metrics(args.rows, args.seed)
+
+    def buffered(keep=False):
+        body = json.dumps({'type': 'health_metrics', 'data': rows})
+        response = client.post('/api/batch/process', data=body, content_type='application/json')
+        results = response.get_json()['data']
+        return [digest(result) for result in results] if keep else [], None
+
+    def streamed(keep=False):
+        # A chunked upload of unknown length, as a client streaming the job would send
+        environ = EnvironBuilder('/api/batch/stream', method='POST', query_string={'type': 'health_metrics'},
+                                 content_type='application/x-ndjson').get_environ()
+        environ.pop('CONTENT_LENGTH', None)
+        environ['wsgi.input'] = io.BufferedReader(NDJSONSource(rows))
+        environ['wsgi.input_terminated'] = True
+
+        results, first_result_s = [], None
+        started = time.perf_counter()
+        for chunk in app(environ, lambda status, headers, exc_info=None: None):
+            if first_result_s is None:
+                first_result_s = time.perf_counter() - started
+            if keep:
+                results.extend(digest(json.loads(line)) for line in chunk.splitlines())
+        return results, first_result_s
+
+    def run(endpoint):
+        """Wall time untraced, peak Python heap traced, then the result digests for parity"""
+        started = time.perf_counter()
+        _, first_result_s = endpoint()
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        endpoint()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results, _ = endpoint(keep=True)
+        return results, elapsed, first_result_s, peak
+
+    expected, buffered_s, _, buffered_peak = run(buffered)
+    actual, stream_s, first_result_s, stream_peak = run(streamed)
+    mismatches = sum(a != e for a, e in zip(actual, expected)) + abs(len(actual) - len(expected))
+
+    report = {
+        'rows': args.rows,
+        'buffered_s': buffered_s,
+        'buffered_peak_mb': buffered_peak / 2 ** 20,
+        'stream_s': stream_s,
+        'stream_first_result_s': first_result_s,
+        'stream_peak_mb': stream_peak / 2 ** 20,
+        'mismatches': mismatches,
+    }
+
+    print(f"/api/batch/process  {buffered_s:7.2f}s  peak {report['buffered_peak_mb']:8.1f} MiB")
+    print(f"/api/batch/stream   {stream_s:7.2f}s  peak {report['stream_peak_mb']:8.1f} MiB  "
+          f"first result after {first_result_s:.3f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if report['mismatches']:
+        print(f"FAILED: {report['mismatches']} of {args.rows} streamed results differ")
+        return 1
+
+    print(f"parity OK on {args.rows} rows")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
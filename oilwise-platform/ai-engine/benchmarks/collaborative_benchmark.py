@@ -0,0 +1,168 @@
+"""Training time, ranking quality and serving latency of the ALS collaborative filter
+
+Run from the ai-engine directory:
+    python -m benchmarks.collaborative_benchmark --users 1000000 --recipes 100000
+    python -m benchmarks.collaborative_benchmark --users 50000 --recipes 10000 --iterations 5
+
+Generates a synthetic interaction log with taste clusters and Zipf
+popularity (about --per-user interactions per user), holds one
+interaction out for a sample of users, and trains ImplicitALS on the
+rest. Ranking quality is recall@10 of the held-out recipes, against
+recommending the most popular recipes. Serving latency is measured through
+RecipeRecommender.get_recommendations on a compiled catalogue of the
+same size in content, collaborative and blend modes. Exits non-zero if
+ALS does not beat the popularity baseline.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from benchmarks.micro_batch_benchmark import synthetic_preferences, synthetic_recipes
+from services.collaborative_filter import CollaborativeModel, ImplicitALS, interaction_matrix
+from services.recipe_catalogue import RecipeCatalogue
+
+
+def synthetic_interactions(n_users: int, n_recipes: int, per_user: float, seed: int = 0,
+                           n_clusters: int = 200) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(user, recipe, weight) triples: users mostly cook recipes of their taste cluster, popular ones more often"""
+    rng = np.random.default_rng(seed)
+    counts = np.maximum(rng.poisson(per_user, n_users), 2)
+    users = np.repeat(np.arange(n_users), counts)
+    n = len(users)
+
+    # Recipes grouped by cluster, each cluster's recipes in Zipf popularity order
+    recipe_cluster = rng.integers(0, n_clusters, n_recipes)
+    by_cluster = np.argsort(recipe_cluster, kind='stable')
+    cluster_sizes = np.bincount(recipe_cluster, minlength=n_clusters)
+    cluster_starts = np.cumsum(cluster_sizes) - cluster_sizes
+    user_cluster = rng.integers(0, n_clusters, n_users)[users]
+
+    in_cluster = rng.random(n) < 0.8
+    sizes = cluster_sizes[user_cluster]
+    rank = np.minimum(rng.zipf(1.3, n) - 1, np.maximum(sizes - 1, 0))
+    recipes = np.where(in_cluster & (sizes > 0), by_cluster[cluster_starts[user_cluster] + rank],
+                       np.minimum(rng.zipf(1.2, n) - 1, n_recipes - 1))
+    weights = rng.integers(1, 4, n).astype(np.float32)
+    return users, recipes, weights
+
+
+def holdout(users: np.ndarray, recipes: np.ndarray, n_eval: int, rng) -> Tuple[np.ndarray, np.ndarray]:
+    """Index of one interaction per sampled user to hold out, and those users"""
+    first = np.r_[0, np.flatnonzero(np.diff(users)) + 1]
+    counts = np.diff(np.r_[first, len(users)])
+    eval_users = rng.choice(len(first), size=min(n_eval, len(first)), replace=False)
+    held = first[eval_users] + rng.integers(0, counts[eval_users])
+    return held, users[held]
+
+
+def recall_at_k(score_user, train, held_recipes: np.ndarray, eval_users: np.ndarray, k: int = 10) -> float:
+    hits = 0
+    for user, recipe in zip(eval_users.tolist(), held_recipes.tolist()):
+        scores = score_user(user)
+        seen = train.indices[train.indptr[user]:train.indptr[user + 1]]
+        scores[seen] = -np.inf
+        top = np.argpartition(-scores, k)[:k]
+        hits += recipe in set(top.tolist())
+    return hits / len(eval_users)
+
+
+def serving_latency(recommender, user_ids, preferences, calls: int) -> Dict[str, float]:
+    timings = []
+    for i in range(calls):
+        started = time.perf_counter()
+        recommender.get_recommendations(user_ids[i % len(user_ids)], preferences[i % len(preferences)])
+        timings.append(time.perf_counter() - started)
+    timings = np.array(timings) * 1000
+    return {'median_ms': float(np.median(timings)), 'p90_ms': float(np.percentile(timings, 90))}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--per-user', type=float, default=10, help='Mean interactions per user')
+    parser.add_argument('--factors', type=int, default=64)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--cg-steps', type=int, default=3)
+    parser.add_argument('--eval-users', type=int, default=2000)
+    parser.add_argument('--calls', type=int, default=300, help='get_recommendations calls per mode')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    rng = np.random.default_rng(args.seed)
+    report: Dict[str, Any] = {'users': args.users, 'recipes': args.recipes, 'factors': args.factors}
+
+    started = time.perf_counter()
+    users, recipes, weights = synthetic_interactions(args.users, args.recipes, args.per_user, args.seed)
+    held, eval_users = holdout(users, recipes, args.eval_users, rng)
+    keep = np.ones(len(users), dtype=bool)
+    keep[held] = False
+    train = interaction_matrix(users[keep], recipes[keep], weights[keep], args.users, args.recipes)
+    report['interactions'] = int(train.nnz)
+    report['density'] = train.nnz / (args.users * args.recipes)
+    print(f"{args.users:,} users x {args.recipes:,} recipes, {train.nnz:,} interactions "
+          f"(density {report['density']:.2e}), generated in {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    als = ImplicitALS(args.factors, iterations=args.iterations, cg_steps=args.cg_steps, seed=args.seed).fit(train)
+    report['train_s'] = time.perf_counter() - started
+    print(f"ALS train: {report['train_s']:.1f} s ({report['train_s'] / args.iterations:.2f} s per iteration, "
+          f"{args.cg_steps} CG steps)")
+
+    popularity = np.asarray(train.sum(axis=0)).ravel().astype(np.float64)
+    held_recipes = recipes[held]
+    report['recall_at_10'] = {
+        'als': recall_at_k(lambda u: (als.item_factors @ als.user_factors[u]).astype(np.float64), train,
+                           held_recipes, eval_users),
+        'popularity': recall_at_k(lambda u: popularity.copy(), train, held_recipes, eval_users),
+    }
+    print(f"recall@10 on {len(eval_users)} held-out interactions: ALS {report['recall_at_10']['als']:.3f} | "
+          f"popularity {report['recall_at_10']['popularity']:.3f}")
+
+    from services.recipe_recommender import RecipeRecommender
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalogue_path = os.path.join(directory, 'recipes.cat')
+        model_path = os.path.join(directory, 'recipes.als.npz')
+        RecipeCatalogue.build(synthetic_recipes(args.recipes, args.seed), catalogue_path)
+        catalogue_version = RecipeCatalogue.open(catalogue_path).version
+        user_ids = [str(u) for u in range(args.users)]
+        CollaborativeModel.from_training(als, user_ids, catalogue_version).save(model_path)
+        report['model_bytes'] = os.path.getsize(model_path)
+
+        preferences = synthetic_preferences(256, args.seed)
+        sample_users = [str(u) for u in rng.integers(0, args.users, 256)]
+        report['serving'] = {}
+        for mode in ('content', 'collaborative', 'blend'):
+            os.environ.update(RECOMMENDER_MODE=mode, COLLABORATIVE_MODEL_PATH=model_path,
+                              RECIPE_INDEX_BACKEND='exact')
+            started = time.perf_counter()
+            recommender = RecipeRecommender(catalogue_path)
+            load_s = time.perf_counter() - started
+            latency = serving_latency(recommender, sample_users, preferences, args.calls)
+            report['serving'][mode] = dict(latency, load_s=load_s)
+            print(f"serve {mode:>13}: median {latency['median_ms']:.2f} ms | p90 {latency['p90_ms']:.2f} ms | "
+                  f"load {load_s:.2f} s")
+    print(f"model file: {report['model_bytes'] / 2 ** 20:.0f} MiB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if report['recall_at_10']['als'] <= report['recall_at_10']['popularity']:
+        print("FAILED: ALS does not beat the popularity baseline")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
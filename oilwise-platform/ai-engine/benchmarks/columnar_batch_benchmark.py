@@ -0,0 +1,176 @@
+"""End-to-end time and peak RSS of /api/batch/process for JSON, .npy zip and Arrow payloads
+
+Run from the ai-engine directory:
+    python -m benchmarks.columnar_batch_benchmark --rows 100000
+
+Builds one health_metrics batch and encodes it three ways: the JSON
+body ({"type": ..., "data": [...]}), a zip of .npy columns and an Arrow
+IPC stream (skipped when pyarrow is not installed). Each format runs in
+a fresh process, so ru_maxrss is that format's own peak: the process
+imports the app, reads the payload, answers one warm-up request, then
+posts the payload --repeats times through the Flask test client and
+decodes every response in the same format. Reports the median request
+time, the peak RSS and its growth over the warmed-up process. Exits
+non-zero if the columnar answers differ from the JSON ones.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.health_batch_benchmark import synthetic_metrics
+from services.columnar import ARROW_STREAM, NPY_ZIP, write_columns
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORMATS = {'json': 'application/json', 'npy_zip': NPY_ZIP, 'arrow': ARROW_STREAM}
+METRIC_COLUMNS = ('bmi', 'daily_oil_intake', 'blood_pressure_systolic', 'blood_pressure_diastolic', 'cholesterol')
+
+
+def clean_metrics(n_rows: int, seed: int) -> List[Dict[str, Any]]:
+    """Synthetic screening rows with only numeric values, which every format can carry"""
+    return [{name: value for name, value in metrics.items() if type(value) in (int, float)}
+            for metrics in synthetic_metrics(n_rows, seed)]
+
+
+def encode_payloads(rows: List[Dict[str, Any]], directory: str) -> Dict[str, str]:
+    """Write the batch in each available format; missing metrics are NaN in the columnar ones"""
+    paths = {'json': os.path.join(directory, 'batch.json')}
+    with open(paths['json'], 'w') as f:
+        json.dump({'type': 'health_metrics', 'data': rows}, f)
+
+    columns = {name: np.array([row.get(name, np.nan) for row in rows], dtype=np.float64) for name in METRIC_COLUMNS}
+    paths['npy_zip'] = os.path.join(directory, 'batch.npz')
+    np.savez(paths['npy_zip'], **columns)
+
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+    except ImportError:
+        return paths
+    table = pa.table(columns)
+    paths['arrow'] = os.path.join(directory, 'batch.arrow')
+    with pa.OSFile(paths['arrow'], 'wb') as sink, pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return paths
+
+
+def decode_response(name: str, body: bytes) -> Dict[str, np.ndarray]:
+    """Result columns from a response body, as a client would read them"""
+    if name == 'json':
+        rows = json.loads(body)['data']
+        return {'risk_score': np.array([row['risk_score'] for row in rows]),
+                'risk_level': np.array([row['risk_level'] for row in rows])}
+    if name == 'npy_zip':
+        with np.load(io.BytesIO(body)) as data:
+            return {column: data[column] for column in data.files}
+    import pyarrow as pa
+    import pyarrow.ipc
+    table = pyarrow.ipc.open_stream(pa.py_buffer(body)).read_all()
+    return {column: table.column(column).to_numpy() for column in table.column_names}
+
+
+def run_format(name: str, payload_path: str, repeats: int, results_path: str) -> Dict[str, Any]:
+    """Child process: time repeated requests in one format and report its peak RSS"""
+    logging.disable(logging.ERROR)
+    os.environ['BATCH_EXECUTOR'] = 'inline'
+    import app
+
+    client = app.app.test_client()
+    with open(payload_path, 'rb') as f:
+        body = f.read()
+    # A one-row warm-up builds the services and loads the format's modules
+    if name == 'json':
+        post = lambda payload: client.post('/api/batch/process', data=payload, content_type=FORMATS[name])
+        post(json.dumps({'type': 'health_metrics', 'data': [{'bmi': 22}]}))
+    else:
+        post = lambda payload: client.post('/api/batch/process?type=health_metrics', data=payload,
+                                           content_type=FORMATS[name])
+        post(write_columns({'bmi': np.array([22.0])}, FORMATS[name]))
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        response = post(body)
+        results = decode_response(name, response.get_data())
+        timings.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"{name}: status {response.status_code}")
+        del response
+
+    np.savez(results_path, risk_score=results['risk_score'],
+             risk_level=np.asarray(results['risk_level'], dtype=str))
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'payload_bytes': len(body),
+        'median_ms': statistics.median(timings) * 1000,
+        'min_ms': min(timings) * 1000,
+        'peak_rss_mb': peak_kb / 1024,
+        'request_rss_mb': (peak_kb - baseline_kb) / 1024,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    parser.add_argument('--child', nargs=3, metavar=('FORMAT', 'PAYLOAD', 'RESULTS'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        name, payload_path, results_path = args.child
+        print(json.dumps(run_format(name, payload_path, args.repeats, results_path)))
+        return 0
+
+    report: Dict[str, Any] = {'rows': args.rows, 'formats': {}}
+    answers = {}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = encode_payloads(clean_metrics(args.rows, args.seed), directory)
+        if 'arrow' not in paths:
+            print("pyarrow is not installed: skipping the Arrow format")
+        for name, path in paths.items():
+            results_path = os.path.join(directory, f'{name}.results.npz')
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.columnar_batch_benchmark', '--repeats', str(args.repeats),
+                 '--child', name, path, results_path],
+                cwd=ENGINE_DIR, capture_output=True, text=True, check=True,
+            ).stdout
+            report['formats'][name] = result = json.loads(output.strip().splitlines()[-1])
+            with np.load(results_path) as data:
+                answers[name] = (data['risk_score'], data['risk_level'])
+            print(f"{name:>8}: payload {result['payload_bytes'] / 2 ** 20:6.1f} MiB | "
+                  f"median {result['median_ms']:8.1f} ms | peak RSS {result['peak_rss_mb']:6.0f} MiB "
+                  f"(+{result['request_rss_mb']:.0f} MiB over the warmed-up process)")
+
+    mismatched = [name for name, (scores, levels) in answers.items()
+                  if not (np.array_equal(scores, answers['json'][0]) and np.array_equal(levels, answers['json'][1]))]
+    report['mismatched_formats'] = mismatched
+    for name in report['formats']:
+        if name != 'json':
+            speedup = report['formats']['json']['median_ms'] / report['formats'][name]['median_ms']
+            print(f"{name}: x{speedup:.1f} faster than JSON end to end")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if mismatched:
+        print(f"FAILED: {', '.join(mismatched)} results differ from the JSON results")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Parity check and throughput benchmark: ConsumptionPredictor.predict_batch vs predict
+
+Run from the ai-engine directory:
+    python -m benchmarks.consumption_batch_benchmark --users 20000
+
+Exits non-zero if any batch result differs from the per-user result beyond
+the tolerance.
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.consumption_kernel_benchmark import close, synthetic_histories
+from services.consumption_predictor import ConsumptionPredictor
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rel-tol', type=float, default=1e-7)
+    parser.add_argument('--abs-tol', type=float, default=1e-6)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    # Include users below the minimum history so the error rows are covered too
+    histories = synthetic_histories(args.users, args.seed, min_days=0)
+    user_ids = [str(i) for i in range(args.users)]
+    items = [{'user_id': user_id, 'data': history} for user_id, history in zip(user_ids, histories)]
+    predictor = ConsumptionPredictor()
+
+    # Ragged export form, as produced by a DB query ordered by user and day
+    offsets = np.zeros(args.users + 1, dtype=np.int64)
+    np.cumsum([len(h) for h in histories], out=offsets[1:])
+    values = np.array([record['oil_quantity'] for h in histories for record in h], dtype=np.float64)
+
+    gc.collect()
+    started = time.perf_counter()
+    batch = predictor.predict_batch(user_ids, values, offsets)
+    kernel_s = time.perf_counter() - started
+
+    gc.collect()
+    started = time.perf_counter()
+    actual = predictor.predict_many(items)
+    batch_s = time.perf_counter() - started
+
+    gc.collect()
+    started = time.perf_counter()
+    expected = [predictor.predict(item['user_id'], item['data']) for item in items]
+    scalar_s = time.perf_counter() - started
+
+    mismatches = [i for i, (a, e) in enumerate(zip(actual, expected)) if not close(a, e, args.rel_tol, args.abs_tol)]
+    report = {
+        'users': args.users,
+        'values': int(offsets[-1]),
+        'valid_users': int(batch['valid'].sum()),
+        'scalar_s': scalar_s,
+        'predict_many_s': batch_s,
+        'predict_batch_s': kernel_s,
+        'speedup_end_to_end': scalar_s / batch_s,
+        'speedup_kernel': scalar_s / kernel_s,
+        'mismatches': len(mismatches),
+    }
+
+    print(f"predict loop   {scalar_s:8.3f}s")
+    print(f"predict_many   {batch_s:8.3f}s  x{report['speedup_end_to_end']:.1f}")
+    print(f"predict_batch  {kernel_s:8.3f}s  x{report['speedup_kernel']:.1f}  (arrays only)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if len(actual) != len(expected) or mismatches:
+        for i in mismatches[:5]:
+            print(f"MISMATCH user {i}:\n  batch:  {actual[i]}\n  scalar: {expected[i]}")
+        print(f"FAILED: {len(mismatches)} of {args.users} predictions differ")
+        return 1
+
+    print(f"parity OK on {args.users} users (rel_tol={args.rel_tol}, abs_tol={args.abs_tol})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
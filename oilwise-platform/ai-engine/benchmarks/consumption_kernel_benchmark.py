@@ -0,0 +1,131 @@
+"""Parity check and benchmark: fused closed-form consumption kernel vs np.polyfit
+
+Run from the ai-engine directory:
+    python -m benchmarks.consumption_kernel_benchmark --users 2000
+
+Exits non-zero if any prediction differs from the previous polyfit-based
+implementation beyond the tolerance.
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from services.consumption_predictor import ConsumptionPredictor
+
+
+class PolyfitPredictor(ConsumptionPredictor):
+    """The previous predict implementation (two np.polyfit calls, separate statistics passes)"""
+
+    def predict(self, user_id: str, historical_data: List[Dict]) -> Dict[str, Any]:
+        consumption_values = [record.get('oil_quantity', 0) for record in historical_data]
+
+        x = np.arange(len(consumption_values))
+        y = np.array(consumption_values)
+        slope = np.polyfit(x, y, 1)[0]
+        trend = 'increasing' if slope > 0.5 else 'decreasing' if slope < -0.5 else 'stable'
+
+        poly = np.poly1d(np.polyfit(x, y, 2))
+        predictions = np.maximum(poly(np.arange(len(consumption_values), len(consumption_values) + 7)), 0)
+
+        values_array = np.array(consumption_values)
+        stats = {
+            'mean': float(np.mean(values_array)),
+            'median': float(np.median(values_array)),
+            'std_dev': float(np.std(values_array)),
+            'min': float(np.min(values_array)),
+            'max': float(np.max(values_array)),
+            'total': float(np.sum(values_array)),
+        }
+
+        return {
+            'user_id': user_id,
+            'current_average': float(np.mean(consumption_values)),
+            'trend': trend,
+            'predictions': {
+                'next_7_days': [float(p) for p in predictions],
+                'next_30_days_average': float(np.mean(predictions) * 4.3),
+            },
+            'statistics': stats,
+            'insights': self._generate_insights(consumption_values, trend, stats),
+            'recommendation': self._get_recommendation(trend, stats),
+        }
+
+
+def synthetic_histories(n_users: int, seed: int = 0, min_days: int = 3, max_days: int = 365) -> List[List[Dict]]:
+    """Per-user daily oil_quantity records with a random level, drift, curvature and noise"""
+    rng = np.random.default_rng(seed)
+    histories = []
+    for _ in range(n_users):
+        n = int(rng.integers(min_days, max_days + 1))
+        x = np.arange(n)
+        level = rng.uniform(10, 60)
+        series = level + rng.normal(0, 0.3) * x + rng.normal(0, 0.002) * x * x + rng.normal(0, 5, n)
+        series = np.round(np.maximum(series, 0), 2)
+        histories.append([{'oil_quantity': float(v)} for v in series])
+    return histories
+
+
+def close(a: Any, b: Any, rel: float, abs_tol: float) -> bool:
+    """Recursive comparison with a numeric tolerance"""
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(close(a[k], b[k], rel, abs_tol) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(close(x, y, rel, abs_tol) for x, y in zip(a, b))
+    if isinstance(a, float):
+        return math.isclose(a, b, rel_tol=rel, abs_tol=abs_tol)
+    return a == b
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rel-tol', type=float, default=1e-7)
+    parser.add_argument('--abs-tol', type=float, default=1e-6)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    histories = synthetic_histories(args.users, args.seed)
+    reference, fused = PolyfitPredictor(), ConsumptionPredictor()
+
+    started = time.perf_counter()
+    expected = [reference.predict(str(i), h) for i, h in enumerate(histories)]
+    polyfit_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = [fused.predict(str(i), h) for i, h in enumerate(histories)]
+    fused_s = time.perf_counter() - started
+
+    mismatches = [i for i, (a, e) in enumerate(zip(actual, expected)) if not close(a, e, args.rel_tol, args.abs_tol)]
+    report = {
+        'users': args.users,
+        'polyfit_us_per_call': polyfit_s / args.users * 1e6,
+        'fused_us_per_call': fused_s / args.users * 1e6,
+        'speedup': polyfit_s / fused_s,
+        'mismatches': len(mismatches),
+    }
+
+    print(f"polyfit predict: {report['polyfit_us_per_call']:8.1f} us/call")
+    print(f"fused predict:   {report['fused_us_per_call']:8.1f} us/call  x{report['speedup']:.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if mismatches:
+        i = mismatches[0]
+        print(f"MISMATCH user {i}:\n  fused:   {actual[i]}\n  polyfit: {expected[i]}")
+        print(f"FAILED: {len(mismatches)} of {args.users} predictions differ")
+        return 1
+
+    print(f"parity OK on {args.users} users (rel_tol={args.rel_tol}, abs_tol={args.abs_tol})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Parity check and latency benchmark: incremental consumption state vs full-history predict
+
+Run from the ai-engine directory:
+    python -m benchmarks.consumption_state_benchmark --users 500
+
+Replays every synthetic history through append_readings in random-sized
+chunks and compares the final prediction with predict over the whole
+history. Exits non-zero on a mismatch beyond the tolerance.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.consumption_kernel_benchmark import close, synthetic_histories
+from services.consumption_predictor import ConsumptionPredictor
+from services.consumption_state import FileStateStore, InMemoryStateStore, MEDIAN_WINDOW
+
+
+def replay(predictor: ConsumptionPredictor, histories, seed: int):
+    """Append each history in random chunks; return final predictions and per-append latencies"""
+    rng = np.random.default_rng(seed)
+    results, latencies = [], []
+    for user_id, history in enumerate(histories):
+        user_id = str(user_id)
+        position, result = 0, None
+        while position < len(history):
+            size = int(rng.integers(1, 8))
+            started = time.perf_counter()
+            result = predictor.append_readings(user_id, history[position:position + size])
+            latencies.append(time.perf_counter() - started)
+            position += size
+        results.append(result)
+    return results, np.array(latencies)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rel-tol', type=float, default=1e-7)
+    parser.add_argument('--abs-tol', type=float, default=1e-6)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    # Medians are exact while the history fits in the window
+    histories = synthetic_histories(args.users, args.seed, max_days=MEDIAN_WINDOW)
+    full = ConsumptionPredictor(InMemoryStateStore())
+
+    started = time.perf_counter()
+    expected = [full.predict(str(i), h) for i, h in enumerate(histories)]
+    predict_us = (time.perf_counter() - started) / args.users * 1e6
+
+    report = {'users': args.users, 'predict_full_history_us': predict_us, 'backends': {}}
+    print(f"predict (full history): {predict_us:8.1f} us/call")
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        for name, store in (('memory', InMemoryStateStore()), ('file', FileStateStore(directory))):
+            actual, latencies = replay(ConsumptionPredictor(store), histories, args.seed)
+            mismatches = [i for i, (a, e) in enumerate(zip(actual, expected))
+                          if not close(a, e, args.rel_tol, args.abs_tol)]
+            report['backends'][name] = {
+                'appends': len(latencies),
+                'p50_us': float(np.percentile(latencies, 50) * 1e6),
+                'p95_us': float(np.percentile(latencies, 95) * 1e6),
+                'mismatches': len(mismatches),
+            }
+            row = report['backends'][name]
+            print(f"append_readings [{name}]: p50 {row['p50_us']:8.1f} us  p95 {row['p95_us']:8.1f} us  "
+                  f"over {row['appends']} appends")
+            for i in mismatches[:3]:
+                print(f"MISMATCH user {i}:\n  incremental: {actual[i]}\n  predict:     {expected[i]}")
+            if mismatches:
+                print(f"FAILED [{name}]: {len(mismatches)} of {args.users} predictions differ")
+                failed = True
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if failed:
+        return 1
+
+    print(f"parity OK on {args.users} users (rel_tol={args.rel_tol}, abs_tol={args.abs_tol})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
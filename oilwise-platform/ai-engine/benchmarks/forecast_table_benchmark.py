@@ -0,0 +1,103 @@
+"""Parity check and benchmark: predict served from the nightly forecast table vs live fitting
+
+Run from the ai-engine directory:
+    python -m benchmarks.forecast_table_benchmark --users 20000
+
+Exports synthetic histories as JSON lines, materializes the forecast
+table with the nightly build command, then answers every user's predict
+call three ways: live, from the table with the unchanged history (a
+hit), and with one more reading appended (a miss that must fall back to
+live fitting). Reports build time, table bytes per user and per-call
+latencies. Exits non-zero if a table answer differs from the live one
+beyond the tolerance, or a changed history is served from the table.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.consumption_kernel_benchmark import close, synthetic_histories
+from services.consumption_predictor import ConsumptionPredictor
+from services.forecast_table import ForecastTableSource, main as forecast_table_main
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rel-tol', type=float, default=1e-7)
+    parser.add_argument('--abs-tol', type=float, default=1e-6)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    histories = synthetic_histories(args.users, args.seed, min_days=1)
+    user_ids = [f'user_{i}' for i in range(args.users)]
+    changed = [history + [{'oil_quantity': 25.0}] for history in histories]
+
+    with tempfile.TemporaryDirectory() as directory:
+        export_path = os.path.join(directory, 'histories.jsonl')
+        table_path = os.path.join(directory, 'forecasts.fct')
+        with open(export_path, 'w') as f:
+            for user_id, history in zip(user_ids, histories):
+                f.write(json.dumps({'user_id': user_id, 'data': history}) + '\n')
+
+        started = time.perf_counter()
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            forecast_table_main(['build', export_path, '-o', table_path])
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        build_s = time.perf_counter() - started
+        table_bytes = os.path.getsize(table_path)
+
+        live = ConsumptionPredictor()
+        served = ConsumptionPredictor(forecast_source=ForecastTableSource(table_path, ConsumptionPredictor.MODEL_VERSION))
+        table = served.forecast_source.current()
+
+        timings = {}
+        results = {}
+        for name, predictor, inputs in (('live', live, histories), ('table_hit', served, histories),
+                                        ('table_miss', served, changed), ('live_changed', live, changed)):
+            started = time.perf_counter()
+            results[name] = [predictor.predict(user_id, history) for user_id, history in zip(user_ids, inputs)]
+            timings[name] = (time.perf_counter() - started) / args.users * 1e6
+
+    mismatches = sum(not close(a, b, args.rel_tol, args.abs_tol) for a, b in zip(results['live'], results['table_hit']))
+    stale = sum(not close(a, b, args.rel_tol, args.abs_tol)
+                for a, b in zip(results['live_changed'], results['table_miss']))
+    report = {
+        'users': args.users,
+        'table_users': len(table),
+        'build_s': build_s,
+        'table_bytes': table_bytes,
+        'bytes_per_user': table_bytes / max(len(table), 1),
+        'predict_us': timings,
+        'hit_mismatches': mismatches,
+        'stale_answers': stale,
+    }
+    print(f"build: {args.users:,} users in {build_s:.2f} s | table {table_bytes / 2 ** 20:.1f} MiB "
+          f"({report['bytes_per_user']:.0f} bytes per user, {len(table):,} with enough history)")
+    print(f"predict per call: live {timings['live']:.1f} us | table hit {timings['table_hit']:.1f} us "
+          f"(x{timings['live'] / timings['table_hit']:.1f}) | changed history {timings['table_miss']:.1f} us")
+    print(f"table hits matching live: {args.users - mismatches}/{args.users} | "
+          f"changed histories answered live: {args.users - stale}/{args.users}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if mismatches or stale:
+        print("FAILED: table answers differ from live predictions or a changed history was served from the table")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Parity check and throughput benchmark: HealthAnalyzer.assess_risk_batch vs assess_risk
+
+Run from the ai-engine directory:
+    python -m benchmarks.health_batch_benchmark --rows 100000
+
+Exits non-zero if any batch result differs from the per-item result.
+"""
+import argparse
+import gc
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from services.health_analyzer import HealthAnalyzer
+
+# Values sitting exactly on every threshold, to exercise >= vs > boundaries
+EDGE_VALUES = {
+    'bmi': [30, 35, 29.999, 34.999],
+    'daily_oil_intake': [33.3, 49.95, 66.6, 66.61, 0],
+    'blood_pressure_systolic': [140, 160, 139.9, 159.9],
+    'blood_pressure_diastolic': [90, 100, 89.9, 99.9],
+    'cholesterol': [200, 240, 199.9, 239.9],
+}
+
+
+def synthetic_metrics(n_rows: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Screening rows with missing fields, ints, floats, threshold edges and a few malformed values"""
+    rng = np.random.default_rng(seed)
+    ranges = {
+        'bmi': (15, 45),
+        'daily_oil_intake': (5, 120),
+        'blood_pressure_systolic': (95, 190),
+        'blood_pressure_diastolic': (60, 120),
+        'cholesterol': (140, 300),
+    }
+
+    rows = []
+    for i in range(n_rows):
+        metrics = {}
+        for name, (low, high) in ranges.items():
+            roll = rng.random()
+            if roll < 0.15:
+                continue
+            if roll < 0.25:
+                metrics[name] = EDGE_VALUES[name][rng.integers(len(EDGE_VALUES[name]))]
+            elif roll < 0.5:
+                metrics[name] = int(rng.integers(low, high))
+            else:
+                metrics[name] = float(rng.uniform(low, high))
+        if rng.random() < 0.2:
+            metrics['age'] = int(rng.integers(18, 80))
+        if i % 997 == 0:
+            metrics['bmi'] = 'n/a'
+        if i % 1499 == 0:
+            metrics['blood_pressure_diastolic'] = None
+        rows.append(metrics)
+
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    # The malformed rows log one error each on both paths
+    logging.disable(logging.ERROR)
+
+    analyzer = HealthAnalyzer()
+    rows = synthetic_metrics(args.rows, args.seed)
+
+    gc.collect()
+    started = time.perf_counter()
+    actual = analyzer.assess_risk_batch(rows)
+    batch_s = time.perf_counter() - started
+
+    gc.collect()
+    started = time.perf_counter()
+    expected = [analyzer.assess_risk(metrics) for metrics in rows]
+    scalar_s = time.perf_counter() - started
+
+    mismatches = [i for i, (a, e) in enumerate(zip(actual, expected)) if a != e]
+    report = {
+        'rows': args.rows,
+        'scalar_s': scalar_s,
+        'batch_s': batch_s,
+        'scalar_rows_per_s': args.rows / scalar_s,
+        'batch_rows_per_s': args.rows / batch_s,
+        'speedup': scalar_s / batch_s,
+        'mismatches': len(mismatches),
+    }
+
+    print(f"assess_risk       {scalar_s:8.3f}s  {report['scalar_rows_per_s']:12,.0f} rows/s")
+    print(f"assess_risk_batch {batch_s:8.3f}s  {report['batch_rows_per_s']:12,.0f} rows/s  x{report['speedup']:.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if len(actual) != len(expected) or mismatches:
+        for i in mismatches[:5]:
+            print(f"MISMATCH row {i}: {rows[i]}\n  batch:  {actual[i]}\n  scalar: {expected[i]}")
+        print(f"FAILED: {len(mismatches)} of {args.rows} rows differ")
+        return 1
+
+    print(f"parity OK on {args.rows} rows")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
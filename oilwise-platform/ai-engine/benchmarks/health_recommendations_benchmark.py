@@ -0,0 +1,81 @@
+"""Micro-benchmark: recommendation lookup by factor bitmask vs substring-scanning factor text
+
+Run from the ai-engine directory:
+    python -m benchmarks.health_recommendations_benchmark
+
+Exits non-zero if the table disagrees with the previous text-scanning
+implementation for any reachable (factors, level) combination.
+"""
+import argparse
+import sys
+import timeit
+from typing import List
+
+from services.health_analyzer import HealthAnalyzer, RECOMMENDATION_TABLE, RISK_LEVELS, _BAND_TABLE
+
+
+def scan_recommendations(factors: List[str], level: str) -> List[str]:
+    """The previous HealthAnalyzer._generate_recommendations, kept as the reference"""
+    recommendations = []
+
+    if any('oil' in f.lower() for f in factors):
+        recommendations.append('Reduce daily oil intake gradually')
+        recommendations.append('Use low-oil cooking methods: steaming, grilling, baking')
+        recommendations.append('Try air-frying instead of deep-frying')
+
+    if any('obesity' in f.lower() or 'overweight' in f.lower() for f in factors):
+        recommendations.append('Increase physical activity to 150 minutes per week')
+        recommendations.append('Consult a nutritionist for personalized diet plan')
+
+    if any('blood pressure' in f.lower() for f in factors):
+        recommendations.append('Reduce salt intake')
+        recommendations.append('Increase potassium-rich foods')
+        recommendations.append('Consult a healthcare provider')
+
+    if any('cholesterol' in f.lower() for f in factors):
+        recommendations.append('Increase fiber intake')
+        recommendations.append('Reduce saturated fat consumption')
+
+    if level == 'critical':
+        recommendations.insert(0, 'Seek immediate medical consultation')
+
+    return recommendations
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=200000, help='Calls per timing run')
+    args = parser.parse_args(argv)
+
+    combos = [(factors, mask, level) for _, factors, mask in _BAND_TABLE.values() for level in RISK_LEVELS]
+    mismatches = [
+        (factors, level) for factors, mask, level in combos
+        if list(RECOMMENDATION_TABLE[(mask, level)]) != scan_recommendations(list(factors), level)
+    ]
+
+    # Worst case for the scan: all four categories present
+    factors, mask, level = max(combos, key=lambda c: len(c[0]))
+    factor_list = list(factors)
+    scan_s = min(timeit.repeat(lambda: scan_recommendations(factor_list, level), number=args.number, repeat=5))
+    table_s = min(timeit.repeat(lambda: list(RECOMMENDATION_TABLE[(mask, level)]), number=args.number, repeat=5))
+
+    analyzer = HealthAnalyzer()
+    metrics = {'bmi': 36, 'daily_oil_intake': 80, 'blood_pressure_systolic': 165, 'cholesterol': 250}
+    assess_s = min(timeit.repeat(lambda: analyzer.assess_risk(metrics), number=args.number, repeat=5))
+
+    per_call = lambda seconds: seconds / args.number * 1e9
+    print(f"recommendations, text scan:    {per_call(scan_s):8.0f} ns/call")
+    print(f"recommendations, bitmask table: {per_call(table_s):8.0f} ns/call  "
+          f"(saves {per_call(scan_s - table_s):.0f} ns, x{scan_s / table_s:.1f})")
+    print(f"assess_risk end to end:         {per_call(assess_s):8.0f} ns/call")
+
+    if mismatches:
+        print(f"FAILED: {len(mismatches)} of {len(combos)} combinations differ, e.g. {mismatches[0]}")
+        return 1
+
+    print(f"parity OK on all {len(combos)} reachable combinations")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
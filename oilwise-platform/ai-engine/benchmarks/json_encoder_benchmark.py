@@ -0,0 +1,140 @@
+"""Byte-parity check and throughput benchmark: ResponseEncoder vs Flask's standard jsonify
+
+Run from the ai-engine directory:
+    python -m benchmarks.json_encoder_benchmark --rows 100000
+
+Encodes a /api/batch/process-sized health response (one assess_risk
+result per row) through the previous jsonify provider and the new one,
+and the column arrays of a consumption predict_batch both as NumPy arrays
+and as tolist() builtins. Edge values whose orjson formatting differs
+from the standard library (non-ASCII, exponents, NaN next to None, big
+ints, NumPy scalars, float32) are checked on their own. Exits non-zero if any output differs
+by a single byte.
+"""
+import argparse
+import datetime
+import gc
+import json
+import logging
+import sys
+import time
+from typing import Any, Callable, Dict
+
+import numpy as np
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.consumption_kernel_benchmark import synthetic_histories
+from benchmarks.health_batch_benchmark import synthetic_metrics
+from services.consumption_predictor import ConsumptionPredictor
+from services.health_analyzer import HealthAnalyzer
+from services.json_encoder import ResponseEncoder, create_json_provider, orjson
+
+EDGE_PAYLOADS = [
+    {'name': 'Ghee ಚಿತ್ರಾನ್ನ', 'note': 'dash — and \x7f and  '},
+    {'values': [1e16, 1e-7, 1.5e300, -0.0, 0.1, 2.5e-5, 123456789.125]},
+    {'nan': float('nan'), 'inf': float('inf'), 'none': None},
+    {'big': 2 ** 70, 'negative': -2 ** 64, 'bool': True},
+    {'numpy': [np.float64(0.1), np.int64(7), np.bool_(False), np.float32(0.5)]},
+    {'float32': np.float32(0.1), 'float32s': np.array([0.1, 1 / 3, 2.5], dtype=np.float32), 'half': np.float16(0.1)},
+    {'none': None, 'score': 0.25, 'nested': [None, {'nan_array': np.array([1.0, np.nan]), 'inf': np.float64('inf')}]},
+    {'strided': np.arange(12, dtype=np.float64).reshape(3, 4)[:, 1], 'big_endian': np.arange(3, dtype='>f8')},
+    {'array': np.arange(6, dtype=np.float64).reshape(2, 3) / 3, 'ints': np.arange(4), 'mask': np.array([True, False])},
+    {'date': datetime.date(2024, 1, 2), 'when': datetime.datetime(2024, 1, 2, 3, 4, 5)},
+    {1: 'int key', 2: 'null inside a string'},
+    [],
+    'plain string',
+]
+
+
+def builtins(value: Any) -> Any:
+    """value with NumPy arrays and scalars converted, for the standard provider"""
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {key: builtins(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [builtins(item) for item in value]
+    return value
+
+
+def encode_with(provider_factory: Callable[[Flask], Any], payload: Any) -> bytes:
+    """Body of jsonify(payload) under the given JSON provider"""
+    app = Flask(__name__)
+    app.json = provider_factory(app)
+    with app.app_context():
+        return app.json.response(payload).get_data()
+
+
+def timed(encode: Callable[[], bytes], repeat: int) -> Dict[str, Any]:
+    best, body = float('inf'), b''
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        body = encode()
+        best = min(best, time.perf_counter() - started)
+    return {'seconds': best, 'body': body}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    response = {'success': True, 'data': HealthAnalyzer().assess_risk_batch(synthetic_metrics(args.rows, args.seed))}
+
+    n_users = max(args.rows // 10, 1)
+    histories = synthetic_histories(n_users, args.seed)
+    offsets = np.zeros(n_users + 1, dtype=np.int64)
+    np.cumsum([len(h) for h in histories], out=offsets[1:])
+    values = np.array([record['oil_quantity'] for h in histories for record in h], dtype=np.float64)
+    columns = ConsumptionPredictor().predict_batch([str(i) for i in range(n_users)], values, offsets)
+
+    standard = lambda app: DefaultJSONProvider(app)
+    encoders = {'stdlib': lambda app: create_json_provider(app, ResponseEncoder('stdlib', DefaultJSONProvider.default))}
+    if orjson is not None:
+        encoders['orjson'] = lambda app: create_json_provider(app, ResponseEncoder('orjson', DefaultJSONProvider.default))
+
+    report = {'rows': args.rows, 'orjson': orjson is not None, 'encoders': {}}
+    failed = False
+
+    reference = timed(lambda: encode_with(standard, response), args.repeat)
+    array_reference = timed(lambda: encode_with(standard, builtins(columns)), args.repeat)
+    print(f"jsonify (standard provider): {reference['seconds']:6.3f}s for {len(reference['body']) / 2 ** 20:.1f} MiB | "
+          f"predict_batch columns via tolist(): {array_reference['seconds']:6.3f}s")
+
+    for name, factory in encoders.items():
+        records = timed(lambda: encode_with(factory, response), args.repeat)
+        arrays = timed(lambda: encode_with(factory, columns), args.repeat)
+        edges = [encode_with(factory, payload) == encode_with(standard, builtins(payload)) for payload in EDGE_PAYLOADS]
+
+        parity = records['body'] == reference['body'] and arrays['body'] == array_reference['body'] and all(edges)
+        failed |= not parity
+        report['encoders'][name] = {
+            'records_s': records['seconds'],
+            'records_speedup': reference['seconds'] / records['seconds'],
+            'arrays_s': arrays['seconds'],
+            'arrays_speedup': array_reference['seconds'] / arrays['seconds'],
+            'edge_cases_identical': sum(edges),
+            'parity': parity,
+        }
+        print(f"{name:>7}: records {records['seconds']:6.3f}s x{reference['seconds'] / records['seconds']:.1f} | "
+              f"arrays {arrays['seconds']:6.3f}s x{array_reference['seconds'] / arrays['seconds']:.1f} | "
+              f"edge cases {sum(edges)}/{len(edges)} identical{'' if parity else '  MISMATCH'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if failed:
+        print("FAILED: encoded responses differ from the standard jsonify output")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
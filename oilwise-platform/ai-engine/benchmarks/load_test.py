@@ -0,0 +1,152 @@
+"""Closed-loop HTTP load test comparing AI engine serving modes (e.g. gunicorn/Flask vs uvicorn/ASGI)
+
+Start the servers, then run from the ai-engine directory:
+    gunicorn --bind :5000 --workers 4 --timeout 120 app:app
+    uvicorn asgi_app:app --port 5001 --workers 1
+    python -m benchmarks.load_test --target flask=http://localhost:5000 \
+        --target asgi=http://localhost:5001 --concurrency 4 16 64 256 --duration 20
+
+Each client thread keeps one connection open and sends requests back to
+back, cycling through a mix of the single-item endpoints. Before loading,
+the same requests are sent to every target and the JSON bodies compared,
+so a contract difference between the modes fails the run.
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+REQUESTS = [
+    ('/api/recipes/recommend', {
+        'user_id': 'load-test',
+        'preferences': {'cuisinePreferences': ['south_indian'], 'dietaryRestrictions': ['vegetarian'],
+                        'healthGoals': ['weight_loss']},
+    }),
+    ('/api/health/assess-risk', {
+        'metrics': {'bmi': 31.2, 'daily_oil_intake': 52, 'blood_pressure_systolic': 142,
+                    'blood_pressure_diastolic': 91, 'cholesterol': 215},
+    }),
+    ('/api/consumption/predict', {
+        'user_id': 'load-test',
+        'historical_data': [{'oil_quantity': 30 + (i % 7) * 2.5} for i in range(60)],
+    }),
+    ('/api/personalization/profile', {
+        'user_id': 'load-test',
+        'user_data': {'household_size': 4, 'cooking_experience': 'beginner'},
+    }),
+    ('/api/batch/process', {
+        'type': 'health_metrics',
+        'data': [{'bmi': 20 + i % 15, 'daily_oil_intake': 20 + i} for i in range(50)],
+    }),
+]
+
+
+def post(connection: http.client.HTTPConnection, path: str, body: bytes) -> Tuple[int, bytes]:
+    connection.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def check_contract(targets: Dict[str, str]) -> List[str]:
+    """Send every request to every target; report endpoints whose responses differ"""
+    differences = []
+    for path, payload in REQUESTS:
+        responses = {}
+        for name, url in targets.items():
+            connection = connect(url)
+            status, body = post(connection, path, json.dumps(payload).encode())
+            connection.close()
+            responses[name] = (status, json.loads(body))
+        if len({json.dumps(response, sort_keys=True) for response in responses.values()}) > 1:
+            differences.append(path)
+    return differences
+
+
+def connect(url: str) -> http.client.HTTPConnection:
+    parts = urlsplit(url)
+    return http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=300)
+
+
+def load(url: str, concurrency: int, duration: float) -> Dict[str, Any]:
+    bodies = [(path, json.dumps(payload).encode()) for path, payload in REQUESTS]
+    latencies: List[List[float]] = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    deadline = time.perf_counter() + duration
+    start = threading.Barrier(concurrency + 1)
+
+    def client(slot: int) -> None:
+        connection = connect(url)
+        start.wait()
+        i = slot
+        while time.perf_counter() < deadline:
+            path, body = bodies[i % len(bodies)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                status, _ = post(connection, path, body)
+                if status >= 400:
+                    errors[slot] += 1
+            except (OSError, http.client.HTTPException):
+                errors[slot] += 1
+                connection.close()
+                connection = connect(url)
+                continue
+            latencies[slot].append(time.perf_counter() - started)
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(slot,), daemon=True) for slot in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples = np.array([latency for slot in latencies for latency in slot])
+    result = {'concurrency': concurrency, 'requests': int(samples.size), 'errors': sum(errors),
+              'rps': samples.size / elapsed}
+    if samples.size:
+        for p in (50, 95, 99):
+            result[f'p{p}_ms'] = float(np.percentile(samples, p) * 1000)
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', action='append', required=True, help='name=http://host:port (repeatable)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 16, 64])
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per concurrency level')
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    targets = dict(target.split('=', 1) for target in args.target)
+    differences = check_contract(targets) if len(targets) > 1 else []
+    for path in differences:
+        print(f"CONTRACT MISMATCH on {path}")
+
+    report = {'targets': targets, 'contract_mismatches': differences, 'results': {}}
+    for name, url in targets.items():
+        report['results'][name] = []
+        for concurrency in args.concurrency:
+            result = load(url, concurrency, args.duration)
+            report['results'][name].append(result)
+            print(f"{name:>8s}  c={concurrency:<4d} {result['rps']:9.1f} req/s  "
+                  f"p50 {result.get('p50_ms', 0):8.1f} ms  p95 {result.get('p95_ms', 0):8.1f} ms  "
+                  f"p99 {result.get('p99_ms', 0):8.1f} ms  errors {result['errors']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if differences else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""Accuracy, overhead and cross-worker merge check for services.metrics
+
+Run from the ai-engine directory:
+    python -m benchmarks.metrics_benchmark --samples 200000
+
+Compares histogram quantiles on log-normal latencies with exact
+percentiles, times observe() and Stopwatch.lap(), measures the per-request
+cost of the Flask middleware on /health, and has two processes write
+snapshots to one METRICS_DIR that a third merges, checking the merged
+counts and quantiles against a single histogram fed every sample. Exits
+non-zero if a quantile is off by more than the bucket precision or the
+merge loses samples.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import re
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from services.metrics import QUANTILES, SUB_BUCKETS, Histogram, MetricsRegistry, quantiles
+
+# Worst-case relative error of a log-linear bucket, plus float slack
+MAX_RELATIVE_ERROR = 1 / SUB_BUCKETS + 1e-9
+
+
+def write_snapshot(directory: str, samples: List[float]) -> None:
+    """Worker process: observe samples into a METRICS_DIR registry and flush it"""
+    registry = MetricsRegistry(directory=directory)
+    histogram = registry.histogram('merge_seconds', 'Merge check')
+    for value in samples:
+        histogram.observe(value)
+    registry.counter('merge_total', 'Merge check').inc(len(samples))
+    registry._flush(registry.snapshot())
+
+
+def parse(text: str) -> Dict[str, float]:
+    """Sample lines of a Prometheus text exposition, keyed by name and labels"""
+    return {match.group(1): float(match.group(2))
+            for match in re.finditer(r'^([^#\s][^ ]*) (\S+)$', text, re.MULTILINE)}
+
+
+def per_call_ns(call, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        call()
+    return (time.perf_counter() - started) / n * 1e9
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    rng = np.random.default_rng(args.seed)
+    # Latencies around 2 ms with a long tail, in seconds
+    samples = rng.lognormal(np.log(0.002), 1.0, args.samples)
+    report = {'samples': args.samples}
+    failed = False
+
+    histogram = Histogram()
+    for value in samples.tolist():
+        histogram.observe(value)
+    estimated = quantiles(histogram.window(), histogram.scale)
+    # The estimate is the highest value of the bucket holding the exact order statistic
+    exact = {q: float(np.sort(samples)[int(np.ceil(q * len(samples))) - 1]) for q in QUANTILES}
+    errors = {q: abs(estimated[q] - exact[q]) / exact[q] for q in QUANTILES}
+    accurate = all(error <= MAX_RELATIVE_ERROR for error in errors.values())
+    failed |= not accurate
+    report['quantiles'] = {str(q): {'exact': exact[q], 'estimated': estimated[q], 'relative_error': errors[q]}
+                           for q in QUANTILES}
+    print('quantiles: ' + ' | '.join(f"p{q * 100:g} {exact[q] * 1000:.3f} ms ~ {estimated[q] * 1000:.3f} ms "
+                                     f"({errors[q]:.1%})" for q in QUANTILES) + ('' if accurate else '  INACCURATE'))
+
+    registry = MetricsRegistry()
+    stages = registry.stages('benchmark')
+    watch = stages.start()
+    report['observe_ns'] = per_call_ns(lambda: histogram.observe(0.0015), args.samples)
+    report['lap_ns'] = per_call_ns(lambda: watch.lap('stage'), args.samples)
+    print(f"observe {report['observe_ns']:.0f} ns | Stopwatch.lap {report['lap_ns']:.0f} ns")
+
+    # Middleware cost per request: the same app with the registry switched off and on
+    from app import app
+    from services.metrics import metrics
+    client = app.test_client()
+    timings = {}
+    for enabled in (False, True, False, True):
+        metrics.enabled = enabled
+        elapsed = per_call_ns(lambda: client.get('/health'), args.requests) / 1000
+        timings[enabled] = min(timings.get(enabled, elapsed), elapsed)
+    metrics.enabled = True
+    report['health_us'] = {'metrics_off': timings[False], 'metrics_on': timings[True],
+                           'overhead': timings[True] - timings[False]}
+    print(f"/health via test client: {timings[False]:.1f} us without metrics | {timings[True]:.1f} us with "
+          f"(+{timings[True] - timings[False]:.1f} us per request)")
+
+    # Two workers' snapshots merged by a third process's /metrics
+    with tempfile.TemporaryDirectory() as directory:
+        halves = [samples[:len(samples) // 2].tolist(), samples[len(samples) // 2:].tolist()]
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=write_snapshot, args=(directory, half)) for half in halves]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        merged = parse(MetricsRegistry(directory=directory).render())
+
+    count_ok = merged.get('ai_engine_merge_seconds_count') == len(samples) == merged.get('ai_engine_merge_total')
+    merged_quantiles = {q: merged.get(f'ai_engine_merge_seconds{{quantile="{q}"}}') for q in QUANTILES}
+    quantiles_ok = all(merged_quantiles[q] == estimated[q] for q in QUANTILES)
+    failed |= not (count_ok and quantiles_ok)
+    report['merge'] = {'count_ok': count_ok, 'quantiles_match_single_histogram': quantiles_ok}
+    print(f"2-worker merge: count {'OK' if count_ok else 'MISMATCH'} | "
+          f"quantiles {'identical to one histogram' if quantiles_ok else 'MISMATCH'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if failed:
+        print("FAILED: quantiles outside the bucket precision or merged metrics lost samples")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""Throughput and batch-size benchmark: micro-batched vs direct single-item calls
+
+Run from the ai-engine directory:
+    python -m benchmarks.micro_batch_benchmark --clients 64 --requests 20000
+
+Concurrent client threads each send single recommend / assess-risk calls,
+first directly to the services and then through a MicroBatcher. Reports
+throughput, latency and the achieved batch sizes, and exits non-zero if a
+batched result differs from the direct one.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.health_batch_benchmark import synthetic_metrics
+from services.health_analyzer import HealthAnalyzer
+from services.micro_batcher import MicroBatcher
+from services.recipe_catalogue import CUISINE_SLOTS, GOAL_SLOTS, RESTRICTION_SLOTS, RecipeCatalogue
+from services.recipe_recommender import RecipeRecommender
+
+
+def synthetic_recipes(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Backend-shaped recipe rows with random cuisine, tags and oil content"""
+    rng = np.random.default_rng(seed)
+    cuisines = [name.replace('_', ' ').title() for name in CUISINE_SLOTS]
+    return [{
+        'id': f'recipe_{i}',
+        'name': f'Recipe {i}',
+        'cuisineType': cuisines[rng.integers(len(cuisines))],
+        'oil_content': float(rng.uniform(0, 10)),
+        'dietaryRestrictions': [tag for tag in RESTRICTION_SLOTS if rng.random() < 0.4],
+        'healthBenefits': [goal for goal in GOAL_SLOTS if rng.random() < 0.4],
+    } for i in range(n)]
+
+
+def synthetic_preferences(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    pick = lambda names, p: [name for name in names if rng.random() < p]
+    return [{
+        'cuisinePreferences': pick(list(CUISINE_SLOTS), 0.3),
+        'dietaryRestrictions': pick(list(RESTRICTION_SLOTS), 0.15),
+        'healthGoals': pick(list(GOAL_SLOTS), 0.3),
+    } for _ in range(n)]
+
+
+def same_results(a: Any, b: Any, abs_tol: float = 1e-6) -> bool:
+    """Equality, except float scores may differ in the last float32 bits (BLAS gemm vs gemv)"""
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(same_results(a[k], b[k], abs_tol) for k in a)
+    if isinstance(a, list):
+        return isinstance(b, list) and len(a) == len(b) and all(same_results(x, y, abs_tol) for x, y in zip(a, b))
+    if isinstance(a, float) and isinstance(b, float):
+        return abs(a - b) <= abs_tol
+    return a == b
+
+
+def drive(call: Callable[[Any], Any], items: List[Any], clients: int) -> Dict[str, Any]:
+    """Run every item through call from `clients` threads; results in input order"""
+    results = [None] * len(items)
+    latencies = np.empty(len(items))
+    cursor = iter(range(len(items)))
+    lock = threading.Lock()
+
+    def client() -> None:
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            results[i] = call(items[i])
+            latencies[i] = time.perf_counter() - started
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'results': results,
+        'per_s': len(items) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p95_ms': float(np.percentile(latencies, 95) * 1000),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    parser.add_argument('--recipes', type=int, default=50000, help='Synthetic catalogue size')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    with tempfile.TemporaryDirectory() as directory:
+        catalogue_path = os.path.join(directory, 'recipes.cat')
+        RecipeCatalogue.build(synthetic_recipes(args.recipes, args.seed), catalogue_path)
+        recommender = RecipeRecommender(catalogue_path)
+    analyzer = HealthAnalyzer()
+    endpoints = {
+        'recommend': (lambda p: recommender.get_recommendations(None, p), recommender.get_recommendations_batch,
+                      synthetic_preferences(args.requests, args.seed)),
+        'assess_risk': (analyzer.assess_risk, analyzer.assess_risk_batch, synthetic_metrics(args.requests, args.seed)),
+    }
+
+    report = {'clients': args.clients, 'requests': args.requests, 'recipes': args.recipes, 'endpoints': {}}
+    failed = False
+    for name, (single, batch, items) in endpoints.items():
+        direct = drive(single, items, args.clients)
+        batcher = MicroBatcher(batch, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, name=name)
+        batched = drive(batcher.submit, items, args.clients)
+        batcher.shutdown()
+        stats = batcher.get_stats()
+
+        parity = same_results(batched['results'], direct['results'])
+        failed |= not parity
+        report['endpoints'][name] = {
+            'direct': {k: v for k, v in direct.items() if k != 'results'},
+            'batched': {k: v for k, v in batched.items() if k != 'results'},
+            'speedup': batched['per_s'] / direct['per_s'],
+            'batching': stats,
+            'parity': parity,
+        }
+        print(f"{name}: direct {direct['per_s']:9,.0f}/s p50 {direct['p50_ms']:.2f} ms | "
+              f"batched {batched['per_s']:9,.0f}/s p50 {batched['p50_ms']:.2f} ms  "
+              f"x{batched['per_s'] / direct['per_s']:.1f}  mean batch {stats['mean_batch_size']:.1f} "
+              f"(max {stats['max_batch_size']}){'' if parity else '  MISMATCH'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if failed:
+        print("FAILED: batched results differ from direct results")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Parity check and throughput benchmark: bulk create_profiles vs per-user create_profile
+
+Run from the ai-engine directory:
+    python -m benchmarks.profile_bulk_benchmark --users 50000
+
+Onboards the same synthetic users once per profile store backend, one
+create_profile call at a time and then with one create_profiles call,
+and compares the responses and the stored profiles. Segment counts from
+the store are checked against a Python scan of the profiles. Exits
+non-zero on any mismatch.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.profile_store_benchmark import synthetic_user_data
+from services.local_redis import LocalRedis
+from services.personalization_engine import PersonalizationEngine
+from services.profile_store import (
+    SEGMENT_FIELDS, InMemoryProfileStore, RedisProfileStore, SQLiteProfileStore, UserProfile,
+)
+
+# Rows the vectorized path must hand to create_profile, or band exactly like it
+EDGE_USERS = [
+    {'age': 18, 'health_data': {'bmi': 18.5}},
+    {'age': 29.999, 'health_data': {'bmi': 25}},
+    {'age': 50, 'health_data': {'bmi': 30.0}},
+    {'age': True, 'health_data': {'bmi': float('nan')}},
+    {'age': '42', 'health_data': {'bmi': 22}},
+    {'age': 30, 'health_data': None},
+    {'age': 30, 'preferences': 'vegetarian'},
+    {'user_type': ['school'], 'preferences': {'healthGoals': 'weight_loss'}},
+    'not a dict',
+]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    users = json.loads(json.dumps(synthetic_user_data(args.users, args.seed))) + EDGE_USERS
+    user_ids = [f'user_{i}' for i in range(len(users))]
+
+    report = {'users': len(users), 'backends': {}}
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        backends = {
+            'memory': lambda tag: InMemoryProfileStore(len(users)),
+            'sqlite': lambda tag: SQLiteProfileStore(os.path.join(directory, f'{tag}.db')),
+            'redis (local fake)': lambda tag: RedisProfileStore(LocalRedis()),
+        }
+        for name, make_store in backends.items():
+            single = PersonalizationEngine(make_store('single'))
+            started = time.perf_counter()
+            expected = [single.create_profile(user_id, user) for user_id, user in zip(user_ids, users)]
+            single_us = (time.perf_counter() - started) / len(users) * 1e6
+
+            bulk = PersonalizationEngine(make_store('bulk'))
+            started = time.perf_counter()
+            profiles = bulk.create_profiles(user_ids, users)
+            bulk_us = (time.perf_counter() - started) / len(users) * 1e6
+
+            stored_parity = all(bulk.get_profile(user_id) == single.get_profile(user_id) for user_id in user_ids)
+            parity = json.dumps(profiles) == json.dumps(expected) and stored_parity
+
+            # Segment counts from the store vs a scan of every stored profile
+            started = time.perf_counter()
+            segments = bulk.segment_counts()
+            segments_ms = (time.perf_counter() - started) * 1000
+            scanned = Counter(
+                UserProfile.from_dict(profile).segment() for profile in expected if 'error' not in profile
+            )
+            counted = {tuple(row[field] for field in SEGMENT_FIELDS): row['count'] for row in segments}
+            segments_match = counted == dict(scanned)
+
+            failed |= not (parity and segments_match)
+            report['backends'][name] = {
+                'single_us': single_us,
+                'bulk_us': bulk_us,
+                'speedup': single_us / bulk_us,
+                'segments': len(segments),
+                'segments_ms': segments_ms,
+                'parity': parity,
+                'segments_match': segments_match,
+            }
+            print(f"{name:>18}: create_profile {single_us:7.1f} us | create_profiles {bulk_us:7.1f} us  "
+                  f"x{single_us / bulk_us:.1f} | {len(segments)} segments in {segments_ms:.1f} ms"
+                  f"{'' if parity else '  MISMATCH'}{'' if segments_match else '  SEGMENT MISMATCH'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if failed:
+        print("FAILED: bulk profiles or segment counts differ from the per-user path")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
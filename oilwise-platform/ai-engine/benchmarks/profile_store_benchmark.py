@@ -0,0 +1,243 @@
+"""Memory, parity and cross-worker benchmark for the personalization profile stores
+
+Run from the ai-engine directory:
+    python -m benchmarks.profile_store_benchmark --users 50000
+
+Creates synthetic profiles through PersonalizationEngine and reports the
+memory retained per profile by the compact in-memory store against the
+plain dict-of-dicts it replaces. Replays profile updates against every
+backend and the dict reference, and runs concurrent updates to one
+profile from two processes sharing a SQLite store. Exits non-zero if any
+profile differs from the reference or an update is lost.
+"""
+import argparse
+import copy
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+import numpy as np
+
+from services.local_redis import LocalRedis
+from services.personalization_engine import PersonalizationEngine
+from services.profile_store import InMemoryProfileStore, RedisProfileStore, SQLiteProfileStore
+
+STATES = ('Kerala', 'Tamil Nadu', 'Karnataka', 'Maharashtra', 'Punjab', 'West Bengal')
+USER_TYPES = ('household', 'household', 'household', 'school', 'restaurant')
+CUISINES = ('south_indian', 'north_indian', 'bengali', 'gujarati', 'punjabi')
+RESTRICTIONS = ('vegetarian', 'vegan', 'gluten_free', 'jain')
+GOALS = ('weight_loss', 'diabetes_management', 'heart_health', 'general_wellness')
+
+
+def synthetic_user_data(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Onboarding payloads with the repeated categorical values real signups have"""
+    rng = np.random.default_rng(seed)
+    pick = lambda names, p: [name for name in names if rng.random() < p]
+    users = []
+    for i in range(n):
+        state = STATES[rng.integers(len(STATES))]
+        user = {
+            'age': int(rng.integers(8, 85)) if rng.random() < 0.9 else None,
+            'gender': ('female', 'male', 'other')[rng.integers(3)],
+            'state': state,
+            'district': f'{state} district {rng.integers(10)}',
+            'user_type': USER_TYPES[rng.integers(len(USER_TYPES))],
+            'preferences': {
+                'language': ('en', 'hi', 'ta', 'ml')[rng.integers(4)],
+                'cuisinePreferences': pick(CUISINES, 0.3),
+                'dietaryRestrictions': pick(RESTRICTIONS, 0.2),
+                'healthGoals': pick(GOALS, 0.3),
+            },
+            'health_data': {'bmi': float(rng.uniform(15, 40))} if rng.random() < 0.8 else {},
+            'data_sharing': bool(rng.random() < 0.5),
+        }
+        if rng.random() < 0.1:
+            user['health_data']['health_conditions'] = ['hypertension']
+        users.append(user)
+    return users
+
+
+def synthetic_updates(n_users: int, n: int, seed: int = 0) -> List[Any]:
+    """(user_id, updates) pairs touching known fields, new keys and unknown users"""
+    rng = np.random.default_rng(seed + 1)
+    updates = []
+    for _ in range(n):
+        user_id = f'user_{rng.integers(n_users + n_users // 20)}'
+        change = {}
+        if rng.random() < 0.6:
+            change['preferences'] = {'language': ('en', 'hi', 'bn')[rng.integers(3)]}
+            if rng.random() < 0.3:
+                change['preferences']['cuisinePreferences'] = list(CUISINES[:rng.integers(1, 4)])
+        if rng.random() < 0.5:
+            change['health_data'] = {'bmi': float(rng.uniform(15, 40)), 'allergies': ['peanut']}
+        updates.append((user_id, change))
+    return updates
+
+
+class DictProfiles:
+    """The previous storage: one dict of nested dicts per user, updated in place"""
+
+    def __init__(self):
+        self.user_profiles = {}
+
+    def get_profile(self, user_id):
+        return self.user_profiles.get(user_id, {'error': 'Profile not found'})
+
+    def update_profile(self, user_id, updates):
+        if user_id not in self.user_profiles:
+            return {'error': 'Profile not found'}
+        profile = self.user_profiles[user_id]
+        if 'preferences' in updates:
+            profile['preferences'].update(updates['preferences'])
+        if 'health_data' in updates:
+            profile['health_profile'].update(updates['health_data'])
+        return profile
+
+
+def retained_bytes(build) -> int:
+    """Heap still allocated after build() returns, with its result kept alive"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def bump_counter(path: str, user_id: str, times: int) -> None:
+    """Worker process: read-modify-write one profile field many times"""
+    store = SQLiteProfileStore(path)
+
+    def increment(profile) -> None:
+        count = (profile.extra or {}).get('preferences', {}).get('visits', 0)
+        profile.update_section('preferences', {'visits': count + 1})
+
+    for _ in range(times):
+        store.update(user_id, increment)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--concurrent-updates', type=int, default=300, help='Updates per process')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    # Decoded from JSON, as requests are, so every payload carries its own string objects
+    users = json.loads(json.dumps(synthetic_user_data(args.users, args.seed)))
+    user_ids = [f'user_{i}' for i in range(args.users)]
+    updates = synthetic_updates(args.users, args.updates, args.seed)
+
+    # Memory: the same profiles as nested dicts vs compact slotted profiles
+    def build_dicts():
+        engine = PersonalizationEngine(InMemoryProfileStore())
+        return {user_id: engine.create_profile(user_id, user) for user_id, user in zip(user_ids, users)}
+
+    def build_store():
+        engine = PersonalizationEngine(InMemoryProfileStore(args.users))
+        for user_id, user in zip(user_ids, users):
+            engine.create_profile(user_id, user)
+        return engine
+
+    # Measure the dicts alone: build them, then drop the store the engine filled alongside
+    dict_bytes = retained_bytes(lambda: copy.deepcopy(build_dicts()))
+    store_bytes = retained_bytes(build_store)
+    report = {
+        'users': args.users,
+        'memory': {
+            'dict_bytes_per_profile': dict_bytes / args.users,
+            'store_bytes_per_profile': store_bytes / args.users,
+            'reduction': dict_bytes / store_bytes,
+        },
+        'backends': {},
+    }
+    print(f"memory per profile: dicts {dict_bytes / args.users:7.0f} B | "
+          f"compact store {store_bytes / args.users:7.0f} B  x{dict_bytes / store_bytes:.1f} smaller")
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        reference = DictProfiles()
+        creator = PersonalizationEngine(InMemoryProfileStore())
+        for user_id, user in zip(user_ids, users):
+            reference.user_profiles[user_id] = creator.create_profile(user_id, user)
+        expected_updates = [copy.deepcopy(reference.update_profile(user_id, change)) for user_id, change in updates]
+        expected = [reference.get_profile(user_id) for user_id in user_ids]
+
+        sqlite_path = os.path.join(directory, 'profiles.db')
+        shared_redis = LocalRedis()
+        backends = {
+            'memory': lambda: InMemoryProfileStore(args.users),
+            'sqlite': lambda: SQLiteProfileStore(sqlite_path),
+            'redis (local fake)': lambda: RedisProfileStore(shared_redis),
+        }
+        for name, make_store in backends.items():
+            # Two engines over the same backend stand in for two gunicorn workers
+            writer, reader = PersonalizationEngine(make_store()), None
+            started = time.perf_counter()
+            for user_id, user in zip(user_ids, users):
+                writer.create_profile(user_id, user)
+            create_us = (time.perf_counter() - started) / args.users * 1e6
+            reader = writer if name == 'memory' else PersonalizationEngine(make_store())
+
+            started = time.perf_counter()
+            results = [writer.update_profile(user_id, change) for user_id, change in updates]
+            update_us = (time.perf_counter() - started) / args.updates * 1e6
+
+            started = time.perf_counter()
+            profiles = [reader.get_profile(user_id) for user_id in user_ids]
+            get_us = (time.perf_counter() - started) / args.users * 1e6
+
+            parity = results == expected_updates and profiles == expected
+            failed |= not parity
+            report['backends'][name] = {'create_us': create_us, 'update_us': update_us, 'get_us': get_us,
+                                        'parity': parity}
+            print(f"{name:>18}: create {create_us:7.1f} us | update {update_us:7.1f} us | "
+                  f"get {get_us:7.1f} us{'' if parity else '  MISMATCH'}")
+
+        # Concurrent read-modify-writes from two processes must not lose updates
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=bump_counter, args=(sqlite_path, user_ids[0], args.concurrent_updates))
+                   for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        visits = SQLiteProfileStore(sqlite_path).get(user_ids[0]).extra['preferences']['visits']
+        no_lost_updates = visits == 2 * args.concurrent_updates
+        failed |= not no_lost_updates
+        report['sqlite_concurrent_updates'] = {'expected': 2 * args.concurrent_updates, 'applied': visits}
+        print(f"sqlite concurrent updates from 2 processes: {visits}/{2 * args.concurrent_updates} applied")
+
+    store = InMemoryProfileStore(max_size=100)
+    engine = PersonalizationEngine(store)
+    for user_id, user in zip(user_ids[:1000], users):
+        engine.create_profile(user_id, user)
+    bounded = len(store) == 100 and store.evictions == 900 and 'error' in engine.get_profile(user_ids[0])
+    failed |= not bounded
+    report['lru_bounded'] = bounded
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if failed:
+        print("FAILED: profiles differ from the dict reference, an update was lost or the LRU bound was exceeded")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
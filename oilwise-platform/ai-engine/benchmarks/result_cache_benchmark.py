@@ -0,0 +1,147 @@
+"""Hit-rate and throughput benchmark: cached vs direct recommend / assess-risk calls
+
+Run from the ai-engine directory:
+    python -m benchmarks.result_cache_benchmark --requests 20000 --distinct 500
+
+Requests are drawn with a Zipf skew from a pool of distinct preference /
+metric combinations, with list order shuffled per request, and served by
+two simulated workers whose ResultCaches share one LocalRedis (the local
+fake of the shared tier). Every cached response is compared with a direct
+call on the exact same payload, so the run exits non-zero if the
+canonical keys ever conflate inputs that rank differently. A catalogue
+version change mid-run must invalidate the local tier and bypass the old
+shared entries.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.health_batch_benchmark import synthetic_metrics
+from benchmarks.micro_batch_benchmark import synthetic_preferences, synthetic_recipes
+from services.health_analyzer import HealthAnalyzer
+from services.local_redis import LocalRedis
+from services.recipe_catalogue import RecipeCatalogue
+from services.recipe_recommender import RecipeRecommender
+from services.result_cache import ResultCache
+
+
+def zipf_workload(pool: List[Any], n: int, exponent: float, seed: int) -> List[Any]:
+    """n requests drawn from pool, item i with weight 1 / (i + 1) ** exponent"""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, len(pool) + 1) ** exponent
+    picks = rng.choice(len(pool), size=n, p=weights / weights.sum())
+    return [pool[i] for i in picks]
+
+
+def shuffled(preferences: Dict[str, Any], rng) -> Dict[str, Any]:
+    """Same preferences with each list permuted, as different clients send them"""
+    return {name: [values[i] for i in rng.permutation(len(values))] for name, values in preferences.items()}
+
+
+def run(call: Callable[[Any], Any], items: List[Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    results = [call(item) for item in items]
+    elapsed = time.perf_counter() - started
+    return {'results': results, 'per_s': len(items) / elapsed}
+
+
+def invalidates(cache: ResultCache, cache_key: Callable, single: Callable, items: List[Any],
+                catalogue_version: List[str]) -> bool:
+    """After a catalogue version change every distinct input must be recomputed once"""
+    catalogue_version[0] += ':reloaded'
+    invalidations = cache.get_stats()['invalidations']
+    computed = []
+    for item in items:
+        cache.get_or_compute(cache_key(item), lambda: computed.append(item) or single(item))
+    distinct = {json.dumps(cache_key(item), sort_keys=True) for item in items}
+    return cache.get_stats()['invalidations'] == invalidations + 1 and len(computed) == len(distinct)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--distinct', type=int, default=500, help='Distinct input combinations')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Popularity skew exponent')
+    parser.add_argument('--max-entries', type=int, default=200, help='Local tier size per worker')
+    parser.add_argument('--recipes', type=int, default=50000, help='Synthetic catalogue size')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    with tempfile.TemporaryDirectory() as directory:
+        catalogue_path = os.path.join(directory, 'recipes.cat')
+        RecipeCatalogue.build(synthetic_recipes(args.recipes, args.seed), catalogue_path)
+        recommender = RecipeRecommender(catalogue_path)
+    analyzer = HealthAnalyzer()
+
+    rng = np.random.default_rng(args.seed)
+    preferences = [shuffled(p, rng) for p in zipf_workload(
+        synthetic_preferences(args.distinct, args.seed), args.requests, args.zipf, args.seed)]
+    metrics = zipf_workload(synthetic_metrics(args.distinct, args.seed), args.requests, args.zipf, args.seed)
+
+    catalogue_version = [recommender.cache_version]
+    endpoints = {
+        'recommend': (lambda p: recommender.get_recommendations(None, p), recommender.cache_key,
+                      lambda: catalogue_version[0], preferences),
+        'assess_risk': (analyzer.assess_risk, analyzer.cache_key, lambda: HealthAnalyzer.RULES_VERSION, metrics),
+    }
+
+    report = {'requests': args.requests, 'distinct': args.distinct, 'zipf': args.zipf,
+              'max_entries': args.max_entries, 'endpoints': {}}
+    failed = False
+    for name, (single, cache_key, version, items) in endpoints.items():
+        shared = LocalRedis()
+        workers = [ResultCache(name, max_entries=args.max_entries, ttl=300, version=version, shared_client=shared)
+                   for _ in range(2)]
+        # Alternate requests between the workers, as a load balancer would
+        call_index = iter(range(len(items) * 2))
+        cached_call = lambda item: workers[next(call_index) % 2].get_or_compute(
+            cache_key(item), lambda: single(item))
+
+        direct = run(single, items)
+        cached = run(cached_call, items)
+        parity = cached['results'] == direct['results']
+
+        stats = [worker.get_stats() for worker in workers]
+        invalidated = name != 'recommend' or invalidates(workers[0], cache_key, single, items[:100], catalogue_version)
+
+        totals = {counter: sum(s[counter] for s in stats) for counter in
+                  ('hits', 'shared_hits', 'misses', 'evictions', 'uncacheable')}
+        lookups = totals['hits'] + totals['shared_hits'] + totals['misses']
+        failed |= not (parity and invalidated)
+        report['endpoints'][name] = {
+            'direct_per_s': direct['per_s'],
+            'cached_per_s': cached['per_s'],
+            'speedup': cached['per_s'] / direct['per_s'],
+            'hit_ratio': (totals['hits'] + totals['shared_hits']) / lookups if lookups else 0.0,
+            'totals': totals,
+            'workers': stats,
+            'parity': parity,
+            'invalidated_on_version_change': invalidated,
+        }
+        print(f"{name}: direct {direct['per_s']:9,.0f}/s | cached {cached['per_s']:9,.0f}/s  "
+              f"x{cached['per_s'] / direct['per_s']:.1f}  hit ratio {report['endpoints'][name]['hit_ratio']:.1%} "
+              f"(local {totals['hits']}, shared {totals['shared_hits']}, misses {totals['misses']}, "
+              f"evictions {totals['evictions']}){'' if parity else '  MISMATCH'}"
+              f"{'' if invalidated else '  STALE AFTER VERSION CHANGE'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if failed:
+        print("FAILED: cached results differ from direct results")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""Cold-start report: import-time breakdown and time to the first healthy /health
+
+Run from the ai-engine directory:
+    python -m benchmarks.startup_benchmark --recipes 50000
+
+Breaks down `python -X importtime -c "import app"` by top-level package,
+then starts the app in a fresh process per run and polls /health until it
+answers 200, for AI_SERVICE_LOADING=lazy and eager (eager builds every
+service at import, as the engine used to). The service build cost that
+lazy loading defers is reported as the latency of the first recommend
+call. When gunicorn is installed, gunicorn.conf.py is also timed with and
+without GUNICORN_PRELOAD. Exits non-zero if a server never becomes
+healthy or a request fails.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter
+from typing import Dict, List, Optional
+
+from benchmarks.micro_batch_benchmark import synthetic_recipes
+from services.recipe_catalogue import RecipeCatalogue
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEV_SERVER = (
+    "import sys; from werkzeug.serving import make_server; import app; "
+    "make_server('127.0.0.1', int(sys.argv[1]), app.app, threaded=True).serve_forever()"
+)
+
+
+def import_times(env: Dict[str, str]) -> Dict[str, float]:
+    """Self import time in ms per top-level package while importing app, and the total"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ENGINE_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    by_package, total = Counter(), 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        by_package[name.split('.')[0]] += int(self_us) / 1000
+        if name == 'app':
+            total = int(cumulative_us) / 1000
+    return {'total_ms': total, 'packages_ms': dict(by_package.most_common())}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def request(port: int, path: str, payload: Optional[dict] = None, timeout: float = 60) -> int:
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=data,
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        response.read()
+        return response.status
+
+
+def time_to_healthy(command: List[str], env: Dict[str, str], port: int, deadline_s: float) -> Dict[str, float]:
+    """Seconds from process start to the first 200 from /health, then the first recommend latency"""
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ENGINE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if time.perf_counter() - started > deadline_s or process.poll() is not None:
+                return {}
+            try:
+                if request(port, '/health', timeout=1) == 200:
+                    break
+            except OSError:
+                time.sleep(0.005)
+        healthy_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        status = request(port, '/api/recipes/recommend', {'preferences': {'cuisinePreferences': ['south_indian']}})
+        first_recommend_s = time.perf_counter() - started
+        return {'healthy_s': healthy_s, 'first_recommend_s': first_recommend_s} if status == 200 else {}
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=50000, help='Synthetic catalogue size')
+    parser.add_argument('--index', default='ivf', help='RECIPE_INDEX_BACKEND for the runs')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--deadline', type=float, default=120, help='Seconds to wait for /health')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalogue_path = os.path.join(directory, 'recipes.cat')
+        RecipeCatalogue.build(synthetic_recipes(args.recipes, args.seed), catalogue_path)
+        base_env = dict(os.environ, RECIPE_CATALOGUE_PATH=catalogue_path, RECIPE_INDEX_BACKEND=args.index,
+                        RESULT_CACHE_ENDPOINTS='', PYTHONDONTWRITEBYTECODE='1')
+
+        report = {'recipes': args.recipes, 'index': args.index, 'imports': {}, 'servers': {}}
+        for loading in ('lazy', 'eager'):
+            imports = import_times(dict(base_env, AI_SERVICE_LOADING=loading))
+            report['imports'][loading] = imports
+            top = ', '.join(f'{name} {ms:.0f}' for name, ms in list(imports['packages_ms'].items())[:6])
+            print(f"import app ({loading:>5}): {imports['total_ms']:6.0f} ms  [{top}]")
+
+        servers = {
+            f'dev server, {loading}': (lambda port: [sys.executable, '-c', DEV_SERVER, str(port)],
+                                       {'AI_SERVICE_LOADING': loading})
+            for loading in ('lazy', 'eager')
+        }
+        if shutil.which('gunicorn'):
+            for preload in ('false', 'true'):
+                servers[f'gunicorn, preload={preload}'] = (
+                    lambda port: ['gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'app:app'],
+                    {'GUNICORN_PRELOAD': preload},
+                )
+        else:
+            print("gunicorn not installed: skipping the preload_app runs")
+
+        failed = False
+        for name, (command, overrides) in servers.items():
+            runs = []
+            for _ in range(args.runs):
+                port = free_port()
+                run = time_to_healthy(command(port), dict(base_env, **overrides), port, args.deadline)
+                failed |= not run
+                if run:
+                    runs.append(run)
+            if not runs:
+                print(f"{name:>24}: never became healthy  FAILED")
+                continue
+            healthy = statistics.median(run['healthy_s'] for run in runs)
+            first = statistics.median(run['first_recommend_s'] for run in runs)
+            report['servers'][name] = {'healthy_s': healthy, 'first_recommend_s': first, 'runs': runs}
+            print(f"{name:>24}: /health healthy after {healthy * 1000:6.0f} ms | "
+                  f"first recommend {first * 1000:6.0f} ms (median of {len(runs)})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if failed:
+        print("FAILED: a server did not become healthy or a request failed")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
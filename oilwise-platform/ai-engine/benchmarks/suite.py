@@ -0,0 +1,271 @@
+"""Benchmark suite: latency, throughput and peak memory of every ai-engine service and route
+
+Run from the ai-engine directory:
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --catalogue-sizes 1000 10000 100000 1000000 --output results.json
+    python -m benchmarks.suite --baseline baseline.json --threshold 0.25
+
+Every input comes from the seeded generators the other benchmarks use
+(recipe catalogues, preferences, metric rows, ragged consumption
+histories, onboarding payloads), so two runs with the same --seed measure
+the same work. Each case reports the median and p90 seconds per call,
+items per second and the peak traced memory of one call: service methods
+directly, and the Flask routes through the test client.
+
+Results are written as JSON. Given --baseline (a previous --output, from
+the same machine), any case whose median is more than --threshold slower,
+or whose peak memory grew by more than --memory-threshold, is reported
+and the run exits non-zero.
+"""
+import argparse
+import gc
+import itertools
+import json
+import logging
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.consumption_kernel_benchmark import synthetic_histories
+from benchmarks.health_batch_benchmark import synthetic_metrics
+from benchmarks.micro_batch_benchmark import synthetic_preferences, synthetic_recipes
+from benchmarks.profile_store_benchmark import synthetic_user_data
+from services.recipe_catalogue import RecipeCatalogue
+
+
+class Case:
+    """One measured call: items is how many inputs a single call processes"""
+
+    def __init__(self, name: str, call: Callable[[], Any], items: int = 1):
+        self.name = name
+        self.call = call
+        self.items = items
+
+
+def cycling(call: Callable[[Any], Any], inputs: List[Any]) -> Callable[[], Any]:
+    """A no-argument call that feeds call() the next input each time, so caches see varied inputs"""
+    inputs = itertools.cycle(inputs)
+    return lambda: call(next(inputs))
+
+
+def measure(case: Case, min_time: float, max_calls: int) -> Dict[str, Any]:
+    """Time repeated calls for at least min_time, then trace the peak memory of one more"""
+    case.call()
+    gc.collect()
+    durations = []
+    started = time.perf_counter()
+    while len(durations) < max_calls and (time.perf_counter() - started < min_time or len(durations) < 3):
+        call_started = time.perf_counter()
+        case.call()
+        durations.append(time.perf_counter() - call_started)
+
+    gc.collect()
+    tracemalloc.start()
+    case.call()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    durations = np.array(durations)
+    median = float(np.median(durations))
+    return {
+        'calls': len(durations),
+        'items': case.items,
+        'median_s': median,
+        'p90_s': float(np.percentile(durations, 90)),
+        'min_s': float(durations.min()),
+        'items_per_s': case.items / median if median > 0 else float('inf'),
+        'peak_bytes': peak_bytes,
+    }
+
+
+def catalogue_path(directory: str, n: int, seed: int) -> str:
+    """Catalogue file of n synthetic recipes, built once per size and seed"""
+    path = os.path.join(directory, f'recipes-{n}-{seed}.cat')
+    if not os.path.exists(path):
+        RecipeCatalogue.build(synthetic_recipes(n, seed), path)
+    return path
+
+
+def service_cases(args, directory: str) -> List[Case]:
+    from services.consumption_predictor import ConsumptionPredictor
+    from services.health_analyzer import HealthAnalyzer
+    from services.personalization_engine import PersonalizationEngine
+    from services.profile_store import InMemoryProfileStore
+    from services.recipe_recommender import RecipeRecommender
+
+    cases = []
+    preferences = synthetic_preferences(256, args.seed)
+    for n in args.catalogue_sizes:
+        recommender = RecipeRecommender(catalogue_path(directory, n, args.seed))
+        cases += [
+            Case(f'recipe_recommender.get_recommendations[{n}]',
+                 cycling(lambda p: recommender.get_recommendations(None, p), preferences)),
+            Case(f'recipe_recommender.get_recommendations_batch[{n}]',
+                 lambda r=recommender: r.get_recommendations_batch(preferences[:64]), items=64),
+        ]
+
+    analyzer = HealthAnalyzer()
+    metrics = synthetic_metrics(args.batch_size, args.seed)
+    cases += [
+        Case('health_analyzer.assess_risk', cycling(analyzer.assess_risk, metrics[:1000])),
+        Case('health_analyzer.assess_risk_batch', lambda: analyzer.assess_risk_batch(metrics), items=len(metrics)),
+    ]
+
+    predictor = ConsumptionPredictor()
+    n_users = max(args.batch_size // 10, 1)
+    histories = synthetic_histories(n_users, args.seed)
+    items = [{'user_id': str(i), 'data': history} for i, history in enumerate(histories)]
+    offsets = np.zeros(n_users + 1, dtype=np.int64)
+    np.cumsum([len(h) for h in histories], out=offsets[1:])
+    values = np.array([record['oil_quantity'] for h in histories for record in h], dtype=np.float64)
+    readings = [[{'oil_quantity': float(v)}] for v in values[:1000]]
+    cases += [
+        Case('consumption_predictor.predict', cycling(lambda item: predictor.predict(item['user_id'], item['data']),
+                                                      items)),
+        Case('consumption_predictor.predict_many', lambda: predictor.predict_many(items), items=n_users),
+        Case('consumption_predictor.predict_batch',
+             lambda: predictor.predict_batch([item['user_id'] for item in items], values, offsets), items=n_users),
+        Case('consumption_predictor.append_readings',
+             cycling(lambda reading: predictor.append_readings('suite-user', reading), readings)),
+    ]
+
+    users = json.loads(json.dumps(synthetic_user_data(args.batch_size, args.seed)))
+    user_ids = [f'user_{i}' for i in range(len(users))]
+    engine = PersonalizationEngine(InMemoryProfileStore(len(users)))
+    engine.create_profiles(user_ids, users)
+    cases += [
+        Case('personalization_engine.create_profile',
+             cycling(lambda i: engine.create_profile(user_ids[i], users[i]), list(range(len(users))))),
+        Case('personalization_engine.create_profiles', lambda: engine.create_profiles(user_ids, users),
+             items=len(users)),
+        Case('personalization_engine.get_profile', cycling(engine.get_profile, user_ids)),
+        Case('personalization_engine.segment_counts', engine.segment_counts),
+    ]
+    return cases
+
+
+def route_cases(args, directory: str) -> List[Case]:
+    # Configure the app before it is imported: catalogue, no result cache, in-process execution
+    os.environ['RECIPE_CATALOGUE_PATH'] = catalogue_path(directory, args.route_catalogue_size, args.seed)
+    os.environ['RESULT_CACHE_ENDPOINTS'] = ''
+    os.environ['BATCH_EXECUTOR'] = 'inline'
+    from app import app
+
+    client = app.test_client()
+    preferences = synthetic_preferences(256, args.seed)
+    metrics = synthetic_metrics(1000, args.seed)
+    histories = synthetic_histories(100, args.seed)
+    users = json.loads(json.dumps(synthetic_user_data(1000, args.seed)))
+
+    def post(path: str) -> Callable[[Any], Any]:
+        def call(body):
+            response = client.post(path, json=body)
+            if response.status_code != 200:
+                raise RuntimeError(f'{path} returned {response.status_code}')
+            return response
+        return call
+
+    return [
+        Case('route GET /health', lambda: client.get('/health')),
+        Case('route POST /api/recipes/recommend',
+             cycling(post('/api/recipes/recommend'), [{'preferences': p} for p in preferences])),
+        Case('route POST /api/health/assess-risk',
+             cycling(post('/api/health/assess-risk'), [{'metrics': m} for m in metrics])),
+        Case('route POST /api/consumption/predict',
+             cycling(post('/api/consumption/predict'),
+                     [{'user_id': str(i), 'historical_data': h} for i, h in enumerate(histories)])),
+        Case('route POST /api/personalization/profile',
+             cycling(post('/api/personalization/profile'),
+                     [{'user_id': f'user_{i}', 'user_data': u} for i, u in enumerate(users)])),
+        Case('route POST /api/batch/process',
+             lambda: post('/api/batch/process')({'type': 'health_metrics', 'data': metrics}), items=len(metrics)),
+    ]
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+            memory_threshold: float) -> List[str]:
+    """Cases slower (or larger) than the baseline by more than the thresholds"""
+    regressions = []
+    for name, current in results['cases'].items():
+        previous = baseline.get('cases', {}).get(name)
+        if previous is None:
+            continue
+        ratio = current['median_s'] / previous['median_s'] if previous['median_s'] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: median {previous['median_s'] * 1e3:.3f} -> "
+                               f"{current['median_s'] * 1e3:.3f} ms (x{ratio:.2f})")
+        if previous['peak_bytes'] and current['peak_bytes'] > previous['peak_bytes'] * (1 + memory_threshold):
+            regressions.append(f"{name}: peak memory {previous['peak_bytes'] / 2 ** 20:.1f} -> "
+                               f"{current['peak_bytes'] / 2 ** 20:.1f} MiB")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--catalogue-sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--route-catalogue-size', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=10000, help='Rows / users per batch call')
+    parser.add_argument('--min-time', type=float, default=0.5, help='Seconds of calls per case')
+    parser.add_argument('--max-calls', type=int, default=2000)
+    parser.add_argument('--cases', help='Only run cases whose name matches this regex')
+    parser.add_argument('--cache-dir', help='Keep built catalogues here between runs (default: a temp dir)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    parser.add_argument('--baseline', help='Results JSON of an earlier run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed median slowdown, e.g. 0.25 = 25%%')
+    parser.add_argument('--memory-threshold', type=float, default=0.25, help='Allowed peak memory growth')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.ERROR)
+    baseline: Optional[Dict[str, Any]] = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'args': vars(args),
+        },
+        'cases': {},
+    }
+    with tempfile.TemporaryDirectory() as temporary:
+        directory = args.cache_dir or temporary
+        os.makedirs(directory, exist_ok=True)
+        cases = service_cases(args, directory) + route_cases(args, directory)
+        selected = re.compile(args.cases) if args.cases else None
+        for case in cases:
+            if selected is not None and not selected.search(case.name):
+                continue
+            result = results['cases'][case.name] = measure(case, args.min_time, args.max_calls)
+            print(f"{case.name:<60} {result['median_s'] * 1e3:10.3f} ms  p90 {result['p90_s'] * 1e3:10.3f} ms  "
+                  f"{result['items_per_s']:12,.0f} items/s  peak {result['peak_bytes'] / 2 ** 20:8.1f} MiB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, args.memory_threshold)
+        if regressions:
+            print(f"FAILED: {len(regressions)} regression(s) against {args.baseline}")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
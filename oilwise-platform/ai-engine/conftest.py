@@ -0,0 +1 @@
+# Lets pytest, run from the ai-engine directory, import the services package as the app does
@@ -0,0 +1,37 @@
+"""
+gunicorn settings for the AI engine (gunicorn -c gunicorn.conf.py app:app)
+
+With GUNICORN_PRELOAD=true (the default) the master imports the app and
+builds every service once, before forking, so the workers start without
+repeating that work and share the catalogue, index and code pages
+copy-on-write. Worker threads, process pools and database connections are
+all created on first use, so none of them crosses the fork.
+
+With METRICS_DIR set, workers write their metric snapshots there and
+/metrics merges them; snapshots left by a previous run are removed when
+the master starts.
+"""
+import glob
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+
+def on_starting(server):
+    metrics_dir = os.getenv('METRICS_DIR')
+    if metrics_dir:
+        for path in glob.glob(os.path.join(metrics_dir, 'metrics-*.json')):
+            os.remove(path)
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before the first worker is forked
+    if preload_app:
+        from app import load_services
+
+        load_services()
+        server.log.info("Services loaded in the master; workers will share them copy-on-write")
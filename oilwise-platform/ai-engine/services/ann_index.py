@@ -0,0 +1,315 @@
+import argparse
+import json
+import logging
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.recipe_index import RecipeIndex
+
+logger = logging.getLogger(__name__)
+
+# Rows per block when assigning vectors to centroids
+ASSIGN_BLOCK = 65536
+
+
+def kmeans(data: np.ndarray, n_clusters: int, iterations: int = 10, spherical: bool = False,
+           seed: int = 0) -> np.ndarray:
+    """
+    Lloyd's k-means in pure NumPy
+
+    Args:
+        data: (n, dim) float32 training vectors
+        n_clusters: Number of centroids
+        iterations: Lloyd iterations
+        spherical: Assign by inner product and keep centroids unit-length
+            (cosine k-means); otherwise assign by Euclidean distance
+        seed: Random seed for initialization and empty-cluster repair
+
+    Returns:
+        (n_clusters, dim) float32 centroids
+    """
+    rng = np.random.default_rng(seed)
+    n = data.shape[0]
+    n_clusters = min(n_clusters, n)
+    centroids = data[rng.choice(n, n_clusters, replace=False)].astype(np.float32)
+
+    for _ in range(iterations):
+        assign = assign_clusters(data, centroids, spherical)
+
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=n_clusters)
+        present = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)))[present]
+
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        centroids[present] = sums / counts[present, None]
+
+        # Re-seed empty clusters from random training vectors
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(n, len(empty), replace=False)]
+
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            centroids /= norms
+
+    return centroids
+
+
+def assign_clusters(data: np.ndarray, centroids: np.ndarray, spherical: bool = False) -> np.ndarray:
+    """Nearest centroid per row, computed block by block"""
+    assign = np.empty(data.shape[0], dtype=np.int32)
+    half_norms = None if spherical else 0.5 * np.einsum('ij,ij->i', centroids, centroids)
+
+    for start in range(0, data.shape[0], ASSIGN_BLOCK):
+        block = data[start:start + ASSIGN_BLOCK] @ centroids.T
+        if half_norms is not None:
+            # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2)
+            block -= half_norms
+        assign[start:start + ASSIGN_BLOCK] = np.argmax(block, axis=1)
+
+    return assign
+
+
+class IVFRecipeIndex(RecipeIndex):
+    """Approximate top-k recipe scorer: inverted file over k-means cells, optional PQ
+
+    Recipes are bucketed by their nearest coarse centroid. A query only
+    scores the recipes in its `n_probe` best cells, so raising n_probe
+    trades latency for recall. With product quantization enabled the
+    probed recipes are first ranked from compact uint8 codes and only the
+    best `rerank` are re-scored exactly. Scores are the same blend of
+    cosine similarity and oil bonus that RecipeIndex returns.
+    """
+
+    def __init__(self, features: np.ndarray, oil_content: np.ndarray, normalized: bool = False,
+                 n_lists: Optional[int] = None, n_probe: int = 8, pq_subspaces: int = 0,
+                 rerank: int = 100, train_size: int = 100000, iterations: int = 10, seed: int = 0,
+                 trained: Optional[Dict[str, np.ndarray]] = None):
+        """
+        Build or restore the index
+
+        Args:
+            features: (n_recipes, dim) recipe feature matrix
+            oil_content: (n_recipes,) oil content per recipe
+            normalized: Rows are already L2-normalized float32
+            n_lists: Number of coarse cells (default ~4 * sqrt(n_recipes))
+            n_probe: Cells scanned per query
+            pq_subspaces: Product quantization subspaces (0 disables PQ)
+            rerank: Candidates re-scored exactly after PQ ranking
+            train_size: Training sample size for k-means
+            iterations: k-means iterations
+            seed: Random seed
+            trained: Previously trained arrays from `trained_state`, skips training
+        """
+        super().__init__(features, oil_content, normalized=normalized)
+        self.n_probe = n_probe
+        self.rerank = rerank
+
+        if trained is None:
+            trained = self._train(n_lists, pq_subspaces, train_size, iterations, seed)
+
+        self.centroids = trained['centroids']
+        self.list_offsets = trained['list_offsets']
+        self.list_rows = trained['list_rows']
+        self.pq_codebooks = trained.get('pq_codebooks')
+        self.pq_codes = trained.get('pq_codes')
+
+    @property
+    def n_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    def trained_state(self) -> Dict[str, np.ndarray]:
+        """Arrays needed to restore this index without retraining"""
+        state = {
+            'centroids': self.centroids,
+            'list_offsets': self.list_offsets,
+            'list_rows': self.list_rows,
+        }
+        if self.pq_codebooks is not None:
+            state['pq_codebooks'] = self.pq_codebooks
+            state['pq_codes'] = self.pq_codes
+        return state
+
+    def save(self, path: str, catalogue_version: str = ''):
+        """Write the trained arrays to an .npz file"""
+        with open(path, 'wb') as f:
+            np.savez(f, catalogue_version=np.array(catalogue_version), **self.trained_state())
+
+    @staticmethod
+    def load_state(path: str, catalogue_version: str = '') -> Optional[Dict[str, np.ndarray]]:
+        """Load trained arrays, or None when they belong to another catalogue version"""
+        with np.load(path) as data:
+            if str(data['catalogue_version']) != catalogue_version:
+                logger.warning(f"ANN index {path} was trained for another catalogue version, retraining")
+                return None
+            return {name: data[name] for name in data.files if name != 'catalogue_version'}
+
+    def top_k(self, user_vector: np.ndarray, k: int = 10,
+              rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k over the probed cells
+
+        Args:
+            user_vector: (dim,) user preference vector
+            k: Number of recipes to return
+            rows: Optional sorted candidate row ids
+
+        Returns:
+            (row ids, scores), both ordered by descending score
+        """
+        if k <= 0 or len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        # Heavily pruned candidate sets are cheaper to score exactly
+        if rows is not None and len(rows) <= max(k, self.rerank) * 4:
+            return super().top_k(user_vector, k, rows)
+
+        user = self._normalize_rows(np.array(user_vector, dtype=np.float32, ndmin=2))[0]
+        probed = self._probe(user, rows)
+
+        # Too few eligible recipes in the probed cells: answer exactly instead
+        if len(probed) < k and len(probed) < (len(self) if rows is None else len(rows)):
+            return super().top_k(user_vector, k, rows)
+
+        if self.pq_codes is not None and len(probed) > max(k, self.rerank):
+            approx = self._pq_scores(user, probed)
+            keep = self._select_top_k(approx, max(k, self.rerank))
+            probed = probed[keep]
+
+        scores = (self.features[probed] @ user).astype(np.float64)
+        scores *= self.SIMILARITY_WEIGHT
+        scores += self.oil_bonus[probed]
+
+        top = self._select_top_k(scores, k)
+        return probed[top].astype(np.int64), scores[top]
+
+    def top_k_batch(self, user_matrix: np.ndarray, k: int = 10,
+                    rows_list: Optional[Sequence[Optional[np.ndarray]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k for many users; rows are padded with -1 / -inf when short"""
+        users = np.array(user_matrix, dtype=np.float32, ndmin=2)
+        k = min(k, len(self))
+        rows = np.full((users.shape[0], k), -1, dtype=np.int64)
+        scores = np.full((users.shape[0], k), -np.inf)
+
+        for i, user in enumerate(users):
+            found_rows, found_scores = self.top_k(user, k, None if rows_list is None else rows_list[i])
+            rows[i, :len(found_rows)] = found_rows
+            scores[i, :len(found_scores)] = found_scores
+
+        return rows, scores
+
+    def _probe(self, user: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Recipe rows in the n_probe cells closest to the user, limited to candidates"""
+        n_probe = min(self.n_probe, self.n_lists)
+        cell_scores = self.centroids @ user
+        cells = np.argpartition(-cell_scores, n_probe - 1)[:n_probe] if n_probe < self.n_lists else np.arange(self.n_lists)
+
+        starts = self.list_offsets[cells]
+        stops = self.list_offsets[cells + 1]
+        probed = np.concatenate([self.list_rows[a:b] for a, b in zip(starts.tolist(), stops.tolist())])
+
+        if rows is not None:
+            probed = np.sort(probed)
+            positions = np.searchsorted(rows, probed)
+            positions[positions == len(rows)] = 0
+            probed = probed[rows[positions] == probed] if len(rows) else probed[:0]
+
+        return probed
+
+    def _pq_scores(self, user: np.ndarray, probed: np.ndarray) -> np.ndarray:
+        """Asymmetric PQ estimate of the blended score from per-subspace lookup tables"""
+        n_sub, n_codes, sub_dim = self.pq_codebooks.shape
+        padded = np.zeros(n_sub * sub_dim, dtype=np.float32)
+        padded[:user.shape[0]] = user
+
+        tables = np.einsum('mcd,md->mc', self.pq_codebooks, padded.reshape(n_sub, sub_dim))
+        codes = self.pq_codes[probed]
+        similarity = tables[np.arange(n_sub), codes].sum(axis=1)
+
+        return similarity * self.SIMILARITY_WEIGHT + self.oil_bonus[probed]
+
+    def _train(self, n_lists: Optional[int], pq_subspaces: int, train_size: int,
+               iterations: int, seed: int) -> Dict[str, np.ndarray]:
+        n = len(self)
+        if n == 0:
+            raise ValueError('Cannot train an ANN index on an empty catalogue')
+
+        n_lists = min(n, n_lists or max(1, int(4 * np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample = self.features[np.sort(rng.choice(n, min(n, max(train_size, n_lists)), replace=False))]
+
+        started = time.perf_counter()
+        centroids = kmeans(sample, n_lists, iterations, spherical=True, seed=seed)
+        assign = assign_clusters(self.features, centroids, spherical=True)
+
+        list_rows = np.argsort(assign, kind='stable').astype(np.int32)
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=n_lists)))).astype(np.int64)
+        trained = {'centroids': centroids, 'list_offsets': list_offsets, 'list_rows': list_rows}
+
+        if pq_subspaces:
+            trained.update(self._train_pq(sample, pq_subspaces, iterations, seed))
+
+        logger.info(f"Trained IVF index: {n} recipes, {n_lists} lists, "
+                    f"PQ subspaces={pq_subspaces} in {time.perf_counter() - started:.1f}s")
+        return trained
+
+    def _train_pq(self, sample: np.ndarray, n_sub: int, iterations: int, seed: int) -> Dict[str, np.ndarray]:
+        """Train 256-entry codebooks per subspace and encode every recipe as uint8 codes"""
+        sub_dim = -(-self.dim // n_sub)
+        n_codes = min(256, sample.shape[0])
+
+        def split(matrix: np.ndarray) -> np.ndarray:
+            padded = np.zeros((matrix.shape[0], n_sub * sub_dim), dtype=np.float32)
+            padded[:, :self.dim] = matrix
+            return padded.reshape(matrix.shape[0], n_sub, sub_dim)
+
+        sample_parts = split(sample)
+        codebooks = np.zeros((n_sub, n_codes, sub_dim), dtype=np.float32)
+        codes = np.empty((len(self), n_sub), dtype=np.uint8)
+
+        for m in range(n_sub):
+            codebooks[m] = kmeans(np.ascontiguousarray(sample_parts[:, m]), n_codes, iterations, seed=seed + m)
+            for start in range(0, len(self), ASSIGN_BLOCK):
+                block = split(self.features[start:start + ASSIGN_BLOCK])[:, m]
+                codes[start:start + ASSIGN_BLOCK, m] = assign_clusters(np.ascontiguousarray(block), codebooks[m])
+
+        return {'pq_codebooks': codebooks, 'pq_codes': codes}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Offline training: python -m services.ann_index build recipes.cat -o recipes.ann.npz"""
+    from services.recipe_catalogue import RecipeCatalogue
+
+    parser = argparse.ArgumentParser(description='Train the IVF recipe index for a compiled catalogue')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Train and save an IVF index')
+    build_parser.add_argument('catalogue', help='Compiled recipe catalogue file')
+    build_parser.add_argument('-o', '--output', required=True, help='Path of the .npz index to write')
+    build_parser.add_argument('--lists', type=int, default=None, help='Number of coarse cells')
+    build_parser.add_argument('--pq', type=int, default=0, help='PQ subspaces (0 disables PQ)')
+    build_parser.add_argument('--train-size', type=int, default=100000, help='k-means training sample size')
+    build_parser.add_argument('--iterations', type=int, default=10, help='k-means iterations')
+
+    args = parser.parse_args(argv)
+
+    catalogue = RecipeCatalogue.open(args.catalogue)
+    index = IVFRecipeIndex(catalogue.features, catalogue.oil_content, normalized=True,
+                           n_lists=args.lists, pq_subspaces=args.pq,
+                           train_size=args.train_size, iterations=args.iterations)
+    index.save(args.output, catalogue.version)
+
+    json.dump({'catalogue_version': catalogue.version, 'n_recipes': len(index), 'n_lists': index.n_lists,
+               'pq_subspaces': 0 if index.pq_codebooks is None else index.pq_codebooks.shape[0]},
+              sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,278 @@
+import logging
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Columns of the per-device state array
+STATE_COLUMNS = ('count', 'ewma_mean', 'ewma_var', 'median', 'mad', 'cusum')
+
+# MAD of a normal distribution times this is its standard deviation
+MAD_TO_SIGMA = 1.4826
+INITIAL_CAPACITY = 1024
+
+
+class AnomalyDetector:
+    """
+    Streaming spike and leak detection over per-device reading streams
+
+    Each device keeps six floats in one row of a shared array: a reading
+    count, an EWMA mean and variance, and a streaming median and MAD
+    updated by fixed-size sign steps, so an event costs the same constant
+    work and memory however long the stream. The EWMA and the robust
+    statistics forget old readings at rate alpha, which makes them a
+    sliding window of roughly 1/alpha readings.
+
+    A reading is a spike (an over-pour) when its robust z-score against
+    the device's median and MAD exceeds z_threshold; the robust statistics
+    barely move on earlier spikes. A leak is a sustained run of readings
+    above the usual level: a one-sided CUSUM of the clipped z-scores
+    against the EWMA, less cusum_k per reading, crossing cusum_h. The EWMA
+    is fed winsorized readings, so spikes do not shift it, and is the
+    steadier estimate of a device's level. Nothing is flagged during the
+    first warmup readings of a device.
+
+    State is per process, so every reading of a device must reach the
+    same worker: in k8s, /api/iot is routed to the single-process
+    oilwise-ai-engine-iot deployment rather than the scaled-out pods.
+    """
+
+    def __init__(self, alpha: Optional[float] = None, z_threshold: Optional[float] = None,
+                 cusum_k: Optional[float] = None, cusum_h: Optional[float] = None,
+                 warmup: Optional[int] = None, min_scale: Optional[float] = None):
+        self.alpha = alpha or float(os.getenv('ANOMALY_ALPHA', 0.02))
+        self.z_threshold = z_threshold or float(os.getenv('ANOMALY_Z_THRESHOLD', 5))
+        self.cusum_k = cusum_k or float(os.getenv('ANOMALY_CUSUM_K', 0.5))
+        self.cusum_h = cusum_h or float(os.getenv('ANOMALY_CUSUM_H', 10))
+        self.warmup = warmup or int(os.getenv('ANOMALY_WARMUP', 20))
+        # Smallest spread, in reading units (grams), a z-score is measured against
+        self.min_scale = min_scale or float(os.getenv('ANOMALY_MIN_SCALE', 1))
+        # A single reading adds at most this much to the leak CUSUM, so one spike is not a leak
+        self.cusum_clip = 3.0
+
+        self._slots: Dict[str, int] = {}
+        self._state = np.zeros((INITIAL_CAPACITY, len(STATE_COLUMNS)), dtype=np.float64)
+        self._lock = threading.Lock()
+        self.readings = 0
+        self.events = {'spike': 0, 'leak': 0}
+        self._readings_counter = metrics.counter('anomaly_readings_total', 'Readings seen by the anomaly detector')
+        self._event_counters = {kind: metrics.counter('anomaly_events_total', 'Anomalies flagged by the anomaly '
+                                                      'detector', type=kind) for kind in self.events}
+
+    def observe(self, device_id: str, value: float) -> List[Dict[str, Any]]:
+        """Fold one reading into the device's state; returns the anomalies it raised"""
+        x = float(value)
+        if not math.isfinite(x):
+            return []
+        with self._lock:
+            slot = self._slot(device_id)
+            count, mean, var, median, mad, cusum = self._state[slot].tolist()
+            alpha, min_scale = self.alpha, self.min_scale
+
+            events = []
+            if count == 0:
+                mean, var, median, mad = x, 0.0, x, min_scale / MAD_TO_SIGMA
+            else:
+                rate = max(alpha, 1 / (count + 1))
+                scale = max(MAD_TO_SIGMA * mad, min_scale)
+                z = (x - median) / scale
+                ewma_z = (x - mean) / max(math.sqrt(var), min_scale)
+
+                cusum = max(0.0, cusum + min(ewma_z, self.cusum_clip) - self.cusum_k)
+                if count >= self.warmup:
+                    if z > self.z_threshold:
+                        events.append(self._event('spike', device_id, x, median, scale, z, ewma_z, mean, cusum))
+                    if cusum > self.cusum_h:
+                        events.append(self._event('leak', device_id, x, median, scale, z, ewma_z, mean, cusum))
+                        cusum = 0.0
+                else:
+                    cusum = 0.0
+
+                # Winsorize so a spike moves the EWMA no further than a reading at the threshold would
+                bound = self.z_threshold * scale
+                delta = min(max(x, median - bound), median + bound) - mean
+                mean = mean + rate * delta
+                var = (1 - rate) * (var + rate * delta * delta)
+
+                deviation = abs(x - median)
+                median = median + rate * mad * ((x > median) - (x < median))
+                mad = max(mad * (1 + rate * ((deviation > mad) - (deviation < mad))), min_scale / MAD_TO_SIGMA)
+
+            self._state[slot] = (count + 1, mean, var, median, mad, cusum)
+            self._count(1, events)
+            return events
+
+    def observe_batch(self, device_ids: Sequence[str], values: Sequence[float]) -> List[Dict[str, Any]]:
+        """
+        Fold a micro-batch of readings, in arrival order, into the device states
+
+        Gives the same states and anomalies as calling observe() per
+        reading. Readings are processed in rounds: round r takes the r-th
+        reading of every device in the batch, so each round updates
+        distinct rows and is one vectorized step. Each anomaly carries the
+        index of the reading that raised it.
+        """
+        x = np.asarray(values, dtype=np.float64)
+        if len(device_ids) != len(x):
+            raise ValueError("device_ids and values must have the same length")
+
+        with self._lock:
+            valid = np.flatnonzero(np.isfinite(x))
+            slots = np.fromiter((self._slot(device_ids[i]) for i in valid.tolist()), dtype=np.int64,
+                                count=len(valid))
+
+            # Rank of each reading within its device, then rounds of distinct devices
+            by_slot = np.argsort(slots, kind='stable')
+            sorted_slots = slots[by_slot]
+            starts = np.flatnonzero(np.r_[True, sorted_slots[1:] != sorted_slots[:-1]])
+            ranks = np.empty(len(slots), dtype=np.int64)
+            ranks[by_slot] = np.arange(len(slots)) - np.repeat(starts, np.diff(np.r_[starts, len(slots)]))
+            order = np.argsort(ranks, kind='stable')
+            bounds = np.searchsorted(ranks[order], np.arange(ranks.max() + 2 if len(ranks) else 1))
+
+            found = []
+            for r in range(len(bounds) - 1):
+                members = order[bounds[r]:bounds[r + 1]]
+                found += self._step(valid[members], slots[members], x[valid[members]], device_ids)
+
+            found.sort(key=lambda event: event['index'])
+            self._count(len(valid), found)
+            return found
+
+    def process_readings(self, readings: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Readings as posted by the IoT gateway ({'device_id', 'value'}), oldest first
+
+        Readings without a numeric value (missing, null, text) are skipped
+        and counted, rather than failing the whole micro-batch.
+        """
+        device_ids = [str(reading.get('device_id')) if isinstance(reading, dict) else '' for reading in readings]
+        values = [_reading_value(reading) for reading in readings]
+        skipped = sum(not math.isfinite(value) for value in values)
+        if len(readings) == 1:
+            anomalies = self.observe(device_ids[0], values[0])
+            for anomaly in anomalies:
+                anomaly['index'] = 0
+        else:
+            anomalies = self.observe_batch(device_ids, values)
+        return {'processed': len(readings), 'skipped': skipped, 'anomalies': anomalies}
+
+    def device_state(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """The device's running statistics, or None if it has sent no readings"""
+        slot = self._slots.get(device_id)
+        if slot is None:
+            return None
+        state = dict(zip(STATE_COLUMNS, self._state[slot].tolist()))
+        state['count'] = int(state['count'])
+        state['scale'] = max(MAD_TO_SIGMA * state['mad'], self.min_scale)
+        state['device_id'] = device_id
+        return state
+
+    def reset(self, device_id: str) -> None:
+        """Forget the device's statistics; its next reading starts a new warmup"""
+        with self._lock:
+            slot = self._slots.get(device_id)
+            if slot is not None:
+                self._state[slot] = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'devices': len(self._slots),
+            'readings': self.readings,
+            'events': dict(self.events),
+            'state_bytes': int(self._state[:len(self._slots)].nbytes),
+        }
+
+    def _slot(self, device_id: str) -> int:
+        slot = self._slots.get(device_id)
+        if slot is None:
+            slot = self._slots[device_id] = len(self._slots)
+            if slot == len(self._state):
+                grown = np.zeros((2 * len(self._state), len(STATE_COLUMNS)), dtype=np.float64)
+                grown[:slot] = self._state
+                self._state = grown
+        return slot
+
+    def _step(self, indices: np.ndarray, slots: np.ndarray, x: np.ndarray,
+              device_ids: Sequence[str]) -> List[Dict[str, Any]]:
+        """One reading for each of the distinct devices in slots: observe() on arrays"""
+        state = self._state[slots]
+        count, mean, var, median, mad, cusum = state.T
+        alpha, min_scale = self.alpha, self.min_scale
+
+        first = count == 0
+        rate = np.maximum(alpha, 1 / (count + 1))
+        scale = np.maximum(MAD_TO_SIGMA * mad, min_scale)
+        z = (x - median) / scale
+        ewma_z = (x - mean) / np.maximum(np.sqrt(var), min_scale)
+
+        cusum = np.maximum(0.0, cusum + np.minimum(ewma_z, self.cusum_clip) - self.cusum_k)
+        armed = count >= self.warmup
+        spike = armed & (z > self.z_threshold)
+        leak = armed & (cusum > self.cusum_h)
+
+        events = []
+        for kind, mask in (('spike', spike), ('leak', leak)):
+            for i in np.flatnonzero(mask).tolist():
+                index = int(indices[i])
+                event = self._event(kind, device_ids[index], float(x[i]), float(median[i]), float(scale[i]),
+                                    float(z[i]), float(ewma_z[i]), float(mean[i]), float(cusum[i]))
+                event['index'] = index
+                events.append(event)
+        cusum = np.where(armed & ~leak, cusum, 0.0)
+
+        bound = self.z_threshold * scale
+        delta = np.minimum(np.maximum(x, median - bound), median + bound) - mean
+        new_mean = mean + rate * delta
+        new_var = (1 - rate) * (var + rate * delta * delta)
+
+        deviation = np.abs(x - median)
+        new_median = median + rate * mad * ((x > median).astype(np.float64) - (x < median))
+        new_mad = np.maximum(mad * (1 + rate * ((deviation > mad).astype(np.float64) - (deviation < mad))),
+                             min_scale / MAD_TO_SIGMA)
+
+        self._state[slots] = np.column_stack((
+            count + 1,
+            np.where(first, x, new_mean),
+            np.where(first, 0.0, new_var),
+            np.where(first, x, new_median),
+            np.where(first, min_scale / MAD_TO_SIGMA, new_mad),
+            np.where(first, 0.0, cusum),
+        ))
+        return events
+
+    def _count(self, readings: int, events: List[Dict[str, Any]]) -> None:
+        self.readings += readings
+        self._readings_counter.inc(readings)
+        for event in events:
+            self.events[event['type']] += 1
+            self._event_counters[event['type']].inc()
+
+    @staticmethod
+    def _event(kind: str, device_id: str, value: float, median: float, scale: float, z: float, ewma_z: float,
+               ewma_mean: float, cusum: float) -> Dict[str, Any]:
+        return {
+            'type': kind,
+            'device_id': device_id,
+            'value': value,
+            'baseline': median,
+            'scale': scale,
+            'z_score': z,
+            'ewma_mean': ewma_mean,
+            'ewma_z_score': ewma_z,
+            'cusum': cusum,
+        }
+
+
+def _reading_value(reading: Any) -> float:
+    """A reading's value as a float; NaN, which the detector skips, when it has no numeric value"""
+    try:
+        return float(reading.get('value'))
+    except (AttributeError, TypeError, ValueError):
+        return math.nan
@@ -0,0 +1,156 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ('inline', 'process', 'celery')
+
+# Services built once per pool worker by _init_worker
+_worker_processors: Dict[str, Callable[[List[Any]], List[Any]]] = {}
+
+
+def build_processors() -> Dict[str, Callable[[List[Any]], List[Any]]]:
+    """Batch processors by batch type; each maps a list of items to a list of results"""
+    from services.consumption_predictor import ConsumptionPredictor
+    from services.health_analyzer import HealthAnalyzer
+
+    return {
+        'health_metrics': HealthAnalyzer().assess_risk_batch,
+        'consumption': ConsumptionPredictor().predict_many,
+    }
+
+
+def _init_worker(disabled_log_level: int = logging.NOTSET) -> None:
+    global _worker_processors
+    # Spawned workers start with fresh logging; carry over the parent's logging.disable
+    logging.disable(disabled_log_level)
+    _worker_processors = build_processors()
+
+
+def run_chunk(batch_type: str, items: List[Any]) -> List[Any]:
+    """Process one chunk in a pool or Celery worker"""
+    if not _worker_processors:
+        _init_worker()
+    return _worker_processors[batch_type](items)
+
+
+class BatchExecutor:
+    """
+    Splits large batches into chunks and fans them out to workers
+
+    Modes:
+        inline: run in the calling process (the previous behaviour)
+        process: a persistent ProcessPoolExecutor, started on first use so
+            each gunicorn worker owns its pool after the fork
+        celery: Celery workers (services.celery_tasks); set
+            CELERY_TASK_ALWAYS_EAGER=true to run the tasks in-process locally
+
+    Results always come back in input order. Batches smaller than
+    min_parallel items are run inline, where the dispatch overhead would
+    outweigh the parallelism. Columnar batches (column_processors) are
+    always run inline: they are one vectorized call over views of the
+    request body, which shipping to workers would copy.
+    """
+
+    def __init__(self, processors: Dict[str, Callable[[List[Any]], List[Any]]], mode: Optional[str] = None,
+                 workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                 min_parallel: Optional[int] = None,
+                 column_processors: Optional[Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]]] = None):
+        self.processors = processors
+        self.column_processors = column_processors or {}
+        self.mode = (mode or os.getenv('BATCH_EXECUTOR', 'inline')).lower()
+        if self.mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown batch executor mode: {self.mode}")
+
+        self.workers = workers or int(os.getenv('BATCH_WORKERS', 0)) or os.cpu_count() or 1
+        self.chunk_size = chunk_size or int(os.getenv('BATCH_CHUNK_SIZE', 5000))
+        self.min_parallel = min_parallel if min_parallel is not None else int(
+            os.getenv('BATCH_MIN_PARALLEL', self.chunk_size)
+        )
+        self._pool = None
+
+    def run(self, batch_type: str, items: List[Any]) -> List[Any]:
+        """
+        Process a batch, in parallel chunks when it is large enough
+
+        Args:
+            batch_type: Key into the batch processors
+            items: Batch items
+
+        Returns:
+            One result per item, in input order
+        """
+        if batch_type not in self.processors:
+            raise ValueError(f"Unknown batch type: {batch_type}")
+        metrics.histogram('batch_items', 'Items per batch call', scale=1, source=f'batch:{batch_type}').observe(len(items))
+
+        if self.mode == 'inline' or len(items) < self.min_parallel:
+            return self.processors[batch_type](items)
+
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        if self.mode == 'celery':
+            chunk_results = self._run_celery(batch_type, chunks)
+        else:
+            chunk_results = self._run_pool(batch_type, chunks)
+
+        results = []
+        for chunk_result in chunk_results:
+            results.extend(chunk_result)
+        return results
+
+    def run_columns(self, batch_type: str, columns: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Process a columnar batch in this process
+
+        Args:
+            batch_type: Key into the column processors
+            columns: Equal-length arrays by column name
+
+        Returns:
+            Result arrays by column name, one row per input row
+        """
+        if batch_type not in self.column_processors:
+            raise ValueError(f"Batch type {batch_type} does not accept columnar payloads")
+        n_rows = len(next(iter(columns.values()))) if columns else 0
+        metrics.histogram('batch_items', 'Items per batch call', scale=1, source=f'batch:{batch_type}').observe(n_rows)
+        return self.column_processors[batch_type](columns)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _run_pool(self, batch_type: str, chunks: List[List[Any]]) -> List[List[Any]]:
+        pool = self._get_pool()
+        futures = [pool.submit(run_chunk, batch_type, chunk) for chunk in chunks]
+        try:
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool for the next batch
+            logger.error("Batch worker pool broke; restarting it")
+            self._pool = None
+            raise
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn rather than fork: the parent may hold BLAS threads and open sockets
+            context = multiprocessing.get_context(os.getenv('BATCH_START_METHOD', 'spawn'))
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                             initializer=_init_worker,
+                                             initargs=(logging.root.manager.disable,))
+            logger.info(f"Started batch worker pool with {self.workers} processes")
+        return self._pool
+
+    def _run_celery(self, batch_type: str, chunks: List[List[Any]]) -> List[List[Any]]:
+        from celery import group
+
+        from services.celery_tasks import process_chunk
+
+        job = group(process_chunk.s(batch_type, chunk) for chunk in chunks)
+        return job.apply_async().get()
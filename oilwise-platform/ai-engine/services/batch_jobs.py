@@ -0,0 +1,417 @@
+import base64
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+from services.batch_stream import iter_chunks
+from services.json_encoder import response_encoder
+from services.local_redis import WatchError
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'running', 'completed', 'failed', 'cancelled')
+QUEUE_KEY = 'oilwise:jobs:queue'
+# job_id -> time its runner's lease expires; renewed with every chunk
+LEASES_KEY = 'oilwise:jobs:leases'
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting"""
+
+
+class JobsUnavailable(Exception):
+    """Raised by every job call when the job store is misconfigured for this deployment"""
+
+
+class BatchJobManager:
+    """
+    Asynchronous batch jobs: submit, poll progress, page through results
+
+    Job metadata, inputs and results live in a Redis-compatible store (a
+    Redis server via JOB_QUEUE_URL, or the in-process
+    services.local_redis.LocalRedis stand-in when it is unset or 'local'),
+    so with a shared Redis any gunicorn worker of any pod can answer polls
+    for any job. A bounded pool of background threads pops job ids from
+    the queue and runs the items chunk by chunk through the BatchExecutor,
+    so progress is visible after every chunk. Jobs with more than
+    spill_items results store each chunk as one zlib-compressed page
+    instead of one list entry per result, which keeps large jobs small in
+    Redis.
+
+    A running job holds a lease that every chunk renews. If its worker
+    dies, any worker requeues the job once the lease expires, up to
+    max_attempts runs; each run writes its chunks in transactions that
+    check it still owns the job, so a stale runner cannot add results.
+
+    The local stand-in is refused when gunicorn runs several workers,
+    since a job would only be visible to the worker that accepted it:
+    the job calls then raise JobsUnavailable and the rest of the engine
+    keeps serving.
+    """
+
+    def __init__(self, executor, client, workers: int = 2, chunk_size: int = 1000,
+                 spill_items: int = 10000, max_pending: int = 100, ttl: int = 24 * 3600,
+                 lease: float = 300, max_attempts: int = 3, unavailable: Optional[str] = None):
+        self.executor = executor
+        self.client = client
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.spill_items = spill_items
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.unavailable = unavailable
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    @classmethod
+    def from_env(cls, executor) -> 'BatchJobManager':
+        from services.local_redis import redis_client
+
+        url = os.getenv('JOB_QUEUE_URL', 'local')
+        unavailable = None
+        if url in ('', 'local') and _serving_processes() > 1:
+            unavailable = (f"Batch jobs are disabled: JOB_QUEUE_URL={url or 'local'} keeps jobs in each of the "
+                           f"{_serving_processes()} gunicorn workers; set it to a redis:// URL shared by the workers "
+                           f"(or GUNICORN_WORKERS=1)")
+            logger.error(unavailable)
+
+        return cls(
+            executor,
+            redis_client(url),
+            workers=int(os.getenv('JOB_WORKERS', 2)),
+            chunk_size=int(os.getenv('JOB_CHUNK_SIZE', 1000)),
+            spill_items=int(os.getenv('JOB_SPILL_ITEMS', 10000)),
+            max_pending=int(os.getenv('JOB_MAX_PENDING', 100)),
+            ttl=int(os.getenv('JOB_TTL_SECONDS', 24 * 3600)),
+            lease=float(os.getenv('JOB_LEASE_SECONDS', 300)),
+            max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', 3)),
+            unavailable=unavailable,
+        )
+
+    def submit(self, batch_type: str, items: List[Any]) -> Dict[str, Any]:
+        """
+        Queue a batch and return its job record immediately
+
+        Raises:
+            JobQueueFull: if max_pending jobs are already waiting
+            JobsUnavailable: if the job store is misconfigured
+        """
+        self._check_available()
+        if self.client.llen(QUEUE_KEY) >= self.max_pending:
+            raise JobQueueFull(f"{self.max_pending} jobs already pending")
+
+        self._ensure_workers()
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'type': batch_type,
+            'status': 'queued',
+            'total': len(items),
+            'done': 0,
+            'spilled': int(len(items) > self.spill_items),
+            'page_size': self.chunk_size,
+            'attempts': 0,
+            'created_at': time.time(),
+        }
+        self.client.set(self._key(job_id, 'input'), json.dumps(items), ex=self.ttl)
+        self.client.hset(self._key(job_id), mapping=job)
+        self.client.expire(self._key(job_id), self.ttl)
+        self.client.rpush(QUEUE_KEY, job_id)
+        return self.status(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job record with progress, or None if unknown or expired"""
+        self._check_available()
+        raw = self.client.hgetall(self._key(job_id))
+        if not raw:
+            return None
+
+        job = {
+            'job_id': raw['job_id'],
+            'type': raw['type'],
+            'status': raw['status'],
+            'total': int(raw['total']),
+            'done': int(raw['done']),
+            'created_at': float(raw['created_at']),
+        }
+        job['progress'] = job['done'] / job['total'] if job['total'] else 1.0
+        for field in ('started_at', 'finished_at'):
+            if field in raw:
+                job[field] = float(raw[field])
+        if 'error' in raw:
+            job['error'] = raw['error']
+        return job
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 1000) -> Optional[Dict[str, Any]]:
+        """
+        One page of a job's results
+
+        Results become readable as each chunk finishes, so a running job
+        can be paged while it progresses. A cancelled job has none.
+        """
+        job = self.status(job_id)
+        if job is None:
+            return None
+
+        offset = max(0, offset)
+        end = min(offset + max(0, limit), job['done'])
+        if job['status'] == 'cancelled' or end <= offset:
+            page = []
+        elif self.client.hget(self._key(job_id), 'spilled') == '1':
+            page = self._read_pages(job_id, offset, end)
+        else:
+            page = [json.loads(line) for line in self.client.lrange(self._key(job_id, 'results'), offset, end - 1)]
+
+        return {
+            'job_id': job_id,
+            'status': job['status'],
+            'total': job['total'],
+            'done': job['done'],
+            'offset': offset,
+            'data': page,
+            'next_offset': (offset + len(page) if offset + len(page) < job['total'] and job['status'] != 'cancelled'
+                            else None),
+        }
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job; False if the job is unknown
+
+        A running job stops after its current chunk and then drops its
+        stored results. Completed, failed and cancelled jobs are left as
+        they are.
+        """
+        self._check_available()
+        if not self.client.exists(self._key(job_id)):
+            return False
+        previous = self._transition(job_id, ('queued', 'running'), {'status': 'cancelled', 'finished_at': time.time()})
+        if previous == 'queued':
+            # No worker will start it now; a running job cleans up after itself in _finish
+            self.client.delete(self._key(job_id, 'input'))
+        return True
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _check_available(self) -> None:
+        if self.unavailable is not None:
+            raise JobsUnavailable(self.unavailable)
+
+    def _ensure_workers(self) -> None:
+        # Started on first submit, so each gunicorn worker starts its own after the fork
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'batch-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self) -> None:
+        while not self._stopping.is_set():
+            self._requeue_expired()
+            popped = self.client.blpop([QUEUE_KEY], timeout=1)
+            if popped is None:
+                continue
+            _, job_id = popped
+            # Leased before anything else, so a job whose worker dies from here on is requeued
+            self.client.hset(LEASES_KEY, job_id, time.time() + self.lease)
+            token = uuid.uuid4().hex
+            try:
+                self._run(job_id, token)
+            except Exception as e:
+                logger.error(f"Error in batch job {job_id}: {str(e)}")
+                self._update(job_id, lambda job: self._finishing(job_id, job, token, {
+                    'status': 'failed', 'error': str(e), 'finished_at': time.time()
+                }))
+
+    def _run(self, job_id: str, token: str) -> None:
+        key = self._key(job_id)
+
+        def start(job: Dict[str, str]) -> Optional[Callable]:
+            if job.get('status') != 'queued':
+                return None
+            return lambda pipe: pipe.hset(key, mapping={
+                'status': 'running', 'runner': token, 'attempts': int(job.get('attempts', 0)) + 1,
+                'started_at': time.time(),
+            })
+
+        if not self._update(job_id, start):
+            self.client.hdel(LEASES_KEY, job_id)
+            return
+        job = self.client.hgetall(key)
+        raw_items = self.client.get(self._key(job_id, 'input'))
+        if raw_items is None:
+            raise ValueError("Job input has expired")
+
+        items = json.loads(raw_items)
+        del raw_items
+        spilled = job['spilled'] == '1'
+        for page, chunk in enumerate(iter_chunks(items, self._page_size(job))):
+            lines = [response_encoder.dumps(result, sort_keys=False).decode()
+                     for result in self.executor.run(job['type'], chunk)]
+            if not self._update(job_id, lambda current: self._chunk_writes(job_id, current, token, page, lines, spilled)):
+                # Cancelled, or requeued after the lease ran out
+                break
+
+        self._update(job_id, lambda current: self._finishing(job_id, current, token, {
+            'status': 'completed', 'finished_at': time.time()
+        }))
+
+    def _chunk_writes(self, job_id: str, job: Dict[str, str], token: str, page: int, lines: List[str],
+                      spilled: bool) -> Optional[Callable]:
+        """Writes that store one chunk of results and renew the lease, if this runner still owns the running job"""
+        if job.get('status') != 'running' or job.get('runner') != token:
+            return None
+
+        def write(pipe) -> None:
+            if spilled:
+                pipe.set(self._key(job_id, f'page:{page}'), _encode_page(lines), ex=self.ttl)
+            else:
+                pipe.rpush(self._key(job_id, 'results'), *lines)
+                pipe.expire(self._key(job_id, 'results'), self.ttl)
+            pipe.hincrby(self._key(job_id), 'done', len(lines))
+            pipe.hset(LEASES_KEY, job_id, time.time() + self.lease)
+        return write
+
+    def _finishing(self, job_id: str, job: Dict[str, str], token: str,
+                   mapping: Dict[str, Any]) -> Optional[Callable]:
+        """
+        Writes that end this runner's run: the job gets mapping, or, if it
+        was cancelled meanwhile, loses its results. None once another run owns it.
+        """
+        if job.get('runner') != token or job.get('status') not in ('running', 'cancelled'):
+            return None
+
+        def write(pipe) -> None:
+            if job['status'] == 'running':
+                pipe.hset(self._key(job_id), mapping=mapping)
+                pipe.delete(self._key(job_id, 'input'))
+            else:
+                pipe.delete(self._key(job_id, 'input'), *self._result_keys(job_id, job))
+            pipe.hdel(LEASES_KEY, job_id)
+        return write
+
+    def _requeue_expired(self) -> None:
+        """Requeue the jobs whose runner stopped renewing its lease; failed after max_attempts runs"""
+        now = time.time()
+        for job_id, expires in self.client.hgetall(LEASES_KEY).items():
+            if float(expires) <= now:
+                self._update(job_id, lambda job: self._requeue_writes(job_id, job, now))
+
+    def _requeue_writes(self, job_id: str, job: Dict[str, str], now: float) -> Optional[Callable]:
+        expires = self.client.hget(LEASES_KEY, job_id)
+        if expires is None or float(expires) > now:
+            # Renewed or already handled by another worker
+            return None
+
+        def write(pipe) -> None:
+            pipe.hdel(LEASES_KEY, job_id)
+            if job.get('status') not in ('queued', 'running'):
+                return
+            pipe.delete(*self._result_keys(job_id, job))
+            pipe.hdel(self._key(job_id), 'runner')
+            attempts = int(job.get('attempts', 0))
+            if attempts >= self.max_attempts:
+                logger.error(f"Batch job {job_id} failed: its worker stopped {attempts} times")
+                pipe.hset(self._key(job_id), mapping={
+                    'status': 'failed', 'done': 0, 'finished_at': now,
+                    'error': f"Job worker stopped {attempts} times",
+                })
+                pipe.delete(self._key(job_id, 'input'))
+            else:
+                logger.warning(f"Requeueing batch job {job_id}: its worker's lease expired")
+                pipe.hset(self._key(job_id), mapping={'status': 'queued', 'done': 0})
+                pipe.rpush(QUEUE_KEY, job_id)
+        return write
+
+    def _transition(self, job_id: str, from_statuses, mapping: Dict[str, Any]) -> Optional[str]:
+        """Atomically update a job whose status is one of from_statuses; its previous status, or None"""
+        previous = []
+
+        def change(job: Dict[str, str]) -> Optional[Callable]:
+            if job.get('status') not in from_statuses:
+                return None
+            previous.append(job['status'])
+            return lambda pipe: pipe.hset(self._key(job_id), mapping=mapping)
+
+        return previous[-1] if self._update(job_id, change) else None
+
+    def _update(self, job_id: str, change: Callable[[Dict[str, str]], Optional[Callable]]) -> bool:
+        """
+        Read-check-write a job in one WATCH/MULTI/EXEC
+
+        change gets the job record and returns the writes to queue on the
+        pipeline, or None to leave the job alone (then False is returned).
+        """
+        key = self._key(job_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    write = change(pipe.hgetall(key))
+                    if write is None:
+                        return False
+                    pipe.multi()
+                    write(pipe)
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    def _result_keys(self, job_id: str, job: Dict[str, str]) -> List[str]:
+        """The results list, or every page the job's done count says was written"""
+        if job.get('spilled') != '1':
+            return [self._key(job_id, 'results')]
+        pages = math.ceil(int(job.get('done', 0)) / self._page_size(job))
+        return [self._key(job_id, f'page:{page}') for page in range(pages)] or [self._key(job_id, 'page:0')]
+
+    def _read_pages(self, job_id: str, start: int, end: int) -> List[Any]:
+        page_size = self._page_size(self.client.hgetall(self._key(job_id)))
+        first, last = start // page_size, (end - 1) // page_size
+        lines = []
+        for raw in self.client.mget([self._key(job_id, f'page:{page}') for page in range(first, last + 1)]):
+            if raw is None:
+                # Requeued or expired since the record was read
+                break
+            lines += _decode_page(raw)
+        skip = start - first * page_size
+        return [json.loads(line) for line in lines[skip:skip + end - start]]
+
+    def _page_size(self, job: Dict[str, str]) -> int:
+        # Records written before pages existed have no page_size
+        return int(job.get('page_size', self.chunk_size))
+
+    @staticmethod
+    def _key(job_id: str, suffix: Optional[str] = None) -> str:
+        return f'oilwise:job:{job_id}' + (f':{suffix}' if suffix else '')
+
+
+def _encode_page(lines: List[str]) -> str:
+    # ASCII, so clients with decode_responses=True (and LocalRedis) store it as is
+    return base64.b64encode(zlib.compress('\n'.join(lines).encode(), 1)).decode('ascii')
+
+
+def _decode_page(raw: str) -> List[str]:
+    return zlib.decompress(base64.b64decode(raw)).decode().split('\n')
+
+
+def _serving_processes() -> int:
+    """Processes serving the app: gunicorn's worker count when running under it (gunicorn.conf.py), else 1"""
+    if 'gunicorn' not in sys.modules:
+        return 1
+    return int(os.getenv('GUNICORN_WORKERS', 4))
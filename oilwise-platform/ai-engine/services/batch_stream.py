@@ -0,0 +1,97 @@
+import json
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from services.json_encoder import response_encoder
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_LINE_BYTES = 1 << 20
+
+
+class MalformedLine:
+    """Placeholder for an input line that could not be parsed"""
+
+    __slots__ = ('line_number', 'error')
+
+    def __init__(self, line_number: int, error: str):
+        self.line_number = line_number
+        self.error = error
+
+
+def iter_ndjson(stream, max_line_bytes: int = MAX_LINE_BYTES) -> Iterator[Any]:
+    """
+    Parse newline-delimited JSON incrementally from a binary stream
+
+    Lines are read one at a time, so memory stays bounded by max_line_bytes
+    however long the stream is. Blank lines are skipped; a line that is too
+    long or not valid JSON yields a MalformedLine in its place so the output
+    stays aligned with the input.
+    """
+    line_number = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        line_number += 1
+
+        if len(line) > max_line_bytes and not line.endswith(b'\n'):
+            # Drain the rest of the oversized line without buffering it
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_line_bytes)
+            yield MalformedLine(line_number, f'Line exceeds {max_line_bytes} bytes')
+            continue
+
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield MalformedLine(line_number, f'Invalid JSON: {e}')
+
+
+def iter_chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of at most size items"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_results(items: Iterable[Any], process: Callable[[List[Any]], List[Dict[str, Any]]],
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Process items in fixed-size chunks and yield one NDJSON result line per item
+
+    Results are emitted in input order as soon as each chunk is done, so at
+    most one chunk of inputs and results is held in memory. A malformed
+    input line produces an error line at its position; a failure inside
+    process ends the stream with a final error line, since the response
+    status has already been sent.
+    """
+    for chunk in iter_chunks(items, chunk_size):
+        valid = [item for item in chunk if not isinstance(item, MalformedLine)]
+        try:
+            results = iter(process(valid)) if valid else iter(())
+        except Exception as e:
+            logger.error(f"Error in streaming batch processing: {str(e)}")
+            yield _dumps({'error': str(e), 'fatal': True})
+            return
+
+        lines = []
+        for item in chunk:
+            if isinstance(item, MalformedLine):
+                lines.append(_dumps({'error': item.error, 'line': item.line_number}))
+            else:
+                lines.append(_dumps(next(results)))
+        yield ''.join(lines)
+
+
+def _dumps(value: Any) -> str:
+    return response_encoder.dumps(value, sort_keys=False).decode() + '\n'
@@ -0,0 +1,125 @@
+import numpy as np
+from typing import Dict, List, Optional
+import logging
+
+from services.metrics import metrics
+from services.recipe_catalogue import RecipeCatalogue, normalize_tag
+
+logger = logging.getLogger(__name__)
+
+# Pruning before similarity scoring; rows_pruned / rows_considered is the prune ratio
+CANDIDATE_SELECTIONS = metrics.counter('candidate_selections_total', 'Candidate selections by the recipe index')
+CANDIDATE_ROWS_CONSIDERED = metrics.counter('candidate_rows_considered_total',
+                                            'Recipe rows considered by candidate selection')
+CANDIDATE_ROWS_PRUNED = metrics.counter('candidate_rows_pruned_total',
+                                        'Recipe rows pruned before similarity scoring')
+
+class CandidateIndex:
+    """Inverted index from cuisine, dietary restriction and oil level tags to recipe rows
+
+    Every posting list is a sorted int32 array of catalogue row ids, so
+    candidate selection is a handful of sorted-array unions and
+    intersections and only eligible rows reach the similarity kernel.
+    """
+
+    def __init__(self, catalogue: RecipeCatalogue):
+        self.n_recipes = len(catalogue)
+        self.cuisine_postings = self._group_rows(catalogue.cuisine_codes, catalogue.cuisines)
+        self.oil_level_postings = self._group_rows(catalogue.oil_level_codes, catalogue.header['oil_levels'])
+
+        self.dietary_postings = {}
+        masks = np.asarray(catalogue.dietary_masks)
+        for bit, tag in enumerate(catalogue.dietary_tags):
+            self.dietary_postings[tag] = np.flatnonzero(masks & np.uint64(1 << bit)).astype(np.int32)
+
+    def select(self, cuisines: List[str], restrictions: List[str],
+               oil_levels: Optional[List[str]] = None) -> Optional[np.ndarray]:
+        """
+        Select the recipe rows eligible for a user
+
+        Dietary restrictions and oil levels are hard constraints. Cuisine
+        preferences narrow the candidates further, unless no eligible recipe
+        matches any preferred cuisine.
+
+        Args:
+            cuisines: Preferred cuisines (any may match)
+            restrictions: Dietary restrictions (all must match)
+            oil_levels: Accepted oil level tags (any may match)
+
+        Returns:
+            Sorted row ids, or None when nothing is filtered out
+        """
+        constraints = []
+
+        for restriction in restrictions:
+            constraints.append(self.dietary_postings.get(normalize_tag(restriction), self._empty()))
+
+        if oil_levels:
+            constraints.append(self._union(self.oil_level_postings, oil_levels))
+
+        rows = self._intersect_all(constraints)
+
+        if cuisines:
+            preferred = self._union(self.cuisine_postings, [normalize_tag(c) for c in cuisines])
+            narrowed = preferred if rows is None else self._intersect(rows, preferred)
+            if len(narrowed) > 0:
+                rows = narrowed
+
+        self._record(rows)
+        return rows
+
+    def _record(self, rows: Optional[np.ndarray]):
+        candidates = self.n_recipes if rows is None else len(rows)
+        pruned = self.n_recipes - candidates
+
+        CANDIDATE_SELECTIONS.inc()
+        CANDIDATE_ROWS_CONSIDERED.inc(self.n_recipes)
+        CANDIDATE_ROWS_PRUNED.inc(pruned)
+
+        logger.debug(f"Candidate pruning: {pruned} of {self.n_recipes} recipes pruned")
+
+    def _union(self, postings: Dict[str, np.ndarray], keys: List[str]) -> np.ndarray:
+        lists = [postings[k] for k in keys if k in postings]
+        if not lists:
+            return self._empty()
+        if len(lists) == 1:
+            return lists[0]
+        return np.unique(np.concatenate(lists))
+
+    def _intersect_all(self, lists: List[np.ndarray]) -> Optional[np.ndarray]:
+        if not lists:
+            return None
+
+        # Start from the shortest list so every step probes the fewest ids
+        lists = sorted(lists, key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            if len(rows) == 0:
+                break
+            rows = self._intersect(rows, other)
+        return rows
+
+    @staticmethod
+    def _intersect(small: np.ndarray, large: np.ndarray) -> np.ndarray:
+        """Intersect two sorted id arrays by binary-searching the smaller into the larger"""
+        if len(small) > len(large):
+            small, large = large, small
+        if len(small) == 0:
+            return small
+
+        positions = np.searchsorted(large, small)
+        positions[positions == len(large)] = 0
+        return small[large[positions] == small]
+
+    @staticmethod
+    def _group_rows(codes: np.ndarray, labels: List[str]) -> Dict[str, np.ndarray]:
+        """Sorted row ids per categorical code, built with one stable argsort"""
+        codes = np.asarray(codes)
+        order = np.argsort(codes, kind='stable').astype(np.int32)
+        counts = np.bincount(codes, minlength=len(labels)) if len(codes) else np.zeros(len(labels), dtype=np.int64)
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        return {label: order[bounds[i]:bounds[i + 1]] for i, label in enumerate(labels)}
+
+    @staticmethod
+    def _empty() -> np.ndarray:
+        return np.empty(0, dtype=np.int32)
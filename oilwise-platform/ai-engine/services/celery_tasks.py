@@ -0,0 +1,25 @@
+import os
+
+from celery import Celery
+
+from services.batch_executor import run_chunk
+
+# Start workers with: celery -A services.celery_tasks worker --loglevel=info
+celery_app = Celery(
+    'oilwise_ai_engine',
+    broker=os.getenv('CELERY_BROKER_URL', os.getenv('REDIS_URL', 'redis://localhost:6379')),
+    backend=os.getenv('CELERY_RESULT_BACKEND', os.getenv('REDIS_URL', 'redis://localhost:6379')),
+)
+celery_app.conf.update(
+    task_serializer='json',
+    result_serializer='json',
+    accept_content=['json'],
+    # In-process stand-in for local runs: tasks execute synchronously in the caller
+    task_always_eager=os.getenv('CELERY_TASK_ALWAYS_EAGER', 'false').lower() == 'true',
+    worker_prefetch_multiplier=1,
+)
+
+
+@celery_app.task(name='oilwise.batch.process_chunk')
+def process_chunk(batch_type: str, items):
+    return run_chunk(batch_type, items)
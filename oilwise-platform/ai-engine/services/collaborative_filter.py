@@ -0,0 +1,269 @@
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Interactions per block of the CG solve; each block gathers nnz x factors floats twice
+BLOCK_NNZ = 1 << 18
+
+
+def _user_hash(user_id: Any) -> int:
+    return int.from_bytes(hashlib.blake2b(str(user_id).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _rowdot(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.einsum('ij,ij->i', a, b)
+
+
+class ImplicitALS:
+    """Implicit-feedback matrix factorization by alternating least squares
+
+    Interactions r_ui become a preference p_ui = 1 with confidence
+    c_ui = 1 + alpha * r_ui (Hu, Koren and Volinsky), and every other
+    user-recipe pair a preference 0 with confidence 1. Each half-step
+    solves the regularized weighted least squares problem of every user
+    (then every recipe) with a few conjugate-gradient steps warm-started
+    from the previous factors, vectorized over blocks of rows of the CSR
+    interaction matrix, so no k x k system is formed per user.
+    """
+
+    def __init__(self, factors: int = 64, regularization: float = 0.1, alpha: float = 40.0, iterations: int = 10,
+                 cg_steps: int = 3, seed: int = 0):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.seed = seed
+        self.user_factors: Optional[np.ndarray] = None
+        self.item_factors: Optional[np.ndarray] = None
+
+    def fit(self, interactions) -> 'ImplicitALS':
+        """
+        Train on a (n_users, n_items) scipy.sparse matrix of interaction strengths
+
+        Returns:
+            self, with user_factors (n_users, factors) and item_factors
+            (n_items, factors) as float32
+        """
+        import scipy.sparse
+
+        user_items = scipy.sparse.csr_matrix(interactions, dtype=np.float32)
+        user_items.sum_duplicates()
+        item_users = user_items.T.tocsr()
+
+        rng = np.random.default_rng(self.seed)
+        n_users, n_items = user_items.shape
+        self.user_factors = (rng.standard_normal((n_users, self.factors)) * 0.01).astype(np.float32)
+        self.item_factors = (rng.standard_normal((n_items, self.factors)) * 0.01).astype(np.float32)
+
+        for iteration in range(self.iterations):
+            started = time.perf_counter()
+            self._solve(user_items, self.user_factors, self.item_factors)
+            self._solve(item_users, self.item_factors, self.user_factors)
+            logger.info(f"ALS iteration {iteration + 1}/{self.iterations} in {time.perf_counter() - started:.2f} s")
+
+        return self
+
+    def _solve(self, interactions, x: np.ndarray, y: np.ndarray) -> None:
+        """Update every row of x in place against the fixed factors y"""
+        import scipy.sparse
+
+        gram = (y.T.astype(np.float64) @ y + self.regularization * np.eye(self.factors)).astype(np.float32)
+        indptr = interactions.indptr
+        n_rows = interactions.shape[0]
+
+        start = 0
+        while start < n_rows:
+            # Rows up to BLOCK_NNZ interactions (at least one row per block)
+            stop = int(np.searchsorted(indptr, indptr[start] + BLOCK_NNZ, side='right')) - 1
+            stop = min(max(stop, start + 1), n_rows)
+
+            block = interactions[start:stop]
+            shape = block.shape
+            rows = np.repeat(np.arange(stop - start), np.diff(block.indptr))
+            y_items = y[block.indices]
+            scaled = self.alpha * block.data
+
+            def apply(v: np.ndarray) -> np.ndarray:
+                # (Y^T C_u Y + lambda I) v for every row u of the block
+                weights = scaled * _rowdot(y_items, v[rows])
+                return v @ gram + scipy.sparse.csr_matrix((weights, block.indices, block.indptr), shape=shape) @ y
+
+            b = scipy.sparse.csr_matrix((1 + scaled, block.indices, block.indptr), shape=shape) @ y
+            xb = x[start:stop]
+            residual = b - apply(xb)
+            direction = residual.copy()
+            rs_old = _rowdot(residual, residual)
+            for _ in range(self.cg_steps):
+                a_direction = apply(direction)
+                curvature = _rowdot(direction, a_direction)
+                step = np.divide(rs_old, curvature, out=np.zeros_like(rs_old), where=curvature > 0)
+                xb += step[:, None] * direction
+                residual -= step[:, None] * a_direction
+                rs_new = _rowdot(residual, residual)
+                beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)
+                direction = residual + beta[:, None] * direction
+                rs_old = rs_new
+            start = stop
+
+
+class CollaborativeModel:
+    """Trained user and recipe factors, scored against a compiled catalogue
+
+    Recipe factors are aligned with the catalogue rows, so a model only
+    serves the catalogue version it was trained for. Users are found by a
+    binary search over sorted user-id hashes. The arrays are loaded once;
+    with gunicorn preload they are shared copy-on-write by the workers.
+    """
+
+    def __init__(self, user_factors: np.ndarray, item_factors: np.ndarray, user_hashes: np.ndarray,
+                 user_rows: np.ndarray, catalogue_version: str = ''):
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.user_hashes = user_hashes
+        self.user_rows = user_rows
+        self.catalogue_version = catalogue_version
+        self.version = hashlib.sha256(item_factors.tobytes()).hexdigest()[:16]
+
+    @classmethod
+    def from_training(cls, als: ImplicitALS, user_ids: List[str], catalogue_version: str = '') -> 'CollaborativeModel':
+        hashes = np.array([_user_hash(user_id) for user_id in user_ids], dtype=np.uint64)
+        order = np.argsort(hashes, kind='stable')
+        return cls(als.user_factors, als.item_factors, hashes[order], order.astype(np.uint32), catalogue_version)
+
+    def save(self, path: str) -> None:
+        """Write the factors to an .npz file"""
+        with open(path, 'wb') as f:
+            np.savez(f, catalogue_version=np.array(self.catalogue_version), user_factors=self.user_factors,
+                     item_factors=self.item_factors, user_hashes=self.user_hashes, user_rows=self.user_rows)
+
+    @classmethod
+    def load(cls, path: str, catalogue_version: str = '') -> Optional['CollaborativeModel']:
+        """Load saved factors, or None when they belong to another catalogue version"""
+        with np.load(path) as data:
+            if str(data['catalogue_version']) != catalogue_version:
+                logger.warning(f"Collaborative model {path} was trained for another catalogue version, ignoring it")
+                return None
+            model = cls(data['user_factors'], data['item_factors'], data['user_hashes'], data['user_rows'],
+                        catalogue_version)
+        logger.info(f"Loaded collaborative model {path} ({len(model.user_rows)} users, "
+                    f"{model.user_factors.shape[1]} factors)")
+        return model
+
+    def user_row(self, user_id: Any) -> Optional[int]:
+        """The user's factor row, or None for users without interactions"""
+        if user_id is None:
+            return None
+        key = _user_hash(user_id)
+        i = int(self.user_hashes.searchsorted(np.uint64(key)))
+        if i < len(self.user_hashes) and int(self.user_hashes[i]) == key:
+            return int(self.user_rows[i])
+        return None
+
+    def scores(self, user_row: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Predicted preference of the user for every recipe (or the given rows)"""
+        items = self.item_factors if rows is None else self.item_factors[rows]
+        return (items @ self.user_factors[user_row]).astype(np.float64)
+
+
+def load_interactions(path: str, catalogue) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    User ids and (user index, catalogue row, weight) triples from an interaction log
+
+    Accepts a CSV or JSON lines export with user_id (or userId), a recipe
+    given as recipe_id (or recipeId) or as dish_name (or dishName, matched
+    to recipe names for consumption records), and an optional weight or
+    rating (default 1). Rows naming no catalogue recipe, or no user, are
+    skipped.
+    """
+    by_id = {catalogue.recipe_id(row): row for row in range(len(catalogue))}
+    by_name = {catalogue.name(row).strip().lower(): row for row in range(len(catalogue))}
+
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            records = list(csv.DictReader(f))
+        else:
+            records = [json.loads(line) for line in f if line.strip()]
+
+    user_index: Dict[str, int] = {}
+    users, items, weights = [], [], []
+    skipped = anonymous = 0
+    for record in records:
+        user_id = record.get('user_id', record.get('userId'))
+        if user_id in (None, ''):
+            anonymous += 1
+            continue
+        recipe_id = record.get('recipe_id', record.get('recipeId'))
+        if recipe_id not in (None, ''):
+            row = by_id.get(str(recipe_id))
+        else:
+            row = by_name.get(str(record.get('dish_name', record.get('dishName')) or '').strip().lower())
+        if row is None:
+            skipped += 1
+            continue
+        users.append(user_index.setdefault(str(user_id), len(user_index)))
+        items.append(row)
+        weights.append(float(record.get('weight') or record.get('rating') or 1))
+
+    if skipped:
+        logger.warning(f"Skipped {skipped} interactions naming no catalogue recipe")
+    if anonymous:
+        logger.warning(f"Skipped {anonymous} interactions without a user_id")
+    return (list(user_index), np.array(users, dtype=np.int64), np.array(items, dtype=np.int64),
+            np.array(weights, dtype=np.float32))
+
+
+def interaction_matrix(users: np.ndarray, items: np.ndarray, weights: np.ndarray, n_users: int, n_items: int):
+    """(n_users, n_items) CSR matrix of summed interaction weights"""
+    import scipy.sparse
+
+    matrix = scipy.sparse.csr_matrix((weights, (users, items)), shape=(n_users, n_items), dtype=np.float32)
+    matrix.sum_duplicates()
+    return matrix
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Offline training: python -m services.collaborative_filter train interactions.csv --catalogue recipes.cat -o recipes.als.npz"""
+    from services.recipe_catalogue import RecipeCatalogue
+
+    parser = argparse.ArgumentParser(description='Train the collaborative-filtering recipe model')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help='Train ALS factors on an interaction log')
+    train_parser.add_argument('interactions', help='Interaction export (.csv or .jsonl)')
+    train_parser.add_argument('--catalogue', required=True, help='Compiled recipe catalogue file')
+    train_parser.add_argument('-o', '--output', required=True, help='Path of the .npz model to write')
+    train_parser.add_argument('--factors', type=int, default=64)
+    train_parser.add_argument('--iterations', type=int, default=10)
+    train_parser.add_argument('--regularization', type=float, default=0.1)
+    train_parser.add_argument('--alpha', type=float, default=40.0, help='Confidence per unit of interaction weight')
+    train_parser.add_argument('--cg-steps', type=int, default=3)
+
+    args = parser.parse_args(argv)
+
+    catalogue = RecipeCatalogue.open(args.catalogue)
+    user_ids, users, items, weights = load_interactions(args.interactions, catalogue)
+    matrix = interaction_matrix(users, items, weights, len(user_ids), len(catalogue))
+
+    started = time.perf_counter()
+    als = ImplicitALS(args.factors, args.regularization, args.alpha, args.iterations, args.cg_steps).fit(matrix)
+    CollaborativeModel.from_training(als, user_ids, catalogue.version).save(args.output)
+
+    json.dump({'catalogue_version': catalogue.version, 'n_users': len(user_ids), 'n_recipes': len(catalogue),
+               'interactions': int(matrix.nnz), 'factors': args.factors,
+               'train_seconds': round(time.perf_counter() - started, 2)}, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import io
+import struct
+import zipfile
+from typing import Dict, Optional
+
+import numpy as np
+
+# Batch payload formats accepted next to JSON: an Arrow IPC stream, or a zip of
+# <column>.npy members (the layout numpy.savez writes and numpy.load reads)
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+NPY_ZIP = 'application/zip'
+COLUMNAR_FORMATS = (ARROW_STREAM, NPY_ZIP)
+JSON = 'application/json'
+
+_FORMAT_ALIASES = {
+    ARROW_STREAM: ARROW_STREAM,
+    'application/x-arrow': ARROW_STREAM,
+    NPY_ZIP: NPY_ZIP,
+    'application/x-npz': NPY_ZIP,
+}
+
+_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+
+class UnsupportedColumnarFormat(ValueError):
+    """The payload format cannot be read here (e.g. Arrow without pyarrow installed)"""
+    pass
+
+
+def columnar_format(content_type: Optional[str]) -> Optional[str]:
+    """The columnar format named by a Content-Type header, or None for JSON and anything else"""
+    if not content_type:
+        return None
+    return _FORMAT_ALIASES.get(content_type.split(';', 1)[0].strip().lower())
+
+
+def response_format(accept: Optional[str], request_format: str) -> str:
+    """
+    Format to answer a columnar request in: the Accept header's preferred
+    columnar format or JSON, otherwise the format the request was sent in
+    """
+    best, best_quality = request_format, 0.0
+    for media_range in (accept or '').split(','):
+        media_type, *params = (part.strip() for part in media_range.split(';'))
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        media_type = media_type.lower()
+        candidate = JSON if media_type == JSON else _FORMAT_ALIASES.get(media_type)
+        if candidate is not None and quality > best_quality:
+            best, best_quality = candidate, quality
+    return best
+
+
+def read_columns(body: bytes, payload_format: str) -> Dict[str, np.ndarray]:
+    """
+    Decode a columnar payload into NumPy columns
+
+    Fixed-width columns are views of the request body rather than copies:
+    stored (uncompressed) .npy members are mapped in place and Arrow
+    buffers are wrapped as they are, so a 100k-row batch costs no per-row
+    Python objects. Compressed members and Arrow columns with nulls or
+    several chunks are copied (nulls become NaN). The views are read-only.
+
+    Raises:
+        UnsupportedColumnarFormat: the format is unknown or needs pyarrow
+        ValueError: the payload is malformed or its columns differ in length
+    """
+    if payload_format == NPY_ZIP:
+        columns = _read_npy_zip(body)
+    elif payload_format == ARROW_STREAM:
+        columns = _read_arrow_stream(body)
+    else:
+        raise UnsupportedColumnarFormat(f"Unsupported batch payload format: {payload_format}")
+
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"Columns differ in length: {sorted(lengths)}")
+    return columns
+
+
+def write_columns(columns: Dict[str, np.ndarray], payload_format: str) -> bytes:
+    """Encode result columns in the given columnar format"""
+    if payload_format == NPY_ZIP:
+        buffer = io.BytesIO()
+        np.savez(buffer, **columns)
+        return buffer.getvalue()
+    if payload_format == ARROW_STREAM:
+        pa = _import_pyarrow()
+        table = pa.table({name: pa.array(column) for name, column in columns.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    raise UnsupportedColumnarFormat(f"Unsupported batch payload format: {payload_format}")
+
+
+def _read_npy_zip(body: bytes) -> Dict[str, np.ndarray]:
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(body))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Invalid .npy zip payload: {e}")
+
+    columns = {}
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type == zipfile.ZIP_STORED:
+                columns[name] = _stored_npy_view(body, info)
+            else:
+                with archive.open(info) as member:
+                    columns[name] = np.lib.format.read_array(member, allow_pickle=False)
+    return columns
+
+
+def _stored_npy_view(body: bytes, info: zipfile.ZipInfo) -> np.ndarray:
+    """An uncompressed .npy member as an array viewing the payload bytes"""
+    header = body[info.header_offset:info.header_offset + _LOCAL_HEADER.size]
+    if len(header) != _LOCAL_HEADER.size or header[:4] != _LOCAL_HEADER_SIGNATURE:
+        raise ValueError(f"Invalid .npy zip payload: bad local header for {info.filename}")
+    name_length, extra_length = _LOCAL_HEADER.unpack(header)[-2:]
+    start = info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+    member = io.BytesIO(body[start:start + min(info.file_size, 1 << 16)])
+    version = np.lib.format.read_magic(member)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(member)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(member)
+    else:
+        raise ValueError(f"Column {info.filename} uses unsupported .npy format version {version}")
+    if dtype.hasobject:
+        raise ValueError(f"Column {info.filename} holds Python objects, which are not accepted")
+
+    count = int(np.prod(shape, dtype=np.int64))
+    if member.tell() + count * dtype.itemsize > info.file_size:
+        raise ValueError(f"Invalid .npy zip payload: {info.filename} is truncated")
+    array = np.frombuffer(body, dtype=dtype, count=count, offset=start + member.tell())
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def _read_arrow_stream(body: bytes) -> Dict[str, np.ndarray]:
+    pa = _import_pyarrow()
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"Invalid Arrow IPC payload: {e}")
+
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if column.num_chunks == 1 and column.null_count == 0:
+            columns[name] = column.chunk(0).to_numpy(zero_copy_only=False)
+        else:
+            column = column.combine_chunks()
+            if column.null_count and (pa.types.is_integer(column.type) or pa.types.is_boolean(column.type)):
+                column = column.cast(pa.float64())
+            columns[name] = column.to_numpy(zero_copy_only=False)
+    return columns
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise UnsupportedColumnarFormat(f"{ARROW_STREAM} payloads need pyarrow installed")
+    return pyarrow
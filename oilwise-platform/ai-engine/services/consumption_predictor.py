@@ -1,14 +1,80 @@
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence
 import logging
 
+from services.consumption_state import create_state_store
+from services.forecast_table import ForecastTableSource, history_fingerprint
+from services.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+STAGES = metrics.stages('consumption_predictor')
+FORECAST_TABLE_LOOKUPS = {
+    result: metrics.counter('forecast_table_lookups_total', 'predict calls answered from the nightly forecast '
+                            'table (hit) or computed live (miss)', result=result)
+    for result in ('hit', 'miss')
+}
+
+
+
+def reading_values(records: Sequence[Dict]) -> np.ndarray:
+    """
+    The records' oil_quantity values as float64 (0 when the key is absent)
+
+    Raises:
+        ValueError: a value is null, text or not finite, which the fits
+            cannot use and JSON cannot carry back
+    """
+    values = np.empty(len(records), dtype=np.float64)
+    for i, record in enumerate(records):
+        value = record.get('oil_quantity', 0)
+        try:
+            if isinstance(value, str):
+                raise TypeError
+            values[i] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"oil_quantity must be a number, got {value!r}")
+    if not np.isfinite(values).all():
+        raise ValueError("oil_quantity must be a finite number")
+    return values
+
+
 class ConsumptionPredictor:
     """AI-powered consumption prediction engine"""
     
-    def __init__(self):
+    RECOMMENDED_DAILY = 33.3  # ICMR recommendation
+    MIN_HISTORY = 3
+    FORECAST_DAYS = 7
+    # Bump when the fits, thresholds or messages change, so older forecast tables are not served
+    MODEL_VERSION = 2
+    # Daily slope beyond which consumption is increasing or decreasing. Slopes within
+    # SLOPE_TOLERANCE of it count as on the threshold (stable): a series rising exactly
+    # 0.5 a day must not flip with the rounding of whichever fit computed it.
+    TREND_SLOPE = 0.5
+    SLOPE_TOLERANCE = 1e-9
+    STAT_NAMES = ('mean', 'median', 'std_dev', 'min', 'max', 'total')
+    
+    TRENDS = ('stable', 'increasing', 'decreasing')
+    TREND_INSIGHTS = (
+        'Your oil consumption is stable. Aim to reduce it further.',
+        'Your oil consumption is increasing. Consider reducing portion sizes.',
+        'Great! Your oil consumption is decreasing. Keep up the good work!',
+    )
+    VARIABILITY_INSIGHT = 'Your consumption varies significantly. Try to maintain consistency.'
+    EXCESS_INSIGHT = 'Your average consumption is {excess:.1f}% above recommended levels.'
+    WITHIN_LIMIT_INSIGHT = 'Your average consumption is within recommended levels!'
+    RECOMMENDATIONS = (
+        'Urgent: Significantly reduce oil intake. Consult a nutritionist.',
+        'Moderate: Gradually reduce oil intake to recommended levels.',
+        'Caution: Your consumption is increasing. Maintain current levels.',
+        'Good: Continue your healthy consumption habits.',
+    )
+    
+    def __init__(self, state_store=None, forecast_source=None):
         self.model_params = {}
+        self.state_store = state_store or create_state_store()
+        # Nightly forecasts (FORECAST_TABLE_PATH), served while a user's history is unchanged
+        self.forecast_source = forecast_source or ForecastTableSource.from_env(self.MODEL_VERSION)
     
     def predict(self, user_id: str, historical_data: List[Dict]) -> Dict[str, Any]:
         """
@@ -22,131 +88,451 @@ class ConsumptionPredictor:
             Prediction with forecast and trend analysis
         """
         try:
-            if not historical_data or len(historical_data) < 3:
+            watch = STAGES.start()
+            if not historical_data or len(historical_data) < self.MIN_HISTORY:
                 return {
                     'error': 'Insufficient historical data for prediction',
-                    'min_required': 3,
+                    'min_required': self.MIN_HISTORY,
                     'provided': len(historical_data)
                 }
             
             # Extract consumption values
-            consumption_values = [record.get('oil_quantity', 0) for record in historical_data]
+            values = reading_values(historical_data)
+            watch.lap('parse')
             
-            # Calculate trend
-            trend = self._calculate_trend(consumption_values)
+            forecast = self._lookup_forecast(user_id, values)
+            if forecast is not None:
+                watch.lap('table_lookup')
+                return forecast
             
-            # Predict next 7 days
-            predictions = self._predict_next_days(consumption_values, days=7)
+            # Linear and quadratic fits plus statistics in one fused pass
+            fit = self._fit_series(values)
+            watch.lap('fit_and_stats')
             
-            # Calculate statistics
-            stats = self._calculate_statistics(consumption_values)
+            return self._build_prediction(user_id, fit, values, watch)
             
-            # Generate insights
-            insights = self._generate_insights(consumption_values, trend, stats)
+        except Exception as e:
+            logger.error(f"Error in consumption prediction: {str(e)}")
+            return {'error': str(e)}
+    
+    def _lookup_forecast(self, user_id: str, values: np.ndarray) -> Optional[Dict[str, Any]]:
+        """The user's nightly forecast, if it was computed from exactly these values"""
+        table = self.forecast_source.current() if self.forecast_source is not None else None
+        if table is None:
+            return None
+        row = table.lookup(user_id, history_fingerprint(values))
+        FORECAST_TABLE_LOOKUPS['hit' if row is not None else 'miss'].inc()
+        if row is None:
+            return None
+        stats = {name: row[name] for name in self.STAT_NAMES}
+        return self._coded_record(user_id, stats, row['predictions'], row['next_30_days_average'], row['trend_code'],
+                                  row['high_variability'], row['excess_percent'], row['recommendation_code'])
+    
+    def append_readings(self, user_id: str, readings: List[Dict]) -> Dict[str, Any]:
+        """
+        Fold new readings into the user's stored state and predict from it
+        
+        Only readings not sent before are passed; the forecast is computed
+        from the running statistics, so its cost does not grow with the
+        length of the history.
+        
+        Args:
+            user_id: User identifier
+            readings: New consumption records, oldest first
             
+        Returns:
+            Prediction in the same format as predict
+        """
+        try:
+            # Convert up front so a bad reading cannot leave the state half-updated
+            watch = STAGES.start()
+            values = [float(record.get('oil_quantity', 0)) for record in readings]
+            state = self.state_store.update(user_id, lambda s: s.update(values))
+            watch.lap('state_update')
+            return self._predict_from_state(user_id, state, watch)
+        
+        except Exception as e:
+            logger.error(f"Error in incremental consumption prediction: {str(e)}")
+            return {'error': str(e)}
+    
+    def predict_incremental(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Predict from the user's stored state, or None if nothing was appended yet"""
+        state = self.state_store.get(user_id)
+        if state is None:
+            return None
+        return self._predict_from_state(user_id, state)
+    
+    def reset_state(self, user_id: str) -> None:
+        """Forget the user's stored readings"""
+        self.state_store.delete(user_id)
+    
+    def _predict_from_state(self, user_id: str, state, watch=None) -> Dict[str, Any]:
+        if state.n < self.MIN_HISTORY:
             return {
-                'user_id': user_id,
-                'current_average': float(np.mean(consumption_values)),
-                'trend': trend,
-                'predictions': {
-                    'next_7_days': [float(p) for p in predictions],
-                    'next_30_days_average': float(np.mean(predictions) * 4.3),  # Approximate
-                },
-                'statistics': stats,
-                'insights': insights,
-                'recommendation': self._get_recommendation(trend, stats)
+                'error': 'Insufficient historical data for prediction',
+                'min_required': self.MIN_HISTORY,
+                'provided': state.n
             }
+        watch = watch or STAGES.start()
+        fit = state.fit()
+        watch.lap('fit_and_stats')
+        return self._build_prediction(user_id, fit, list(state.window), watch)
+    
+    def _build_prediction(self, user_id: str, fit: Dict[str, Any], values, watch) -> Dict[str, Any]:
+        """Trend, forecast, insights and recommendation from a fitted series"""
+        # Calculate trend
+        trend = self._calculate_trend(fit)
+        watch.lap('trend')
+        
+        # Predict next 7 days
+        predictions = self._predict_next_days(fit, days=self.FORECAST_DAYS)
+        watch.lap('forecast')
+        
+        # Calculate statistics
+        stats = fit['statistics']
+        
+        # Generate insights
+        insights = self._generate_insights(values, trend, stats)
+        watch.lap('insights')
+        
+        return {
+            'user_id': user_id,
+            'current_average': stats['mean'],
+            'trend': trend,
+            'predictions': {
+                'next_7_days': predictions.tolist(),
+                'next_30_days_average': float(np.mean(predictions) * 4.3),  # Approximate
+            },
+            'statistics': stats,
+            'insights': insights,
+            'recommendation': self._get_recommendation(trend, stats)
+        }
+    
+    def predict_batch(self, user_ids: Sequence[str], values: np.ndarray, offsets: np.ndarray) -> Dict[str, Any]:
+        """
+        Predict consumption for many users from ragged histories at once
+        
+        Every user's linear and quadratic fit and statistics are computed
+        with segment reductions over the concatenated values, so there is
+        no per-user Python loop.
+        
+        Args:
+            user_ids: User identifiers, one per history
+            values: All users' oil quantities concatenated, in history order
+            offsets: (n_users + 1,) start of each user's history in `values`,
+                as exported from a database (offsets[-1] == len(values))
             
-        except Exception as e:
-            logger.error(f"Error in consumption prediction: {str(e)}")
-            return {'error': str(e)}
+        Returns:
+            Column arrays per user: 'valid' marks users with enough history;
+            the other columns are only meaningful where valid is True
+        """
+        values = np.asarray(values, dtype=np.float64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        lengths = np.diff(offsets)
+        n_users = lengths.shape[0]
+        if len(user_ids) != n_users or offsets[-1] != values.shape[0]:
+            raise ValueError('offsets must hold one more entry than user_ids and end at len(values)')
+        
+        valid = lengths >= self.MIN_HISTORY
+        
+        # Reduce over the valid segments only, so no segment is empty
+        if not valid.all():
+            values = values[np.repeat(valid, lengths)]
+            lengths = lengths[valid]
+        columns, predictions = self._fit_segments(values, lengths)
+        
+        # Scatter back to one row per input user
+        result = {'user_ids': list(user_ids), 'valid': valid, 'lengths': np.diff(offsets)}
+        for name, column in columns.items():
+            full = np.zeros(n_users, dtype=column.dtype)
+            full[valid] = column
+            result[name] = full
+        result['predictions'] = np.zeros((n_users, self.FORECAST_DAYS))
+        result['predictions'][valid] = predictions
+        
+        return result
     
-    def _calculate_trend(self, values: List[float]) -> str:
-        """Calculate consumption trend"""
-        if len(values) < 2:
-            return 'insufficient_data'
+    def predict_many(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Predict consumption for a batch payload of {'user_id', 'data'} items
         
-        # Simple linear regression
-        x = np.arange(len(values))
-        y = np.array(values)
+        Args:
+            items: Batch items, each with a user_id and its historical records
+            
+        Returns:
+            Predictions in the same format as predict, in input order
+        """
+        try:
+            user_ids = [item.get('user_id') for item in items]
+            histories = [item.get('data', []) for item in items]
+            lengths = np.fromiter((len(h) for h in histories), dtype=np.int64, count=len(histories))
+            offsets = np.zeros(len(histories) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            # Text becomes NaN here (null already does), so reading_values' rejections show up as non-finite
+            values = np.fromiter(
+                (value if type(value) is not str else np.nan
+                 for value in (record.get('oil_quantity', 0) for history in histories for record in history)),
+                dtype=np.float64, count=int(offsets[-1])
+            )
+        except Exception:
+            # Malformed items or records: report each one individually
+            return [self._predict_item(item) for item in items]
         
-        # Calculate slope
-        slope = np.polyfit(x, y, 1)[0]
+        finite = np.isfinite(values)
+        if finite.all():
+            return self.batch_to_records(self.predict_batch(user_ids, values, offsets))
         
-        if slope > 0.5:
-            return 'increasing'
-        elif slope < -0.5:
-            return 'decreasing'
+        # Items with unusable readings get predict's error; zeros keep the rest of the batch finite
+        invalid = np.searchsorted(offsets, np.flatnonzero(~finite), side='right') - 1
+        values[~finite] = 0.0
+        records = self.batch_to_records(self.predict_batch(user_ids, values, offsets))
+        for i in np.unique(invalid).tolist():
+            records[i] = self._predict_item(items[i])
+        return records
+    
+    def _predict_item(self, item: Any) -> Dict[str, Any]:
+        """predict for one batch item, or an error result when the item is not an object"""
+        if not isinstance(item, dict):
+            return {'error': 'Batch item must be an object with user_id and data'}
+        return self.predict(item.get('user_id'), item.get('data', []))
+    
+    def batch_to_records(self, batch: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Materialize predict_batch columns into predict-style response dicts"""
+        columns = [batch[name].tolist() for name in self.STAT_NAMES]
+        predictions = batch['predictions'].tolist()
+        next_30 = batch['next_30_days_average'].tolist()
+        trend_codes = batch['trend_code'].tolist()
+        high_variability = batch['high_variability'].tolist()
+        excess = batch['excess_percent'].tolist()
+        recommendation_codes = batch['recommendation_code'].tolist()
+        
+        records = []
+        for i, (user_id, valid, length) in enumerate(zip(batch['user_ids'], batch['valid'].tolist(), batch['lengths'].tolist())):
+            if not valid:
+                records.append({
+                    'error': 'Insufficient historical data for prediction',
+                    'min_required': self.MIN_HISTORY,
+                    'provided': length
+                })
+                continue
+            
+            stats = {name: column[i] for name, column in zip(self.STAT_NAMES, columns)}
+            records.append(self._coded_record(user_id, stats, predictions[i], next_30[i], trend_codes[i],
+                                              high_variability[i], excess[i], recommendation_codes[i]))
+        
+        return records
+    
+    def _coded_record(self, user_id: str, stats: Dict[str, float], predictions: List[float], next_30: float,
+                      trend_code: int, high_variability: bool, excess: float, recommendation_code: int) -> Dict[str, Any]:
+        """predict-style response from the statistics and the trend, insight and recommendation codes"""
+        insights = [self.TREND_INSIGHTS[trend_code]]
+        if high_variability:
+            insights.append(self.VARIABILITY_INSIGHT)
+        if stats['mean'] > self.RECOMMENDED_DAILY:
+            insights.append(self.EXCESS_INSIGHT.format(excess=excess))
         else:
-            return 'stable'
+            insights.append(self.WITHIN_LIMIT_INSIGHT)
+        
+        return {
+            'user_id': user_id,
+            'current_average': stats['mean'],
+            'trend': self.TRENDS[trend_code],
+            'predictions': {
+                'next_7_days': predictions,
+                'next_30_days_average': next_30,
+            },
+            'statistics': stats,
+            'insights': insights,
+            'recommendation': self.RECOMMENDATIONS[recommendation_code]
+        }
     
-    def _predict_next_days(self, values: List[float], days: int = 7) -> np.ndarray:
-        """Predict consumption for next N days"""
-        x = np.arange(len(values))
-        y = np.array(values)
+    def _fit_segments(self, values: np.ndarray, lengths: np.ndarray):
+        """Closed-form fits, statistics and forecasts for non-empty segments of `values`"""
+        n_segments = lengths.shape[0]
+        if n_segments == 0:
+            empty = np.zeros(0)
+            columns = {name: empty for name in ('mean', 'median', 'std_dev', 'min', 'max', 'total',
+                                                 'next_30_days_average', 'excess_percent')}
+            columns.update(trend_code=np.zeros(0, dtype=np.int8), recommendation_code=np.zeros(0, dtype=np.int8),
+                           high_variability=np.zeros(0, dtype=bool))
+            return columns, np.zeros((0, self.FORECAST_DAYS))
         
-        # Fit polynomial (degree 2)
-        coeffs = np.polyfit(x, y, 2)
-        poly = np.poly1d(coeffs)
+        n = lengths.astype(np.float64)
+        starts = np.zeros(n_segments, dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
         
-        # Predict next days
-        future_x = np.arange(len(values), len(values) + days)
-        predictions = poly(future_x)
+        # Centred index t = x - (n-1)/2 within every segment
+        center = (n - 1) / 2
+        t = np.arange(values.shape[0], dtype=np.float64)
+        t -= np.repeat(starts + center, lengths)
         
-        # Ensure non-negative predictions
-        predictions = np.maximum(predictions, 0)
+        s2 = n * (n * n - 1) / 12
+        s4 = n * (n * n - 1) * (3 * n * n - 7) / 240
+        
+        sum_y = np.add.reduceat(values, starts)
+        ty = t * values
+        sum_ty = np.add.reduceat(ty, starts)
+        ty *= t
+        sum_t2y = np.add.reduceat(ty, starts)
+        
+        slope = sum_ty / s2
+        det = s4 * n - s2 * s2
+        quadratic = (n * sum_t2y - s2 * sum_y) / det
+        intercept = (s4 * sum_y - s2 * sum_t2y) / det
+        
+        # Statistics
+        mean = sum_y / n
+        deviations = values - np.repeat(mean, lengths)
+        deviations *= deviations
+        std_dev = np.sqrt(np.add.reduceat(deviations, starts) / n)
+        
+        # Median from one sort of (segment, value) pairs
+        segment = np.repeat(np.arange(n_segments), lengths)
+        order = np.lexsort((values, segment))
+        ordered = values[order]
+        median = (ordered[starts + (lengths - 1) // 2] + ordered[starts + lengths // 2]) / 2
+        
+        # Forecast the next days from the quadratic fits
+        future = (n - center)[:, None] + np.arange(self.FORECAST_DAYS)
+        predictions = (quadratic[:, None] * future + slope[:, None]) * future + intercept[:, None]
+        np.maximum(predictions, 0, out=predictions)
+        
+        limit = self.TREND_SLOPE + self.SLOPE_TOLERANCE
+        trend_code = np.select([slope > limit, slope < -limit], [1, 2], 0).astype(np.int8)
+        recommended = self.RECOMMENDED_DAILY
+        recommendation_code = np.select(
+            [mean > recommended * 1.5, mean > recommended, trend_code == 1], [0, 1, 2], 3
+        ).astype(np.int8)
         
-        return predictions
+        columns = {
+            'mean': mean,
+            'median': median,
+            'std_dev': std_dev,
+            'min': np.minimum.reduceat(values, starts),
+            'max': np.maximum.reduceat(values, starts),
+            'total': sum_y,
+            'next_30_days_average': predictions.mean(axis=1) * 4.3,
+            'trend_code': trend_code,
+            'high_variability': std_dev > mean * 0.5,
+            'excess_percent': (mean - recommended) / recommended * 100,
+            'recommendation_code': recommendation_code,
+        }
+        return columns, predictions
     
-    def _calculate_statistics(self, values: List[float]) -> Dict[str, float]:
-        """Calculate consumption statistics"""
-        values_array = np.array(values)
+    def _fit_series(self, values: np.ndarray) -> Dict[str, Any]:
+        """
+        Fit linear and quadratic trends and compute statistics in closed form
+        
+        The series is indexed x = 0..n-1 and re-centred on t = x - (n-1)/2,
+        so the odd power sums of t vanish and the even ones have closed
+        forms. Both least-squares fits then reduce to a few shared
+        weighted sums of y, with no Vandermonde matrix or lstsq call.
+        
+        Args:
+            values: Consumption series (n >= 3)
+            
+        Returns:
+            Fit coefficients in centred coordinates and consumption statistics
+        """
+        n = values.shape[0]
+        center = (n - 1) / 2
+        t = np.arange(n, dtype=np.float64)
+        t -= center
+        
+        # Closed-form sums of t^2 and t^4 over the centred index
+        s2 = n * (n * n - 1) / 12
+        s4 = n * (n * n - 1) * (3 * n * n - 7) / 240
+        
+        sum_y = float(values.sum())
+        sum_ty = float(np.dot(t, values))
+        sum_t2y = float(np.einsum('i,i,i->', t, t, values))
+        
+        # Linear and quadratic fits share the same first-order coefficient
+        slope = sum_ty / s2
+        det = s4 * n - s2 * s2
+        quadratic = (n * sum_t2y - s2 * sum_y) / det
+        intercept = (s4 * sum_y - s2 * sum_t2y) / det
+        
+        # Reuse the index buffer for deviations from the mean
+        mean = sum_y / n
+        deviations = np.subtract(values, mean, out=t)
         
         return {
-            'mean': float(np.mean(values_array)),
-            'median': float(np.median(values_array)),
-            'std_dev': float(np.std(values_array)),
-            'min': float(np.min(values_array)),
-            'max': float(np.max(values_array)),
-            'total': float(np.sum(values_array)),
+            'n': n,
+            'center': center,
+            'slope': slope,
+            'quadratic': quadratic,
+            'intercept': intercept,
+            'statistics': {
+                'mean': mean,
+                'median': float(np.median(values)),
+                'std_dev': float(np.sqrt(np.dot(deviations, deviations) / n)),
+                'min': float(values.min()),
+                'max': float(values.max()),
+                'total': sum_y,
+            },
         }
     
+    def _calculate_trend(self, fit: Dict[str, Any]) -> str:
+        """Calculate consumption trend from the linear fit slope"""
+        if fit['n'] < 2:
+            return 'insufficient_data'
+        
+        slope = fit['slope']
+        limit = self.TREND_SLOPE + self.SLOPE_TOLERANCE
+        
+        if slope > limit:
+            return 'increasing'
+        elif slope < -limit:
+            return 'decreasing'
+        else:
+            return 'stable'
+    
+    def _predict_next_days(self, fit: Dict[str, Any], days: int = 7) -> np.ndarray:
+        """Predict consumption for next N days from the quadratic fit"""
+        # Future days in centred coordinates
+        t = np.arange(fit['n'], fit['n'] + days, dtype=np.float64) - fit['center']
+        
+        predictions = (fit['quadratic'] * t + fit['slope']) * t + fit['intercept']
+        
+        # Ensure non-negative predictions
+        return np.maximum(predictions, 0, out=predictions)
+    
     def _generate_insights(self, values: List[float], trend: str, stats: Dict) -> List[str]:
         """Generate insights from consumption data"""
         insights = []
         
         # Trend insights
         if trend == 'increasing':
-            insights.append('Your oil consumption is increasing. Consider reducing portion sizes.')
+            insights.append(self.TREND_INSIGHTS[1])
         elif trend == 'decreasing':
-            insights.append('Great! Your oil consumption is decreasing. Keep up the good work!')
+            insights.append(self.TREND_INSIGHTS[2])
         else:
-            insights.append('Your oil consumption is stable. Aim to reduce it further.')
+            insights.append(self.TREND_INSIGHTS[0])
         
         # Variability insights
         if stats['std_dev'] > stats['mean'] * 0.5:
-            insights.append('Your consumption varies significantly. Try to maintain consistency.')
+            insights.append(self.VARIABILITY_INSIGHT)
         
         # Comparison insights
-        recommended_daily = 33.3  # ICMR recommendation
+        recommended_daily = self.RECOMMENDED_DAILY
         if stats['mean'] > recommended_daily:
             excess = ((stats['mean'] - recommended_daily) / recommended_daily) * 100
-            insights.append(f'Your average consumption is {excess:.1f}% above recommended levels.')
+            insights.append(self.EXCESS_INSIGHT.format(excess=excess))
         else:
-            insights.append('Your average consumption is within recommended levels!')
+            insights.append(self.WITHIN_LIMIT_INSIGHT)
         
         return insights
     
     def _get_recommendation(self, trend: str, stats: Dict) -> str:
         """Get personalized recommendation"""
-        recommended_daily = 33.3
+        recommended_daily = self.RECOMMENDED_DAILY
         
         if stats['mean'] > recommended_daily * 1.5:
-            return 'Urgent: Significantly reduce oil intake. Consult a nutritionist.'
+            return self.RECOMMENDATIONS[0]
         elif stats['mean'] > recommended_daily:
-            return 'Moderate: Gradually reduce oil intake to recommended levels.'
+            return self.RECOMMENDATIONS[1]
         elif trend == 'increasing':
-            return 'Caution: Your consumption is increasing. Maintain current levels.'
+            return self.RECOMMENDATIONS[2]
         else:
-            return 'Good: Continue your healthy consumption habits.'
-
+            return self.RECOMMENDATIONS[3]
@@ -0,0 +1,304 @@
+import bisect
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+MEDIAN_WINDOW = 365
+STATE_VERSION = 1
+
+
+class ConsumptionState:
+    """
+    Sufficient statistics of one user's consumption series
+
+    Holds the count and power sums needed by the closed-form trend fits, a
+    Welford running mean/variance, min/max and a bounded window of recent
+    readings for the median, so new readings are folded in without
+    resending or rescanning the history.
+    """
+
+    __slots__ = ('n', 'sum_y', 'sum_xy', 'sum_x2y', 'mean', 'm2', 'min', 'max',
+                 'window', '_sorted')
+
+    def __init__(self, window_size: int = MEDIAN_WINDOW):
+        self.n = 0
+        # Power sums over the raw index x = 0..n-1
+        self.sum_y = 0.0
+        self.sum_xy = 0.0
+        self.sum_x2y = 0.0
+        # Welford running mean and sum of squared deviations
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        # Most recent readings in arrival order, plus the same values sorted
+        self.window = deque(maxlen=window_size)
+        self._sorted = []
+
+    def update(self, values: Iterable[float]) -> 'ConsumptionState':
+        """Fold new readings, in arrival order, into the statistics"""
+        for y in values:
+            y = float(y)
+            x = self.n
+            self.n += 1
+
+            self.sum_y += y
+            self.sum_xy += x * y
+            self.sum_x2y += x * x * y
+
+            delta = y - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (y - self.mean)
+
+            if y < self.min:
+                self.min = y
+            if y > self.max:
+                self.max = y
+
+            if len(self.window) == self.window.maxlen:
+                evicted = self.window[0]
+                del self._sorted[bisect.bisect_left(self._sorted, evicted)]
+            self.window.append(y)
+            bisect.insort(self._sorted, y)
+
+        return self
+
+    def fit(self) -> Dict[str, Any]:
+        """
+        Closed-form linear/quadratic fits and statistics from the running sums
+
+        Returns the same structure as ConsumptionPredictor._fit_series. The
+        median is taken over the most recent window of readings, so it is
+        exact while the history fits in the window.
+        """
+        n = self.n
+        center = (n - 1) / 2
+
+        # Shift the raw power sums onto the centred index t = x - center
+        sum_y = self.sum_y
+        sum_ty = self.sum_xy - center * sum_y
+        sum_t2y = self.sum_x2y - 2 * center * self.sum_xy + center * center * sum_y
+
+        s2 = n * (n * n - 1) / 12
+        s4 = n * (n * n - 1) * (3 * n * n - 7) / 240
+
+        slope = sum_ty / s2
+        det = s4 * n - s2 * s2
+        quadratic = (n * sum_t2y - s2 * sum_y) / det
+        intercept = (s4 * sum_y - s2 * sum_t2y) / det
+
+        return {
+            'n': n,
+            'center': center,
+            'slope': slope,
+            'quadratic': quadratic,
+            'intercept': intercept,
+            'statistics': {
+                'mean': sum_y / n,
+                'median': self.median(),
+                'std_dev': (self.m2 / n) ** 0.5,
+                'min': self.min,
+                'max': self.max,
+                'total': sum_y,
+            },
+        }
+
+    def median(self) -> float:
+        """Median of the readings in the window"""
+        values = self._sorted
+        middle = len(values) // 2
+        if len(values) % 2:
+            return values[middle]
+        return (values[middle - 1] + values[middle]) / 2
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': STATE_VERSION,
+            'n': self.n,
+            'sum_y': self.sum_y,
+            'sum_xy': self.sum_xy,
+            'sum_x2y': self.sum_x2y,
+            'mean': self.mean,
+            'm2': self.m2,
+            'min': self.min if self.n else None,
+            'max': self.max if self.n else None,
+            'window_size': self.window.maxlen,
+            'window': list(self.window),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ConsumptionState':
+        if data.get('version') != STATE_VERSION:
+            raise ValueError(f"Unsupported consumption state version: {data.get('version')}")
+
+        state = cls(data['window_size'])
+        state.n = data['n']
+        state.sum_y = data['sum_y']
+        state.sum_xy = data['sum_xy']
+        state.sum_x2y = data['sum_x2y']
+        state.mean = data['mean']
+        state.m2 = data['m2']
+        if state.n:
+            state.min = data['min']
+            state.max = data['max']
+        state.window.extend(data['window'])
+        state._sorted = sorted(state.window)
+        return state
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, raw) -> 'ConsumptionState':
+        return cls.from_dict(json.loads(raw))
+
+
+class InMemoryStateStore:
+    """Per-process state store; each gunicorn worker keeps its own copy"""
+
+    def __init__(self, window_size: int = MEDIAN_WINDOW):
+        self.window_size = window_size
+        self._states: Dict[str, ConsumptionState] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[ConsumptionState]:
+        return self._states.get(user_id)
+
+    def update(self, user_id: str, apply: Callable[[ConsumptionState], Any]) -> ConsumptionState:
+        """Atomically load (or create) the user's state, apply a change and store it"""
+        with self._lock:
+            state = self._states.get(user_id)
+            if state is None:
+                state = self._states[user_id] = ConsumptionState(self.window_size)
+            apply(state)
+            return state
+
+    def delete(self, user_id: str) -> None:
+        with self._lock:
+            self._states.pop(user_id, None)
+
+
+class FileStateStore:
+    """One JSON file per user under a directory, guarded by an advisory lock"""
+
+    def __init__(self, directory: str, window_size: int = MEDIAN_WINDOW):
+        self.directory = directory
+        self.window_size = window_size
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, user_id: str) -> Optional[ConsumptionState]:
+        try:
+            with open(self._path(user_id)) as f:
+                return ConsumptionState.from_json(f.read())
+        except FileNotFoundError:
+            return None
+
+    def update(self, user_id: str, apply: Callable[[ConsumptionState], Any]) -> ConsumptionState:
+        """Atomically load (or create) the user's state, apply a change and store it"""
+        import fcntl
+
+        path = self._path(user_id)
+        with open(path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            state = self.get(user_id) or ConsumptionState(self.window_size)
+            apply(state)
+
+            # Write atomically so readers never see a partial file
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(state.to_json())
+            os.replace(tmp_path, path)
+            return state
+
+    def delete(self, user_id: str) -> None:
+        import fcntl
+
+        # The lock file stays: another process may hold or be waiting on a lock on it,
+        # and a new file at the same path would let two writers in at once
+        path = self._path(user_id)
+        with open(path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _path(self, user_id: str) -> str:
+        # User ids come from requests: hashing keeps them inside the directory, and
+        # unlike replacing unsafe characters it never maps two ids to one file
+        digest = hashlib.sha256(str(user_id).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{digest}.json')
+
+
+class RedisStateStore:
+    """
+    State shared across workers and pods in Redis
+
+    Accepts any client with the redis-py get/set/delete/pipeline API.
+    Updates use WATCH/MULTI so concurrent appends for one user never
+    lose readings.
+    """
+
+    def __init__(self, client, window_size: int = MEDIAN_WINDOW, prefix: str = 'oilwise:consumption:'):
+        self.client = client
+        self.window_size = window_size
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> 'RedisStateStore':
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, user_id: str) -> Optional[ConsumptionState]:
+        raw = self.client.get(self.prefix + str(user_id))
+        return ConsumptionState.from_json(raw) if raw is not None else None
+
+    def update(self, user_id: str, apply: Callable[[ConsumptionState], Any]) -> ConsumptionState:
+        """Atomically load (or create) the user's state, apply a change and store it"""
+        from redis.exceptions import WatchError
+
+        key = self.prefix + str(user_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    state = ConsumptionState.from_json(raw) if raw is not None else ConsumptionState(self.window_size)
+                    apply(state)
+                    pipe.multi()
+                    pipe.set(key, state.to_json())
+                    pipe.execute()
+                    return state
+                except WatchError:
+                    continue
+
+    def delete(self, user_id: str) -> None:
+        self.client.delete(self.prefix + str(user_id))
+
+
+def create_state_store(backend: Optional[str] = None):
+    """
+    Build the state store selected by CONSUMPTION_STATE_BACKEND
+
+    memory keeps state per worker, file shares it between the workers of one
+    host (CONSUMPTION_STATE_PATH) and redis shares it across pods (REDIS_URL).
+    """
+    backend = (backend or os.getenv('CONSUMPTION_STATE_BACKEND', 'memory')).lower()
+    window_size = int(os.getenv('CONSUMPTION_MEDIAN_WINDOW', MEDIAN_WINDOW))
+
+    if backend == 'memory':
+        return InMemoryStateStore(window_size)
+    if backend == 'file':
+        directory = os.getenv('CONSUMPTION_STATE_PATH', 'data/consumption-state')
+        return FileStateStore(directory, window_size)
+    if backend == 'redis':
+        return RedisStateStore.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'), window_size=window_size)
+
+    raise ValueError(f"Unknown consumption state backend: {backend}")
@@ -0,0 +1,319 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_MAGIC = b'OWFCST01'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# predict_batch columns stored per user: these floats then the forecast in one row of 'floats',
+# the codes in one row of 'codes'
+FLOAT_COLUMNS = ('mean', 'median', 'std_dev', 'min', 'max', 'total', 'next_30_days_average', 'excess_percent')
+CODE_COLUMNS = ('trend_code', 'recommendation_code', 'high_variability')
+
+
+def history_fingerprint(values: np.ndarray) -> int:
+    """64-bit digest of a history's float64 oil quantities, in order"""
+    data = np.ascontiguousarray(values, dtype=np.float64).tobytes()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def _id_hash(user_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(str(user_id).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class ForecastTable:
+    """Read-only table of nightly consumption forecasts, backed by a memory-mapped file
+
+    Layout, as for the recipe catalogue: magic, a uint32 header length and
+    a JSON header, followed by 64-byte aligned sections. Each user row
+    holds the fingerprint of the history it was computed from, the
+    predict_batch statistics, forecast, trend, variability and
+    recommendation codes, and the user id in a string table; sorted
+    user-id hashes map an id to its row with a binary search. Workers map
+    the file read-only, so every process on a node shares one copy.
+    """
+
+    def __init__(self, buffer: np.ndarray, path: Optional[str] = None):
+        header, data_start = self._read_header(buffer)
+        self.header = header
+        self.path = path
+        self._buffer = buffer
+
+        data = np.asarray(buffer)
+        self.sections = {}
+        for name, spec in header['sections'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape'])) if spec['shape'] else 1
+            start = data_start + spec['offset']
+            self.sections[name] = data[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+
+        self._id_hashes = self.sections['id_hashes']
+        self._id_rows = self.sections['id_rows']
+        self._fingerprints = self.sections['fingerprints']
+        self._floats = self.sections['floats']
+        self._codes = self.sections['codes']
+        self._string_offsets = self.sections['string_offsets']
+        self._strings = self.sections['strings']
+        self.model_version = header['model_version']
+        self.version = header['version']
+
+    @classmethod
+    def open(cls, path: str) -> 'ForecastTable':
+        """Memory-map a forecast table file read-only"""
+        table = cls(np.memmap(path, dtype=np.uint8, mode='r'), path)
+        logger.info(f"Loaded forecast table {path} ({len(table)} users, version {table.version})")
+        return table
+
+    @classmethod
+    def build(cls, batch: Dict[str, Any], fingerprints: np.ndarray, model_version: int,
+              output_path: str) -> Dict[str, Any]:
+        """Write the valid rows of a predict_batch result to a table file"""
+        blob = cls.compile(batch, fingerprints, model_version)
+        tmp_path = f'{output_path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(blob)
+        # Atomic replace so running workers never map a half-written file
+        os.replace(tmp_path, output_path)
+        return cls._read_header(np.frombuffer(blob, dtype=np.uint8))[0]
+
+    @staticmethod
+    def compile(batch: Dict[str, Any], fingerprints: np.ndarray, model_version: int) -> bytes:
+        """Compile the valid rows of a predict_batch result into the binary table format"""
+        valid = np.asarray(batch['valid'], dtype=bool)
+        user_ids = [str(user_id) for user_id, ok in zip(batch['user_ids'], valid.tolist()) if ok]
+
+        encoded = [user_id.encode('utf-8') for user_id in user_ids]
+        string_offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum([len(s) for s in encoded], out=string_offsets[1:])
+        id_hashes = np.array([_id_hash(user_id) for user_id in user_ids], dtype=np.uint64)
+        order = np.argsort(id_hashes, kind='stable')
+
+        floats = np.column_stack([np.asarray(batch[name], dtype=np.float64) for name in FLOAT_COLUMNS]
+                                 + [np.asarray(batch['predictions'], dtype=np.float64).reshape(len(valid), -1)])
+        codes = np.column_stack([np.asarray(batch[name]).astype(np.int8) for name in CODE_COLUMNS])
+        arrays = {
+            'id_hashes': id_hashes[order],
+            'id_rows': order.astype(np.uint32),
+            'fingerprints': np.asarray(fingerprints, dtype=np.uint64)[valid],
+            'floats': floats[valid],
+            'codes': codes[valid],
+            'string_offsets': string_offsets,
+            'strings': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        }
+
+        sections = {}
+        body = io.BytesIO()
+        digest = hashlib.sha256(str(model_version).encode('utf-8'))
+        for name, array in arrays.items():
+            body.write(b'\0' * (-body.tell() % ALIGNMENT))
+            sections[name] = {'offset': body.tell(), 'dtype': array.dtype.str, 'shape': list(array.shape)}
+            data = np.ascontiguousarray(array).tobytes()
+            digest.update(data)
+            body.write(data)
+
+        header = {
+            'format_version': FORMAT_VERSION,
+            'model_version': model_version,
+            'n_users': len(user_ids),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'version': digest.hexdigest()[:16],
+            'sections': sections,
+        }
+        header_bytes = json.dumps(header).encode('utf-8')
+        prefix = FORMAT_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes
+        prefix += b'\0' * (ForecastTable._data_start(len(header_bytes)) - len(prefix))
+
+        return prefix + body.getvalue()
+
+    def __len__(self) -> int:
+        return self._fingerprints.shape[0]
+
+    def row(self, user_id: str) -> Optional[int]:
+        """The user's row, or None if the table has no forecast for them"""
+        user_id = str(user_id)
+        key = _id_hash(user_id)
+        hashes = self._id_hashes
+        i = int(hashes.searchsorted(np.uint64(key)))
+        while i < len(hashes) and int(hashes[i]) == key:
+            row = int(self._id_rows[i])
+            if self.user_id(row) == user_id:
+                return row
+            i += 1
+        return None
+
+    def lookup(self, user_id: str, fingerprint: int) -> Optional[Dict[str, Any]]:
+        """The user's stored columns, if the row was computed from the history with this fingerprint"""
+        row = self.row(user_id)
+        if row is None or int(self._fingerprints[row]) != fingerprint:
+            return None
+        floats = self._floats[row].tolist()
+        n_floats = len(FLOAT_COLUMNS)
+        columns = dict(zip(FLOAT_COLUMNS, floats[:n_floats]))
+        columns['predictions'] = floats[n_floats:]
+        trend_code, recommendation_code, high_variability = self._codes[row].tolist()
+        columns.update(trend_code=trend_code, recommendation_code=recommendation_code,
+                       high_variability=bool(high_variability))
+        return columns
+
+    def user_id(self, row: int) -> str:
+        start, stop = int(self._string_offsets[row]), int(self._string_offsets[row + 1])
+        return self._strings[start:stop].tobytes().decode('utf-8')
+
+    @staticmethod
+    def _data_start(header_len: int) -> int:
+        prefix_len = len(FORMAT_MAGIC) + 4 + header_len
+        return prefix_len + (-prefix_len % ALIGNMENT)
+
+    @staticmethod
+    def _read_header(buffer: np.ndarray) -> Tuple[Dict[str, Any], int]:
+        prefix_len = len(FORMAT_MAGIC) + 4
+        if buffer[:len(FORMAT_MAGIC)].tobytes() != FORMAT_MAGIC:
+            raise ValueError('Not a forecast table file')
+
+        (header_len,) = struct.unpack('<I', buffer[len(FORMAT_MAGIC):prefix_len].tobytes())
+        header = json.loads(buffer[prefix_len:prefix_len + header_len].tobytes().decode('utf-8'))
+        if header.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported forecast table format version: {header.get('format_version')}")
+
+        return header, ForecastTable._data_start(header_len)
+
+
+class ForecastTableSource:
+    """
+    The current forecast table at a path, reopened when the nightly job replaces it
+
+    The file is checked at most every check_seconds; a table written for
+    another model version, or one that fails to open, is not served.
+    """
+
+    def __init__(self, path: str, model_version: int, check_seconds: float = 60):
+        self.path = path
+        self.model_version = model_version
+        self.check_seconds = check_seconds
+        self._table: Optional[ForecastTable] = None
+        self._identity = None
+        self._checked = float('-inf')
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, model_version: int) -> Optional['ForecastTableSource']:
+        """The source configured by FORECAST_TABLE_PATH, or None when it is not set"""
+        path = os.getenv('FORECAST_TABLE_PATH')
+        if not path:
+            return None
+        return cls(path, model_version, float(os.getenv('FORECAST_TABLE_CHECK_SECONDS', 60)))
+
+    def current(self) -> Optional[ForecastTable]:
+        if time.monotonic() - self._checked >= self.check_seconds:
+            with self._lock:
+                if time.monotonic() - self._checked >= self.check_seconds:
+                    self._reload()
+                    self._checked = time.monotonic()
+        return self._table
+
+    def _reload(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._table, self._identity = None, None
+            return
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity == self._identity:
+            return
+
+        self._identity = identity
+        try:
+            table = ForecastTable.open(self.path)
+        except Exception as e:
+            logger.error(f"Error loading forecast table {self.path}: {str(e)}")
+            self._table = None
+            return
+        if table.model_version != self.model_version:
+            logger.warning(f"Forecast table {self.path} is for model version {table.model_version}, "
+                           f"not {self.model_version}; predicting live")
+            table = None
+        self._table = table
+
+
+def load_histories(path: str) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    User ids, concatenated oil quantities and offsets from a history export
+
+    Accepts JSON lines of batch items ({"user_id", "data": [records]}) or
+    a CSV export of consumption rows with user_id (or userId) and
+    oil_quantity (or oilQuantityGrams) columns, in history order.
+    """
+    histories: Dict[str, List[float]] = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            for row in csv.DictReader(f):
+                user_id = str(row.get('user_id') or row.get('userId'))
+                quantity = row.get('oil_quantity', row.get('oilQuantityGrams'))
+                histories.setdefault(user_id, []).append(float(quantity or 0))
+        else:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    histories.setdefault(str(item['user_id']), []).extend(
+                        record.get('oil_quantity', 0) for record in item.get('data', []))
+
+    user_ids = list(histories)
+    offsets = np.zeros(len(user_ids) + 1, dtype=np.int64)
+    np.cumsum([len(histories[user_id]) for user_id in user_ids], out=offsets[1:])
+    values = np.fromiter((v for user_id in user_ids for v in histories[user_id]), dtype=np.float64,
+                         count=int(offsets[-1]))
+    return user_ids, values, offsets
+
+
+def materialize(user_ids: List[str], values: np.ndarray, offsets: np.ndarray, output_path: str,
+                predictor=None) -> Dict[str, Any]:
+    """Run the consumption model for every user in bulk and write the forecast table"""
+    from services.consumption_predictor import ConsumptionPredictor
+
+    predictor = predictor or ConsumptionPredictor()
+    batch = predictor.predict_batch(user_ids, values, offsets)
+    fingerprints = np.array([history_fingerprint(values[start:stop])
+                             for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist())], dtype=np.uint64)
+    return ForecastTable.build(batch, fingerprints, predictor.MODEL_VERSION, output_path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Nightly job: python -m services.forecast_table build histories.jsonl -o forecasts.fct"""
+    parser = argparse.ArgumentParser(description='Materialize the OilWise consumption forecast table')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Forecast every user in a history export')
+    build_parser.add_argument('input', help='Path to the history export (.jsonl or .csv)')
+    build_parser.add_argument('-o', '--output', required=True, help='Path of the table file to write')
+
+    info_parser = subparsers.add_parser('info', help='Print the header of a forecast table')
+    info_parser.add_argument('path', help='Path to a forecast table file')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        header = materialize(*load_histories(args.input), args.output)
+    else:
+        header = ForecastTable.open(args.path).header
+
+    json.dump({k: v for k, v in header.items() if k != 'sections'}, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,93 @@
 import numpy as np
-from typing import Dict, Any, List
+from enum import IntFlag
+from typing import Dict, Any, List, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+_NUMERIC_TYPES = {int, float, bool}
+
+class RiskFactor(IntFlag):
+    """Risk categories an assessment can flag, combined as a bitmask"""
+    NONE = 0
+    OIL = 1
+    WEIGHT = 2
+    BLOOD_PRESSURE = 4
+    CHOLESTEROL = 8
+
+RISK_LEVELS = ('low', 'moderate', 'high', 'critical')
+
+def _recommendations_for(factors: RiskFactor, level: str) -> Tuple[str, ...]:
+    """Health recommendations for a set of risk categories and a risk level"""
+    recommendations = []
+    
+    if factors & RiskFactor.OIL:
+        recommendations.append('Reduce daily oil intake gradually')
+        recommendations.append('Use low-oil cooking methods: steaming, grilling, baking')
+        recommendations.append('Try air-frying instead of deep-frying')
+    
+    if factors & RiskFactor.WEIGHT:
+        recommendations.append('Increase physical activity to 150 minutes per week')
+        recommendations.append('Consult a nutritionist for personalized diet plan')
+    
+    if factors & RiskFactor.BLOOD_PRESSURE:
+        recommendations.append('Reduce salt intake')
+        recommendations.append('Increase potassium-rich foods')
+        recommendations.append('Consult a healthcare provider')
+    
+    if factors & RiskFactor.CHOLESTEROL:
+        recommendations.append('Increase fiber intake')
+        recommendations.append('Reduce saturated fat consumption')
+    
+    if level == 'critical':
+        recommendations.insert(0, 'Seek immediate medical consultation')
+    
+    return tuple(recommendations)
+
+# Only 16 category combinations x 4 levels can occur, so build them all once
+RECOMMENDATION_TABLE = {
+    (mask, level): _recommendations_for(RiskFactor(mask), level)
+    for mask in range(16) for level in RISK_LEVELS
+}
+
 class HealthAnalyzer:
     """AI-powered health risk assessment engine"""
     
+    # Risk points and factor text per band; band 0 means no risk
+    BMI_RISK = (0, 15, 30)
+    BMI_FACTORS = (None, 'Overweight (BMI 25-29.9)', 'Obesity (BMI >= 30)')
+    OIL_RISK = (0, 15, 25, 35)
+    OIL_FACTORS = (
+        None,
+        'Above recommended oil intake',
+        'High oil consumption (50-100% above recommended)',
+        'Excessive oil consumption (>100% above recommended)',
+    )
+    BP_RISK = (0, 15, 25)
+    BP_FACTORS = (None, 'Elevated blood pressure (Stage 1)', 'High blood pressure (Stage 2)')
+    CHOLESTEROL_RISK = (0, 10, 20)
+    CHOLESTEROL_FACTORS = (
+        None,
+        'Borderline high cholesterol (200-239 mg/dL)',
+        'High cholesterol (>= 240 mg/dL)',
+    )
+    RISK_LEVELS = RISK_LEVELS
+    RISK_LEVEL_BOUNDS = (25, 50, 70)
+    
+    # Band tables per assessment, in assessment order: (points, factor text, category)
+    BANDS = (
+        (BMI_RISK, BMI_FACTORS, RiskFactor.WEIGHT),
+        (OIL_RISK, OIL_FACTORS, RiskFactor.OIL),
+        (BP_RISK, BP_FACTORS, RiskFactor.BLOOD_PRESSURE),
+        (CHOLESTEROL_RISK, CHOLESTEROL_FACTORS, RiskFactor.CHOLESTEROL),
+    )
+    
+    # Metric keys consumed by assess_risk, in assessment order
+    BATCH_COLUMNS = ('bmi', 'daily_oil_intake', 'blood_pressure_systolic', 'blood_pressure_diastolic', 'cholesterol')
+    
+    # Bump whenever thresholds, points or texts change, so cached assessments are not reused
+    RULES_VERSION = '1'
+    
     def __init__(self):
         self.risk_thresholds = {
             'bmi': {'normal': 25, 'overweight': 30, 'obese': 35},
@@ -26,51 +107,29 @@ class HealthAnalyzer:
             Risk assessment with score, level, and recommendations
         """
         try:
-            risk_score = 0
-            risk_factors = []
-            recommendations = []
-            
-            # Assess BMI
-            if 'bmi' in metrics:
-                bmi_risk, bmi_factors = self._assess_bmi(metrics['bmi'])
-                risk_score += bmi_risk
-                risk_factors.extend(bmi_factors)
-            
-            # Assess oil intake
-            if 'daily_oil_intake' in metrics:
-                oil_risk, oil_factors = self._assess_oil_intake(metrics['daily_oil_intake'])
-                risk_score += oil_risk
-                risk_factors.extend(oil_factors)
-            
-            # Assess blood pressure
-            if 'blood_pressure_systolic' in metrics:
-                bp_risk, bp_factors = self._assess_blood_pressure(
+            # Band per assessment; 0 when the metric is absent or in range
+            bands = (
+                self._assess_bmi(metrics['bmi']) if 'bmi' in metrics else 0,
+                self._assess_oil_intake(metrics['daily_oil_intake']) if 'daily_oil_intake' in metrics else 0,
+                self._assess_blood_pressure(
                     metrics['blood_pressure_systolic'],
                     metrics.get('blood_pressure_diastolic', 0)
-                )
-                risk_score += bp_risk
-                risk_factors.extend(bp_factors)
-            
-            # Assess cholesterol
-            if 'cholesterol' in metrics:
-                chol_risk, chol_factors = self._assess_cholesterol(metrics['cholesterol'])
-                risk_score += chol_risk
-                risk_factors.extend(chol_factors)
+                ) if 'blood_pressure_systolic' in metrics else 0,
+                self._assess_cholesterol(metrics['cholesterol']) if 'cholesterol' in metrics else 0,
+            )
+            risk_points, risk_factors, factor_mask = _BAND_TABLE[bands]
             
             # Normalize score to 0-100
-            risk_score = min(100, max(0, risk_score))
+            risk_score = min(100, max(0, risk_points))
             
             # Determine risk level
             risk_level = self._get_risk_level(risk_score)
             
-            # Generate recommendations
-            recommendations = self._generate_recommendations(risk_factors, risk_level)
-            
             return {
                 'risk_score': float(risk_score),
                 'risk_level': risk_level,
-                'risk_factors': risk_factors,
-                'recommendations': recommendations,
+                'risk_factors': list(risk_factors),
+                'recommendations': list(RECOMMENDATION_TABLE[(factor_mask, risk_level)]),
                 'metrics_analyzed': list(metrics.keys())
             }
             
@@ -78,67 +137,231 @@ class HealthAnalyzer:
             logger.error(f"Error in health risk assessment: {str(e)}")
             return {'error': str(e)}
     
-    def _assess_bmi(self, bmi: float) -> tuple:
-        """Assess BMI-related risk"""
-        risk = 0
-        factors = []
+    def cache_key(self, metrics: Dict[str, Any]) -> Any:
+        """
+        Canonical form of what assess_risk depends on: the assessed metric
+        values plus the metric names in request order (echoed back as
+        metrics_analyzed). None bypasses the cache.
+        """
+        if not isinstance(metrics, dict):
+            return None
+        return {
+            'keys': list(metrics.keys()),
+            'values': {column: metrics[column] for column in self.BATCH_COLUMNS if column in metrics},
+        }
+    
+    def assess_risk_batch(self, metrics_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Assess health risk for many metric sets at once
+        
+        Metrics are converted into NumPy columns and every threshold band is
+        computed for all rows together; strings are only materialized when
+        building the output. Results match assess_risk item by item.
+        
+        Args:
+            metrics_list: Health metrics, one dict per person
+            
+        Returns:
+            List of risk assessments, in input order
+        """
+        try:
+            columns, scalar_rows = self._metrics_to_columns(metrics_list)
+            assessed = self.assess_risk_columns(columns)
+            results = self._materialize_assessments(assessed, metrics_list)
+            
+            # Rows the columns cannot represent take the scalar path
+            for i in scalar_rows:
+                results[i] = self.assess_risk(metrics_list[i])
+            
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error in batch health risk assessment: {str(e)}")
+            return [self.assess_risk(metrics) for metrics in metrics_list]
+    
+    def assess_risk_table(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Assess a columnar batch, e.g. decoded from an Arrow or .npy payload
+
+        Missing columns and NaN values mean the metric is absent, as a
+        missing key does for assess_risk; diastolic only counts alongside
+        systolic. Other columns are ignored. Float64 columns are used as
+        given, without copying.
+
+        Args:
+            columns: Numeric arrays of equal length keyed by metric name
+
+        Returns:
+            risk_score (float64), risk_level (strings) and risk_factors,
+            the RiskFactor bitmask that with the level selects the
+            recommendations
+
+        Raises:
+            ValueError: a metric column is not 1-D, or not numeric or boolean
+        """
+        n_rows = len(next(iter(columns.values()))) if columns else 0
+        metric_columns = {}
+        for name in self.BATCH_COLUMNS:
+            if name in columns:
+                column = np.asarray(columns[name])
+                if column.ndim != 1 or column.dtype.kind not in 'biuf':
+                    raise ValueError(f"Column {name} must be 1-D numeric or boolean, got {column.dtype} "
+                                     f"with shape {column.shape}")
+                metric_columns[name] = column.astype(np.float64, copy=False)
+            else:
+                metric_columns[name] = np.full(n_rows, np.nan)
+
+        systolic_missing = np.isnan(metric_columns['blood_pressure_systolic'])
+        if systolic_missing.any():
+            metric_columns['blood_pressure_diastolic'] = np.where(
+                systolic_missing, np.nan, metric_columns['blood_pressure_diastolic']
+            )
+
+        assessed = self.assess_risk_columns(metric_columns)
+        factor_mask = np.zeros(n_rows, dtype=np.uint8)
+        for (_, _, category), code in zip(self.BANDS, ('bmi_code', 'oil_code', 'bp_code', 'cholesterol_code')):
+            factor_mask |= np.where(assessed[code] > 0, np.uint8(category), np.uint8(0))
+
+        return {
+            'risk_score': assessed['risk_score'],
+            'risk_level': np.array(self.RISK_LEVELS)[assessed['level_code']],
+            'risk_factors': factor_mask,
+        }
+
+    def assess_risk_columns(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Vectorized risk assessment over metric columns
+        
+        Args:
+            columns: Float arrays keyed by BATCH_COLUMNS; NaN marks a missing value
+            
+        Returns:
+            Integer band codes per assessment, risk scores and risk level codes
+        """
+        bmi = columns['bmi']
+        oil = columns['daily_oil_intake']
+        systolic = columns['blood_pressure_systolic']
+        diastolic = columns['blood_pressure_diastolic']
+        cholesterol = columns['cholesterol']
+        
+        # NaN compares False everywhere, so missing metrics fall into band 0
+        with np.errstate(invalid='ignore'):
+            bmi_code = np.select(
+                [bmi >= self.risk_thresholds['bmi']['obese'], bmi >= self.risk_thresholds['bmi']['overweight']],
+                [2, 1], 0
+            ).astype(np.int8)
+            
+            recommended = self.risk_thresholds['oil_intake']['recommended']
+            excess_percentage = ((oil - recommended) / recommended) * 100
+            oil_code = np.select(
+                [excess_percentage > 100, excess_percentage > 50, excess_percentage > 0], [3, 2, 1], 0
+            ).astype(np.int8)
+            
+            bp_code = np.select(
+                [(systolic >= 160) | (diastolic >= 100), (systolic >= 140) | (diastolic >= 90)], [2, 1], 0
+            ).astype(np.int8)
+            
+            cholesterol_code = np.select([cholesterol >= 240, cholesterol >= 200], [2, 1], 0).astype(np.int8)
+        
+        risk_score = (
+            np.take(self.BMI_RISK, bmi_code) + np.take(self.OIL_RISK, oil_code)
+            + np.take(self.BP_RISK, bp_code) + np.take(self.CHOLESTEROL_RISK, cholesterol_code)
+        )
+        risk_score = np.clip(risk_score, 0, 100).astype(np.float64)
+        level_code = np.digitize(risk_score, self.RISK_LEVEL_BOUNDS).astype(np.int8)
+        
+        return {
+            'bmi_code': bmi_code,
+            'oil_code': oil_code,
+            'bp_code': bp_code,
+            'cholesterol_code': cholesterol_code,
+            'risk_score': risk_score,
+            'level_code': level_code,
+        }
+    
+    def _metrics_to_columns(self, metrics_list: List[Dict[str, Any]]) -> tuple:
+        """Build NaN-filled float columns plus the indices of rows needing the scalar path"""
+        scalar_rows = {i for i, metrics in enumerate(metrics_list) if not isinstance(metrics, dict)}
+        rows = [{} if i in scalar_rows else metrics for i, metrics in enumerate(metrics_list)] if scalar_rows else metrics_list
+        
+        nan = float('nan')
+        columns = {}
+        for name in self.BATCH_COLUMNS:
+            if name == 'blood_pressure_diastolic':
+                # Diastolic only counts alongside systolic, defaulting to 0
+                values = [m.get(name, 0) if 'blood_pressure_systolic' in m else nan for m in rows]
+            else:
+                values = [m.get(name, nan) for m in rows]
+            
+            # Anything but a plain number (a string, an explicit None) is left
+            # to assess_risk so errors and edge cases behave identically
+            if not set(map(type, values)) <= _NUMERIC_TYPES:
+                for i, value in enumerate(values):
+                    if type(value) not in _NUMERIC_TYPES and not isinstance(value, np.number):
+                        values[i] = nan
+                        scalar_rows.add(i)
+            
+            columns[name] = np.array(values, dtype=np.float64)
+        
+        return columns, sorted(scalar_rows)
+    
+    def _materialize_assessments(self, assessed: Dict[str, np.ndarray], metrics_list: List[Any]) -> List[Dict[str, Any]]:
+        """Turn band codes into the assess_risk response dicts"""
+        combo_key = (
+            (assessed['bmi_code'].astype(np.int64) * 4 + assessed['oil_code']) * 3 + assessed['bp_code']
+        ) * 3 + assessed['cholesterol_code']
+        combo_key = combo_key * 4 + assessed['level_code']
         
+        results = []
+        for metrics, score, key in zip(metrics_list, assessed['risk_score'].tolist(), combo_key.tolist()):
+            risk_level, factors, recommendations = _COMBO_TABLE[key]
+            results.append({
+                'risk_score': score,
+                'risk_level': risk_level,
+                'risk_factors': list(factors),
+                'recommendations': list(recommendations),
+                'metrics_analyzed': list(metrics.keys()) if isinstance(metrics, dict) else [],
+            })
+        
+        return results
+    
+    def _assess_bmi(self, bmi: float) -> int:
+        """Assess BMI-related risk band"""
         if bmi >= self.risk_thresholds['bmi']['obese']:
-            risk = 30
-            factors.append('Obesity (BMI >= 30)')
+            return 2
         elif bmi >= self.risk_thresholds['bmi']['overweight']:
-            risk = 15
-            factors.append('Overweight (BMI 25-29.9)')
-        
-        return risk, factors
+            return 1
+        return 0
     
-    def _assess_oil_intake(self, daily_intake: float) -> tuple:
-        """Assess oil intake-related risk"""
-        risk = 0
-        factors = []
+    def _assess_oil_intake(self, daily_intake: float) -> int:
+        """Assess oil intake-related risk band"""
         recommended = self.risk_thresholds['oil_intake']['recommended']
         
         excess_percentage = ((daily_intake - recommended) / recommended) * 100
         
         if excess_percentage > 100:
-            risk = 35
-            factors.append(f'Excessive oil consumption (>100% above recommended)')
+            return 3
         elif excess_percentage > 50:
-            risk = 25
-            factors.append(f'High oil consumption (50-100% above recommended)')
+            return 2
         elif excess_percentage > 0:
-            risk = 15
-            factors.append(f'Above recommended oil intake')
-        
-        return risk, factors
+            return 1
+        return 0
     
-    def _assess_blood_pressure(self, systolic: float, diastolic: float) -> tuple:
-        """Assess blood pressure-related risk"""
-        risk = 0
-        factors = []
-        
+    def _assess_blood_pressure(self, systolic: float, diastolic: float) -> int:
+        """Assess blood pressure-related risk band"""
         if systolic >= 160 or diastolic >= 100:
-            risk = 25
-            factors.append('High blood pressure (Stage 2)')
+            return 2
         elif systolic >= 140 or diastolic >= 90:
-            risk = 15
-            factors.append('Elevated blood pressure (Stage 1)')
-        
-        return risk, factors
+            return 1
+        return 0
     
-    def _assess_cholesterol(self, cholesterol: float) -> tuple:
-        """Assess cholesterol-related risk"""
-        risk = 0
-        factors = []
-        
+    def _assess_cholesterol(self, cholesterol: float) -> int:
+        """Assess cholesterol-related risk band"""
         if cholesterol >= 240:
-            risk = 20
-            factors.append('High cholesterol (>= 240 mg/dL)')
+            return 2
         elif cholesterol >= 200:
-            risk = 10
-            factors.append('Borderline high cholesterol (200-239 mg/dL)')
-        
-        return risk, factors
+            return 1
+        return 0
     
     def _get_risk_level(self, score: float) -> str:
         """Determine risk level from score"""
@@ -150,31 +373,27 @@ class HealthAnalyzer:
             return 'moderate'
         else:
             return 'low'
-    
-    def _generate_recommendations(self, factors: List[str], level: str) -> List[str]:
-        """Generate health recommendations based on risk factors"""
-        recommendations = []
-        
-        if any('oil' in f.lower() for f in factors):
-            recommendations.append('Reduce daily oil intake gradually')
-            recommendations.append('Use low-oil cooking methods: steaming, grilling, baking')
-            recommendations.append('Try air-frying instead of deep-frying')
-        
-        if any('obesity' in f.lower() or 'overweight' in f.lower() for f in factors):
-            recommendations.append('Increase physical activity to 150 minutes per week')
-            recommendations.append('Consult a nutritionist for personalized diet plan')
-        
-        if any('blood pressure' in f.lower() for f in factors):
-            recommendations.append('Reduce salt intake')
-            recommendations.append('Increase potassium-rich foods')
-            recommendations.append('Consult a healthcare provider')
-        
-        if any('cholesterol' in f.lower() for f in factors):
-            recommendations.append('Increase fiber intake')
-            recommendations.append('Reduce saturated fat consumption')
-        
-        if level == 'critical':
-            recommendations.insert(0, 'Seek immediate medical consultation')
-        
-        return recommendations
 
+
+def _build_band_table() -> Dict[Tuple[int, int, int, int], Tuple[int, Tuple[str, ...], int]]:
+    """(bmi, oil, bp, cholesterol) bands -> (risk points, factor texts, category bitmask)"""
+    table = {}
+    for bands in np.ndindex(*(len(points) for points, _, _ in HealthAnalyzer.BANDS)):
+        points, factors, mask = 0, [], RiskFactor.NONE
+        for band, (band_points, band_factors, category) in zip(bands, HealthAnalyzer.BANDS):
+            if band:
+                points += band_points[band]
+                factors.append(band_factors[band])
+                mask |= category
+        table[tuple(int(b) for b in bands)] = (points, tuple(factors), int(mask))
+    return table
+
+_BAND_TABLE = _build_band_table()
+
+# Integer combination key used by the batch path:
+# (((bmi * 4 + oil) * 3 + bp) * 3 + cholesterol) * 4 + level -> (level, factors, recommendations)
+_COMBO_TABLE = [None] * (3 * 4 * 3 * 3 * 4)
+for (_bmi, _oil, _bp, _chol), (_points, _factors, _mask) in _BAND_TABLE.items():
+    for _level_code, _level in enumerate(RISK_LEVELS):
+        _key = ((((_bmi * 4 + _oil) * 3 + _bp) * 3 + _chol) * 4) + _level_code
+        _COMBO_TABLE[_key] = (_level, _factors, RECOMMENDATION_TABLE[(_mask, _level)])
@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import re
+import sys
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson writes exponents without the '+' and leading zeros of repr (1e16, 1e-7); a literal
+# first character keeps the scan fast, and 'e' followed by a digit in text only costs a fallback
+_EXPONENT = re.compile(rb'e[-0-9]')
+
+
+def numpy_default(obj: Any, fallback: Optional[Callable[[Any], Any]] = None) -> Any:
+    """json.dumps default: NumPy arrays and scalars as the builtins tolist() / item() give"""
+    # NumPy values can only exist once something imported it, so the encoder never imports it itself
+    np = sys.modules.get('numpy')
+    if np is not None:
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        if isinstance(obj, np.generic):
+            return obj.item()
+    if fallback is not None:
+        return fallback(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class ResponseEncoder:
+    """
+    Compact JSON encoding shared by every response path
+
+    Produces the same bytes as json.dumps(obj, separators=(',', ':'),
+    sort_keys=sort_keys), the encoding Flask's jsonify uses, and also
+    accepts NumPy arrays and scalars, so services can hand over float64 /
+    int / bool arrays without converting them element by element.
+
+    With orjson installed (JSON_ENCODER=auto or orjson) objects are
+    encoded by orjson, with float64, integer and bool arrays serialized
+    natively. float32 values are upcast first, since orjson would write
+    their shortest float32 repr (0.1 rather than 0.10000000149011612).
+    The few outputs where orjson's formatting differs from the standard
+    library are re-encoded with json.dumps, so the bytes never change:
+    non-ASCII text and exponent floats are found with byte scans, and
+    NaN / Infinity, which orjson writes as null, by checking the input
+    for non-finite floats when the output contains null.
+    """
+
+    def __init__(self, backend: Optional[str] = None, default: Optional[Callable[[Any], Any]] = None):
+        backend = (backend or os.getenv('JSON_ENCODER', 'auto')).lower()
+        if backend not in ('auto', 'orjson', 'stdlib'):
+            raise ValueError(f"Unknown JSON_ENCODER: {backend}")
+        if backend == 'orjson' and orjson is None:
+            raise ValueError("JSON_ENCODER=orjson but orjson is not installed")
+
+        self.backend = 'orjson' if backend != 'stdlib' and orjson is not None else 'stdlib'
+        self.default = default
+        self.stats = {'fast': 0, 'fallback': 0}
+        if self.backend == 'orjson':
+            # NumPy values, dates and dataclasses go to _orjson_default, which formats them like the standard path
+            self._options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def dumps(self, obj: Any, sort_keys: bool = True) -> bytes:
+        """Compact JSON bytes for obj"""
+        if self.backend == 'orjson':
+            options = (self._options | orjson.OPT_SORT_KEYS) if sort_keys else self._options
+            try:
+                encoded = orjson.dumps(obj, default=self._orjson_default, option=options)
+            except TypeError:
+                # e.g. non-str dict keys, integers beyond 64 bits or NumPy NaN, which json.dumps accepts
+                encoded = None
+            if encoded is not None and self._stdlib_identical(encoded, obj):
+                self.stats['fast'] += 1
+                return encoded
+            self.stats['fallback'] += 1
+
+        return json.dumps(obj, default=self._default, sort_keys=sort_keys, separators=(',', ':')).encode()
+
+    @staticmethod
+    def _stdlib_identical(encoded: bytes, obj: Any) -> bool:
+        # orjson does not escape non-ASCII or DEL, writes NaN / Infinity as null and formats exponents differently
+        return (encoded.isascii() and b'\x7f' not in encoded and not _EXPONENT.search(encoded)
+                and (b'null' not in encoded or not _may_hold_non_finite(obj)))
+
+    def _default(self, obj: Any) -> Any:
+        return numpy_default(obj, self.default)
+
+    def _orjson_default(self, obj: Any) -> Any:
+        np = sys.modules.get('numpy')
+        if np is not None:
+            if isinstance(obj, np.ndarray):
+                if obj.dtype.kind == 'f' and not np.isfinite(obj).all():
+                    raise ValueError("non-finite array values")
+                if (obj.dtype.name in _NATIVE_DTYPES and obj.dtype.isnative and obj.ndim
+                        and obj.flags.c_contiguous and _Fragment is not None):
+                    return _Fragment(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY))
+                # float32 and the rest as tolist() gives them, like the standard path
+                return obj.tolist()
+            if isinstance(obj, np.generic):
+                value = obj.item()
+                if type(value) is float and value - value != 0.0:
+                    raise ValueError("non-finite value")
+                return value
+        return self._default(obj)
+
+
+# Array dtypes orjson writes exactly as json.dumps writes their tolist()
+_NATIVE_DTYPES = frozenset(f'{kind}{bits}' for kind in ('int', 'uint') for bits in (8, 16, 32, 64)) | {'float64', 'bool'}
+_Fragment = getattr(orjson, 'Fragment', None)
+
+
+def _may_hold_non_finite(obj: Any) -> bool:
+    """
+    Whether obj may contain a NaN or infinite float, which orjson writes as null
+
+    NumPy values were already checked while encoding. Objects only default
+    can convert (dates, dataclasses, ...) count as possible.
+    """
+    kind = type(obj)
+    if kind is dict:
+        values = obj.values()
+    elif kind is list or kind is tuple:
+        values = obj
+    elif kind is float:
+        return obj - obj != 0.0
+    else:
+        return not (obj is None or kind is str or kind is int or kind is bool or _is_numpy(obj))
+
+    for value in values:
+        kind = type(value)
+        if value is None or kind is str or kind is int or kind is bool:
+            continue
+        if kind is float:
+            if value - value != 0.0:
+                return True
+        elif _may_hold_non_finite(value):
+            return True
+    return False
+
+
+def _is_numpy(obj: Any) -> bool:
+    np = sys.modules.get('numpy')
+    return np is not None and isinstance(obj, (np.ndarray, np.generic))
+
+
+def create_json_provider(app, encoder: Optional[ResponseEncoder] = None):
+    """
+    Flask JSON provider whose jsonify responses go through a ResponseEncoder
+
+    Debug-mode (indented) responses and app.json.dumps keep Flask's own
+    encoding, with NumPy support added.
+    """
+    from flask.json.provider import DefaultJSONProvider
+
+    class ResponseJSONProvider(DefaultJSONProvider):
+        def __init__(self, app):
+            super().__init__(app)
+            self.encoder = encoder or ResponseEncoder(default=DefaultJSONProvider.default)
+
+        def dumps(self, obj: Any, **kwargs: Any) -> str:
+            kwargs.setdefault('default', lambda o: numpy_default(o, self.default))
+            return super().dumps(obj, **kwargs)
+
+        def response(self, *args: Any, **kwargs: Any):
+            if (self.compact is None and self._app.debug) or self.compact is False:
+                return super().response(*args, **kwargs)
+            obj = self._prepare_response_obj(args, kwargs)
+            body = self.encoder.dumps(obj, sort_keys=self.sort_keys) + b'\n'
+            return self._app.response_class(body, mimetype=self.mimetype)
+
+    return ResponseJSONProvider(app)
+
+
+# Shared by the ASGI entry point and the batch streams / job store
+response_encoder = ResponseEncoder()
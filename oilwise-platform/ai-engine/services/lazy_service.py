@@ -0,0 +1,63 @@
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LazyService:
+    """
+    A service built on first use instead of at import
+
+    The spec names the class as 'module:Class' and the module is only
+    imported when the service is first needed, so the import cost of its
+    dependencies (NumPy, the recipe catalogue and index) is not paid by
+    processes that only answer /health. Attribute access is forwarded to
+    the built service; method() gives a callable that resolves the service
+    when called, for wiring batchers and processors without building it.
+    """
+
+    def __init__(self, spec: str, *args: Any, **kwargs: Any):
+        self.spec = spec
+        self.name = spec.rpartition(':')[2]
+        self._args = args
+        self._kwargs = kwargs
+        self._service = None
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._service is not None
+
+    def get(self) -> Any:
+        """The service, built by the first caller; concurrent callers wait for it"""
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    started = time.perf_counter()
+                    module_name, _, class_name = self.spec.partition(':')
+                    service_class = getattr(importlib.import_module(module_name), class_name)
+                    self._service = service_class(*self._args, **self._kwargs)
+                    self.load_seconds = time.perf_counter() - started
+                    logger.info(f"Loaded {self.name} in {self.load_seconds * 1000:.0f} ms")
+        return self._service
+
+    def method(self, name: str) -> Callable[..., Any]:
+        """A callable for service.<name> that builds the service on its first call"""
+        def call(*args: Any, **kwargs: Any) -> Any:
+            return getattr(self.get(), name)(*args, **kwargs)
+
+        call.__name__ = f'{self.name}.{name}'
+        return call
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for names not set in __init__, i.e. the service's own attributes
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        return f"LazyService({self.spec!r}, loaded={self.loaded})"
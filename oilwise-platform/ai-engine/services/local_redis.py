@@ -0,0 +1,272 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+try:
+    from redis.exceptions import WatchError
+except ImportError:
+    class WatchError(Exception):
+        """Stand-in for redis.exceptions.WatchError when redis-py is not installed"""
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the subset of the redis-py client the AI engine uses
+
+    Behaves like redis.Redis(decode_responses=True): values come back as
+    str. State lives in this process only, so it is meant for local runs,
+    tests and single-worker deployments; point REDIS_URL at a real server
+    to share state between gunicorn workers and pods.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+
+    # Strings
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._live(key)
+
+    def mget(self, keys, *args: str) -> List[Optional[str]]:
+        names = [keys] + list(args) if isinstance(keys, str) else list(keys) + list(args)
+        with self._lock:
+            return [self._live(key) for key in names]
+
+    def set(self, key: str, value: Any, ex: Optional[float] = None, nx: bool = False) -> Optional[bool]:
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            self._data[key] = str(value)
+            self._expire_at(key, ex)
+            return True
+
+    def incrby(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            value = int(self._live(key) or 0) + amount
+            self._data[key] = str(value)
+            return value
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self.incrby(key, amount)
+
+    # Keys
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._live(key) is not None:
+                    removed += 1
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+
+    def exists(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._live(key) is not None for key in keys)
+
+    def expire(self, key: str, seconds: float) -> bool:
+        with self._lock:
+            if self._live(key) is None:
+                return False
+            self._expire_at(key, seconds)
+            return True
+
+    def keys(self, pattern: str = '*') -> List[str]:
+        import fnmatch
+
+        with self._lock:
+            return [key for key in list(self._data) if self._live(key) is not None and fnmatch.fnmatchcase(key, pattern)]
+
+    # Hashes
+
+    def hset(self, key: str, field: Optional[str] = None, value: Any = None,
+             mapping: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock:
+            hash_ = self._container(key, dict)
+            items = dict(mapping or {})
+            if field is not None:
+                items[field] = value
+            added = sum(name not in hash_ for name in items)
+            hash_.update((name, str(item)) for name, item in items.items())
+            return added
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        with self._lock:
+            return (self._live(key) or {}).get(field)
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._live(key) or {})
+
+    def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        with self._lock:
+            hash_ = self._container(key, dict)
+            value = int(hash_.get(field, 0)) + amount
+            hash_[field] = str(value)
+            return value
+
+    def hdel(self, key: str, *fields: str) -> int:
+        with self._lock:
+            hash_ = self._live(key) or {}
+            return sum(hash_.pop(field, None) is not None for field in fields)
+
+    # Lists
+
+    def rpush(self, key: str, *values: Any) -> int:
+        with self._lock:
+            list_ = self._container(key, deque)
+            list_.extend(str(value) for value in values)
+            self._changed.notify_all()
+            return len(list_)
+
+    def lpush(self, key: str, *values: Any) -> int:
+        with self._lock:
+            list_ = self._container(key, deque)
+            list_.extendleft(str(value) for value in values)
+            self._changed.notify_all()
+            return len(list_)
+
+    def lpop(self, key: str) -> Optional[str]:
+        with self._lock:
+            list_ = self._live(key)
+            return list_.popleft() if list_ else None
+
+    def blpop(self, keys, timeout: float = 0):
+        """Block until one of the lists has an item; (key, value) or None on timeout"""
+        if isinstance(keys, str):
+            keys = [keys]
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            while True:
+                for key in keys:
+                    list_ = self._live(key)
+                    if list_:
+                        return key, list_.popleft()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._changed.wait(remaining)
+
+    def llen(self, key: str) -> int:
+        with self._lock:
+            return len(self._live(key) or ())
+
+    def lrange(self, key: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            values = list(self._live(key) or ())
+            # Redis ranges are inclusive and accept negative indices
+            end = len(values) if end == -1 else end + 1
+            return values[start:end]
+
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        with self._lock:
+            list_ = self._live(key)
+            if list_ is not None:
+                self._data[key] = deque(self.lrange(key, start, end))
+            return True
+
+    def flushall(self) -> bool:
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            return True
+
+    def ping(self) -> bool:
+        return True
+
+    def pipeline(self) -> 'LocalPipeline':
+        return LocalPipeline(self)
+
+    def _live(self, key: str):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key)
+
+    def _container(self, key: str, kind):
+        value = self._live(key)
+        if value is None:
+            value = self._data[key] = kind()
+        elif not isinstance(value, kind):
+            raise TypeError('WRONGTYPE Operation against a key holding the wrong kind of value')
+        return value
+
+    def _expire_at(self, key: str, seconds: Optional[float]) -> None:
+        if seconds:
+            self._expires[key] = time.monotonic() + seconds
+        else:
+            self._expires.pop(key, None)
+
+
+class LocalPipeline:
+    """
+    WATCH/MULTI/EXEC for LocalRedis
+
+    watch() takes the client lock until execute() or reset(), so other
+    threads cannot change the watched keys and WatchError never occurs.
+    Outside multi() commands run immediately, as on a watching redis-py
+    pipeline; after multi() they are queued and execute() returns their
+    results.
+    """
+
+    def __init__(self, client: LocalRedis):
+        self._client = client
+        self._locked = False
+        self._queued: Optional[List[tuple]] = None
+
+    def __enter__(self) -> 'LocalPipeline':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.reset()
+
+    def watch(self, *keys: str) -> None:
+        if not self._locked:
+            self._client._lock.acquire()
+            self._locked = True
+
+    def unwatch(self) -> None:
+        self.reset()
+
+    def multi(self) -> None:
+        self._queued = []
+
+    def execute(self) -> List[Any]:
+        queued, self._queued = self._queued or [], None
+        with self._client._lock:
+            results = [getattr(self._client, name)(*args, **kwargs) for name, args, kwargs in queued]
+        self.reset()
+        return results
+
+    def reset(self) -> None:
+        self._queued = None
+        if self._locked:
+            self._locked = False
+            self._client._lock.release()
+
+    def __getattr__(self, name: str):
+        command = getattr(self._client, name)
+        if self._queued is None:
+            return command
+
+        def queue(*args, **kwargs) -> 'LocalPipeline':
+            self._queued.append((name, args, kwargs))
+            return self
+        return queue
+
+
+def redis_client(url: Optional[str] = None):
+    """redis-py client for url (decoded str responses), or a LocalRedis when url is empty or 'local'"""
+    if not url or url == 'local':
+        return LocalRedis()
+
+    import redis
+
+    return redis.Redis.from_url(url, decode_responses=True)
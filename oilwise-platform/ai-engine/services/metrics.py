@@ -0,0 +1,399 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Log-linear buckets as in HdrHistogram: values below SUB_BUCKETS units are exact, above that
+# every power of two is split into SUB_BUCKETS equal buckets (about 6% worst-case relative error)
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+N_BUCKETS = SUB_BUCKETS * 36
+QUANTILES = (0.5, 0.9, 0.99)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def bucket_index(units: int) -> int:
+    """Bucket of a non-negative integer value"""
+    if units < SUB_BUCKETS:
+        return max(units, 0)
+    shift = units.bit_length() - SUB_BUCKET_BITS - 1
+    return min(SUB_BUCKETS * (shift + 1) + (units >> shift) - SUB_BUCKETS, N_BUCKETS - 1)
+
+
+def bucket_highest(index: int) -> int:
+    """Highest value counted in a bucket, in the same units"""
+    if index < SUB_BUCKETS:
+        return index
+    shift, offset = divmod(index - SUB_BUCKETS, SUB_BUCKETS)
+    return ((SUB_BUCKETS + offset + 1) << shift) - 1
+
+
+def quantiles(buckets: Dict[int, int], scale: float) -> Dict[float, float]:
+    """Highest value of the bucket holding each of QUANTILES, in the observed unit; NaN when empty"""
+    total = sum(buckets.values())
+    result = {}
+    if not total:
+        return {q: float('nan') for q in QUANTILES}
+    cumulative, targets = 0, list(QUANTILES)
+    for index in sorted(buckets):
+        cumulative += buckets[index]
+        while targets and cumulative >= targets[0] * total:
+            result[targets.pop(0)] = bucket_highest(index) / scale
+    return result
+
+
+class Histogram:
+    """
+    Latency (or size) distribution with constant-time, allocation-free observe()
+
+    Values are scaled to integer units (microseconds for seconds) and
+    counted in log-linear buckets. Quantiles cover a sliding window of the
+    last one to two window_seconds, so a slow spell shows up and ages out;
+    count and sum are cumulative, as Prometheus expects. Histograms from
+    several processes merge by adding their buckets.
+    """
+
+    def __init__(self, scale: float = 1e6, window_seconds: float = 60):
+        self.scale = scale
+        self.window_seconds = window_seconds
+        self.count = 0
+        self.sum = 0.0
+        self._current = [0] * N_BUCKETS
+        self._previous = [0] * N_BUCKETS
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        # bucket_index, inlined: this runs several times per request
+        units = int(value * self.scale)
+        if units < SUB_BUCKETS:
+            index = units if units > 0 else 0
+        else:
+            shift = units.bit_length() - SUB_BUCKET_BITS - 1
+            index = min(SUB_BUCKETS * shift + (units >> shift), N_BUCKETS - 1)
+        with self._lock:
+            now = time.monotonic()
+            if now - self._rotated_at >= self.window_seconds:
+                self._rotate(now)
+            self._current[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def window(self) -> Dict[int, int]:
+        """Non-empty buckets of the current and previous window"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._rotated_at >= self.window_seconds:
+                self._rotate(now)
+            return {i: a + b for i, (a, b) in enumerate(zip(self._current, self._previous)) if a or b}
+
+    def snapshot(self) -> Dict[str, Any]:
+        window = self.window()
+        return {'count': self.count, 'sum': self.sum, 'scale': self.scale, 'window': window}
+
+    def _rotate(self, now: float) -> None:
+        stale = now - self._rotated_at >= 2 * self.window_seconds
+        self._previous = [0] * N_BUCKETS if stale else self._current
+        self._current = [0] * N_BUCKETS
+        self._rotated_at = now
+
+
+class Counter:
+    """Monotonic count"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'value': self.value}
+
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. requests in flight"""
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+
+class _NullMetric:
+    """Stands in for every metric when METRICS_ENABLED=false"""
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+
+NULL_METRIC = _NullMetric()
+
+
+class Stopwatch:
+    """Times consecutive stages of one call: each lap() records the time since the previous one"""
+
+    __slots__ = ('_stages', '_last')
+
+    def __init__(self, stages: 'StageTimers'):
+        self._stages = stages
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self._stages.histogram(stage).observe(now - self._last)
+        self._last = now
+
+
+class StageTimers:
+    """Per-stage duration histograms of one service (ai_engine_stage_duration_seconds)"""
+
+    def __init__(self, registry: 'MetricsRegistry', service: str):
+        self.registry = registry
+        self.service = service
+        self._histograms: Dict[str, Any] = {}
+
+    def start(self) -> Stopwatch:
+        return Stopwatch(self)
+
+    def histogram(self, stage: str):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            histogram = self._histograms[stage] = self.registry.histogram(
+                'stage_duration_seconds', 'Time spent in each internal stage of a service call',
+                service=self.service, stage=stage,
+            )
+        return histogram
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics, rendered in the Prometheus text format
+
+    Histograms are exported as summaries (p50 / p90 / p99 over the recent
+    window, plus cumulative _sum and _count). With a directory set
+    (METRICS_DIR), every process writes a snapshot there each
+    flush_seconds and /metrics merges all of them, so a scrape that lands
+    on any gunicorn worker reports the whole pod. Counters of exited
+    workers are kept, so totals never go backwards; their windows and
+    gauges drop out once stale.
+    """
+
+    def __init__(self, prefix: str = 'ai_engine', directory: Optional[str] = None, window_seconds: float = 60,
+                 flush_seconds: float = 1.0, enabled: bool = True):
+        self.prefix = prefix
+        self.directory = directory
+        self.window_seconds = window_seconds
+        self.flush_seconds = flush_seconds
+        self.enabled = enabled
+        # name -> (type, help, {labels: metric})
+        self._families: Dict[str, Tuple[str, str, Dict[Labels, Any]]] = {}
+        self._lock = threading.Lock()
+        self._request_histograms: Dict[Tuple[str, str, int], Any] = {}
+        self._in_flight = None
+        self._flusher_started = False
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # A forked gunicorn worker starts its own flusher thread, which the fork did not copy
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    @classmethod
+    def from_env(cls) -> 'MetricsRegistry':
+        """Registry configured from METRICS_ENABLED, METRICS_WINDOW_SECONDS and METRICS_DIR"""
+        return cls(
+            directory=os.getenv('METRICS_DIR') or None,
+            window_seconds=float(os.getenv('METRICS_WINDOW_SECONDS', 60)),
+            enabled=os.getenv('METRICS_ENABLED', 'true').lower() == 'true',
+        )
+
+    def histogram(self, name: str, help_text: str, scale: float = 1e6, **labels: str):
+        return self._metric('summary', name, help_text, labels, lambda: Histogram(scale, self.window_seconds))
+
+    def counter(self, name: str, help_text: str, **labels: str):
+        return self._metric('counter', name, help_text, labels, Counter)
+
+    def gauge(self, name: str, help_text: str, **labels: str):
+        return self._metric('gauge', name, help_text, labels, Gauge)
+
+    def stages(self, service: str) -> StageTimers:
+        return StageTimers(self, service)
+
+    def observe_request(self, route: str, method: str, status: int, seconds: float) -> None:
+        """Record one served HTTP request (ai_engine_http_request_duration_seconds)"""
+        if not self.enabled:
+            return
+        key = (route, method, status)
+        histogram = self._request_histograms.get(key)
+        if histogram is None:
+            histogram = self._request_histograms[key] = self.histogram(
+                'http_request_duration_seconds', 'HTTP request latency by route, method and status',
+                route=route, method=method, status=str(status),
+            )
+        histogram.observe(seconds)
+
+    def in_flight(self):
+        """Gauge of HTTP requests being served; also starts the snapshot flusher in this process"""
+        if not self.enabled:
+            return NULL_METRIC
+        if self.directory and not self._flusher_started:
+            self._start_flusher()
+        if self._in_flight is None:
+            self._in_flight = self.gauge('http_requests_in_flight', 'HTTP requests currently being served')
+        return self._in_flight
+
+    def snapshot(self) -> Dict[str, Any]:
+        """This process's metrics as plain data, as written to METRICS_DIR"""
+        with self._lock:
+            families = [(name, kind, help_text, list(series.items()))
+                        for name, (kind, help_text, series) in self._families.items()]
+        return {
+            'pid': os.getpid(),
+            'time': time.time(),
+            'families': {
+                name: {'type': kind, 'help': help_text,
+                       'series': [[dict(labels), metric.snapshot()] for labels, metric in series]}
+                for name, kind, help_text, series in families
+            },
+        }
+
+    def render(self) -> str:
+        """All metrics of this process (and, with METRICS_DIR, its sibling workers) in Prometheus text format"""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            self._flush(snapshots[0])
+            snapshots.extend(self._read_siblings())
+        return _render(_merge(snapshots, self.window_seconds, 3 * self.flush_seconds))
+
+    def _metric(self, kind: str, name: str, help_text: str, labels: Dict[str, str], create: Callable[[], Any]):
+        if not self.enabled:
+            return NULL_METRIC
+        name = f'{self.prefix}_{name}'
+        key = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        metric = family[2].get(key) if family else None
+        if metric is None:
+            with self._lock:
+                family = self._families.setdefault(name, (kind, help_text, {}))
+                metric = family[2].get(key)
+                if metric is None:
+                    metric = family[2][key] = create()
+        return metric
+
+    def _start_flusher(self) -> None:
+        with self._lock:
+            if not self._flusher_started:
+                self._flusher_started = True
+                threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._flusher_started = False
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self._flush(self.snapshot())
+            except Exception as e:
+                logger.warning(f"Metrics snapshot write failed: {str(e)}")
+
+    def _flush(self, snapshot: Dict[str, Any]) -> None:
+        path = os.path.join(self.directory, f"metrics-{snapshot['pid']}.json")
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(temporary, path)
+
+    def _read_siblings(self) -> List[Dict[str, Any]]:
+        own = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # Being replaced or removed right now; the next scrape will read it
+                continue
+        return snapshots
+
+
+def _merge(snapshots: List[Dict[str, Any]], window_seconds: float, gauge_max_age: float) -> Dict[str, Any]:
+    """Add up every process's series; stale windows and gauges are left out"""
+    now = time.time()
+    merged: Dict[str, Any] = {}
+    for snapshot in snapshots:
+        age = now - snapshot['time']
+        for name, family in snapshot['families'].items():
+            target = merged.setdefault(name, {'type': family['type'], 'help': family['help'], 'series': {}})
+            for labels, data in family['series']:
+                key = tuple(sorted(labels.items()))
+                if family['type'] == 'gauge':
+                    if age <= gauge_max_age:
+                        series = target['series'].setdefault(key, {'value': 0.0})
+                        series['value'] += data['value']
+                elif family['type'] == 'counter':
+                    series = target['series'].setdefault(key, {'value': 0.0})
+                    series['value'] += data['value']
+                else:
+                    series = target['series'].setdefault(key, {'count': 0, 'sum': 0.0, 'scale': data['scale'],
+                                                               'window': {}})
+                    series['count'] += data['count']
+                    series['sum'] += data['sum']
+                    if age <= window_seconds:
+                        for index, count in data['window'].items():
+                            index = int(index)
+                            series['window'][index] = series['window'].get(index, 0) + count
+    return merged
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def _render(families: Dict[str, Any]) -> str:
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for labels in sorted(family['series']):
+            data = family['series'][labels]
+            if family['type'] != 'summary':
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(data['value'])}")
+                continue
+            for q, value in quantiles(data['window'], data['scale']).items():
+                lines.append(f"{name}{_format_labels(labels, (('quantile', str(q)),))} {_format_value(value)}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(data['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {data['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+# Shared by both entry points and the stage timers inside the services
+metrics = MetricsRegistry.from_env()
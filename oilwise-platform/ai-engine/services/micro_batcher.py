@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Dynamic batching of concurrent single-item calls
+
+    Callers on any thread (or event loop) submit one item and wait for its
+    result. A dispatcher thread collects items until max_batch are waiting
+    or max_wait_ms has passed since the first one, runs them through one
+    vectorized process_batch call and hands each caller its own result.
+
+    Batching only happens when requests actually overlap: under gunicorn
+    sync workers each process serves one request at a time, so enable this
+    with threaded workers or the ASGI entry point.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], max_batch: int = 64,
+                 max_wait_ms: float = 2.0, name: str = 'batch'):
+        self.process_batch = process_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        # Batch-size histogram buckets: 1, 2, 4, ... up to max_batch
+        self._bucket_bounds = []
+        bound = 1
+        while bound < self.max_batch:
+            self._bucket_bounds.append(bound)
+            bound *= 2
+        self._bucket_bounds.append(self.max_batch)
+        self._size_histogram = metrics.histogram('batch_items', 'Items per batch call', scale=1,
+                                                 source=f'micro_batch:{name}')
+        self.stats = {
+            'batches': 0,
+            'items': 0,
+            'max_batch_size': 0,
+            'errors': 0,
+            'batch_size_histogram': [0] * len(self._bucket_bounds),
+        }
+
+    def submit(self, item: Any, timeout: float = None) -> Any:
+        """Process one item as part of a batch and return its result"""
+        return self.submit_future(item).result(timeout)
+
+    async def submit_async(self, item: Any) -> Any:
+        """Awaitable submit for the ASGI entry point"""
+        return await asyncio.wrap_future(self.submit_future(item))
+
+    def submit_future(self, item: Any) -> Future:
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((item, future))
+        return future
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats['batch_size_histogram'] = {
+            f'le_{bound}': count for bound, count in zip(self._bucket_bounds, self.stats['batch_size_histogram'])
+        }
+        stats['mean_batch_size'] = stats['items'] / stats['batches'] if stats['batches'] else 0.0
+        stats['max_batch'] = self.max_batch
+        stats['max_wait_ms'] = self.max_wait * 1000
+        return stats
+
+    def shutdown(self) -> None:
+        with self._start_lock:
+            if self._thread is not None:
+                self._queue.put(_STOP)
+                self._thread.join()
+                self._thread = None
+
+    def _ensure_thread(self) -> None:
+        # Started on first use, so each gunicorn worker gets its own after the fork
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f'micro-batch-{self.name}', daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            batch = [first]
+            stopping = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+
+            self._dispatch(batch)
+            if stopping:
+                return
+
+    def _dispatch(self, batch: List[Any]) -> None:
+        items = [item for item, _ in batch]
+        try:
+            results = self.process_batch(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            logger.error(f"Error in {self.name} micro-batch: {str(e)}")
+            self.stats['errors'] += 1
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+        size = len(batch)
+        self.stats['batches'] += 1
+        self.stats['items'] += size
+        self.stats['max_batch_size'] = max(self.stats['max_batch_size'], size)
+        bucket = next(i for i, bound in enumerate(self._bucket_bounds) if size <= bound)
+        self.stats['batch_size_histogram'][bucket] += 1
+        self._size_histogram.observe(size)
@@ -1,13 +1,48 @@
-from typing import Dict, Any, List
+import bisect
+import numpy as np
+from typing import Dict, Any, List, Optional
 import logging
 
+from services.profile_store import SEGMENT_FIELDS, UserProfile, create_profile_store
+
 logger = logging.getLogger(__name__)
 
+_NUMERIC_TYPES = {int, float, bool}
+
 class PersonalizationEngine:
     """AI-powered personalization engine"""
     
-    def __init__(self):
-        self.user_profiles = {}
+    # Category labels by band; a value's band is the number of bounds it is >= to
+    AGE_GROUP_BOUNDS = (18, 30, 50)
+    AGE_GROUPS = ('child', 'young_adult', 'middle_aged', 'senior')
+    BMI_BOUNDS = (18.5, 25, 30)
+    BMI_CATEGORIES = ('underweight', 'normal', 'overweight', 'obese')
+    
+    USER_TYPE_ACTIONS = {
+        'household': (
+            'Complete health assessment',
+            'Set daily oil consumption goal',
+            'Explore low-oil recipes',
+        ),
+        'school': (
+            'Register for MDM program',
+            'Set up nutrition tracking',
+            'Access educational modules',
+        ),
+        'restaurant': (
+            'Register low-oil menu items',
+            'Get blockchain certification',
+            'Join partner network',
+        ),
+    }
+    GOAL_ACTIONS = (
+        ('weight_loss', 'Join weight loss challenge'),
+        ('diabetes_management', 'Access diabetes-friendly recipes'),
+    )
+    
+    def __init__(self, profile_store=None):
+        # Compact profiles, bounded in memory or shared via PROFILE_STORE_BACKEND
+        self.profile_store = profile_store if profile_store is not None else create_profile_store()
     
     def create_profile(self, user_id: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -30,13 +65,111 @@ class PersonalizationEngine:
                 'recommended_actions': self._generate_recommended_actions(user_data),
             }
             
-            self.user_profiles[user_id] = profile
+            self.profile_store.put(UserProfile.from_dict(profile))
             return profile
             
         except Exception as e:
             logger.error(f"Error creating personalization profile: {str(e)}")
             return {'error': str(e)}
     
+    def create_profiles(self, user_ids: List[str], user_data_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Create many profiles at once, e.g. a whole school district
+        
+        Age groups and BMI categories are banded for the whole column with
+        np.digitize, action lists come from USER_TYPE_ACTIONS, and all
+        profiles are stored in one put_many. Rows that the vectorized path
+        cannot take (non-dict payloads, non-numeric ages or BMIs) go
+        through create_profile, so each result matches create_profile.
+        
+        Args:
+            user_ids: User identifiers
+            user_data_list: User information, one dict per user
+            
+        Returns:
+            Profiles (or {'error': ...}) in input order
+        """
+        n = len(user_data_list)
+        ages = np.full(n, np.nan)
+        bmis = np.full(n, np.nan)
+        age_known = np.zeros(n, dtype=bool)
+        bmi_known = np.zeros(n, dtype=bool)
+        fallback = np.zeros(n, dtype=bool)
+        
+        for i, user_data in enumerate(user_data_list):
+            if not isinstance(user_data, dict) or not isinstance(user_data.get('health_data', {}), dict):
+                fallback[i] = True
+                continue
+            age = user_data.get('age')
+            bmi = user_data.get('health_data', {}).get('bmi')
+            if (age is not None and type(age) not in _NUMERIC_TYPES) or (bmi is not None and type(bmi) not in _NUMERIC_TYPES):
+                fallback[i] = True
+                continue
+            if age is not None:
+                ages[i], age_known[i] = age, True
+            if bmi is not None:
+                bmis[i], bmi_known[i] = bmi, True
+        
+        # Band index = number of bounds <= value, as in _get_age_group; unknown gets the extra last label
+        age_labels = self.AGE_GROUPS + ('unknown',)
+        bmi_labels = self.BMI_CATEGORIES + ('unknown',)
+        age_codes = np.where(age_known, np.digitize(ages, self.AGE_GROUP_BOUNDS), len(self.AGE_GROUPS)).tolist()
+        bmi_codes = np.where(bmi_known, np.digitize(bmis, self.BMI_BOUNDS), len(self.BMI_CATEGORIES)).tolist()
+        
+        profiles, stored = [], []
+        for i, (user_id, user_data) in enumerate(zip(user_ids, user_data_list)):
+            if fallback[i]:
+                profiles.append(self.create_profile(user_id, user_data))
+                continue
+            try:
+                health_data = user_data.get('health_data', {})
+                profile = {
+                    'user_id': user_id,
+                    'demographics': self._extract_demographics(user_data),
+                    'preferences': self._extract_preferences(user_data),
+                    'health_profile': {
+                        'age_group': age_labels[age_codes[i]],
+                        'bmi_category': bmi_labels[bmi_codes[i]],
+                        'health_conditions': health_data.get('health_conditions', []),
+                        'medications': health_data.get('medications', []),
+                        'allergies': health_data.get('allergies', []),
+                    },
+                    'personalization_settings': self._create_personalization_settings(user_data),
+                    'recommended_actions': self._generate_recommended_actions(user_data),
+                }
+                stored.append(UserProfile.from_dict(profile))
+            except Exception as e:
+                logger.error(f"Error creating personalization profile: {str(e)}")
+                profile = {'error': str(e)}
+            profiles.append(profile)
+        
+        self.profile_store.put_many(stored)
+        return profiles
+    
+    def segment_counts(self, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Profile counts by (state, district, age_group, bmi_category)
+        
+        Served from the counts the profile store maintains, so the cost
+        depends on the number of segments, not of profiles.
+        
+        Args:
+            filters: Optional exact values for any of the segment fields
+            
+        Returns:
+            One dict per non-empty segment, largest first
+        """
+        filters = filters or {}
+        segments = []
+        for segment, count in self.profile_store.segment_counts().items():
+            row = dict(zip(SEGMENT_FIELDS, segment))
+            if all(row.get(field) == value for field, value in filters.items()):
+                row['count'] = count
+                segments.append(row)
+        
+        segments.sort(key=lambda row: (-row['count'], [str(row[field]) for field in SEGMENT_FIELDS]))
+        return segments
+    
     def _extract_demographics(self, user_data: Dict) -> Dict[str, Any]:
         """Extract demographic information"""
         return {
@@ -83,82 +216,47 @@ class PersonalizationEngine:
     
     def _generate_recommended_actions(self, user_data: Dict) -> List[str]:
         """Generate recommended actions for the user"""
-        actions = []
-        
-        # Based on user type
+        # Based on user type, then on health goals
         user_type = user_data.get('user_type', 'household')
-        if user_type == 'household':
-            actions.extend([
-                'Complete health assessment',
-                'Set daily oil consumption goal',
-                'Explore low-oil recipes',
-            ])
-        elif user_type == 'school':
-            actions.extend([
-                'Register for MDM program',
-                'Set up nutrition tracking',
-                'Access educational modules',
-            ])
-        elif user_type == 'restaurant':
-            actions.extend([
-                'Register low-oil menu items',
-                'Get blockchain certification',
-                'Join partner network',
-            ])
-        
-        # Based on health goals
         health_goals = user_data.get('preferences', {}).get('healthGoals', [])
-        if 'weight_loss' in health_goals:
-            actions.append('Join weight loss challenge')
-        if 'diabetes_management' in health_goals:
-            actions.append('Access diabetes-friendly recipes')
-        
-        return actions
+        return list(self._actions_for(user_type, tuple(goal in health_goals for goal, _ in self.GOAL_ACTIONS)))
+    
+    def _actions_for(self, user_type: Any, goals: tuple) -> tuple:
+        """Action list for a user type and the GOAL_ACTIONS goals present"""
+        actions = self.USER_TYPE_ACTIONS.get(user_type, ()) if isinstance(user_type, str) else ()
+        return actions + tuple(action for (_, action), present in zip(self.GOAL_ACTIONS, goals) if present)
     
     def _get_age_group(self, age: int) -> str:
         """Get age group category"""
         if age is None:
             return 'unknown'
-        elif age < 18:
-            return 'child'
-        elif age < 30:
-            return 'young_adult'
-        elif age < 50:
-            return 'middle_aged'
-        else:
-            return 'senior'
+        return self.AGE_GROUPS[bisect.bisect_right(self.AGE_GROUP_BOUNDS, age)]
     
     def _get_bmi_category(self, bmi: float) -> str:
         """Get BMI category"""
         if bmi is None:
             return 'unknown'
-        elif bmi < 18.5:
-            return 'underweight'
-        elif bmi < 25:
-            return 'normal'
-        elif bmi < 30:
-            return 'overweight'
-        else:
-            return 'obese'
+        return self.BMI_CATEGORIES[bisect.bisect_right(self.BMI_BOUNDS, bmi)]
     
     def get_profile(self, user_id: str) -> Dict[str, Any]:
         """Retrieve user profile"""
-        return self.user_profiles.get(user_id, {'error': 'Profile not found'})
+        profile = self.profile_store.get(user_id)
+        if profile is None:
+            return {'error': 'Profile not found'}
+        return profile.to_dict()
     
     def update_profile(self, user_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
         """Update user profile"""
-        if user_id not in self.user_profiles:
-            return {'error': 'Profile not found'}
-        
-        profile = self.user_profiles[user_id]
-        
-        # Update preferences
-        if 'preferences' in updates:
-            profile['preferences'].update(updates['preferences'])
-        
-        # Update health profile
-        if 'health_data' in updates:
-            profile['health_profile'].update(updates['health_data'])
+        def apply(profile: UserProfile) -> None:
+            # Update preferences
+            if 'preferences' in updates:
+                profile.update_section('preferences', updates['preferences'])
+            
+            # Update health profile
+            if 'health_data' in updates:
+                profile.update_section('health_profile', updates['health_data'])
         
-        return profile
-
+        profile = self.profile_store.update(user_id, apply)
+        if profile is None:
+            return {'error': 'Profile not found'}
+        return profile.to_dict()
@@ -0,0 +1,458 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_VERSION = 1
+MAX_PROFILES = 100000
+
+# Response sections and the profile fields each holds, in response order
+SECTIONS = (
+    ('demographics', ('age', 'gender', 'state', 'district', 'user_type')),
+    ('preferences', ('language', 'cuisine_preferences', 'dietary_restrictions', 'health_goals',
+                     'notification_frequency')),
+    ('health_profile', ('age_group', 'bmi_category', 'health_conditions', 'medications', 'allergies')),
+    ('personalization_settings', ('content_difficulty', 'recipe_complexity', 'notification_type',
+                                  'data_sharing', 'community_participation')),
+)
+FIELDS = tuple(field for _, fields in SECTIONS for field in fields)
+SECTION_FIELDS = {section: frozenset(fields) for section, fields in SECTIONS}
+
+# Cohort dimensions the stores keep profile counts for
+SEGMENT_FIELDS = ('state', 'district', 'age_group', 'bmi_category')
+Segment = Tuple[Any, ...]
+
+
+def compact(value: Any) -> Any:
+    """
+    Shared representation of a categorical value
+
+    Strings are interned, so the many profiles saying 'household' or 'en'
+    point at one object, and lists become tuples of interned strings.
+    """
+    kind = type(value)
+    if kind is str:
+        return sys.intern(value)
+    if kind is list:
+        return tuple([sys.intern(item) if type(item) is str else compact(item) for item in value])
+    if isinstance(value, str):
+        return sys.intern(str(value))
+    if isinstance(value, list):
+        return tuple([compact(item) for item in value])
+    return value
+
+
+def expand(value: Any) -> Any:
+    """Inverse of compact for responses: tuples back to lists"""
+    if isinstance(value, tuple):
+        return [expand(item) for item in value]
+    return value
+
+
+def _segment_value(value: Any) -> Any:
+    # Counts are keyed on scalars; anything else a client sent is keyed on its JSON text
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return json.dumps(expand(value), sort_keys=True)
+
+
+class UserProfile:
+    """
+    One personalization profile, stored flat
+
+    Replaces the per-user dict of nested dicts: one slotted object holds
+    every field, categorical strings are interned and lists are tuples, so
+    a profile costs a fraction of the nested dicts. Keys that updates add
+    outside the known fields are kept per section in extra.
+    """
+
+    __slots__ = ('user_id',) + FIELDS + ('recommended_actions', 'extra')
+
+    def __init__(self, user_id: str, **fields):
+        self.user_id = user_id
+        for field in FIELDS:
+            setattr(self, field, compact(fields.get(field)))
+        self.recommended_actions = compact(fields.get('recommended_actions', []))
+        self.extra: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'UserProfile':
+        """Build from the response shape returned by PersonalizationEngine.create_profile"""
+        profile = cls.__new__(cls)
+        profile.user_id = data.get('user_id')
+        profile.extra = None
+        for section, fields in SECTIONS:
+            values = data.get(section, {})
+            for field in fields:
+                setattr(profile, field, compact(values.get(field)))
+            unknown = values.keys() - SECTION_FIELDS[section]
+            if unknown:
+                profile.update_section(section, {key: value for key, value in values.items() if key in unknown})
+        profile.recommended_actions = compact(data.get('recommended_actions', []))
+        return profile
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Response shape: the nested sections with lists, as create_profile returns"""
+        data = {'user_id': self.user_id}
+        for section, fields in SECTIONS:
+            data[section] = {field: expand(getattr(self, field)) for field in fields}
+            if self.extra and section in self.extra:
+                data[section].update(self.extra[section])
+        data['recommended_actions'] = expand(self.recommended_actions)
+        return data
+
+    def segment(self) -> Segment:
+        """(state, district, age_group, bmi_category) cohort this profile counts towards"""
+        return tuple(_segment_value(getattr(self, field)) for field in SEGMENT_FIELDS)
+
+    def update_section(self, section: str, values: Dict[str, Any]) -> None:
+        """dict.update semantics on one section: known fields are set, other keys kept in extra"""
+        for key, value in values.items():
+            if key in SECTION_FIELDS[section]:
+                setattr(self, key, compact(value))
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra.setdefault(section, {})[key] = value
+
+    def to_json(self) -> str:
+        """Positional encoding: field names are not repeated per stored profile"""
+        row = [PROFILE_VERSION, self.user_id] + [expand(getattr(self, field)) for field in FIELDS]
+        row += [expand(self.recommended_actions), self.extra]
+        return json.dumps(row, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, raw) -> 'UserProfile':
+        row = json.loads(raw)
+        if row[0] != PROFILE_VERSION:
+            raise ValueError(f"Unsupported profile version: {row[0]}")
+        profile = cls(row[1], recommended_actions=row[-2], **dict(zip(FIELDS, row[2:-2])))
+        profile.extra = row[-1]
+        return profile
+
+
+class InMemoryProfileStore:
+    """
+    Per-process profile store bounded to max_size profiles
+
+    Least recently used profiles are evicted beyond max_size; each gunicorn
+    worker keeps its own copy, so use the sqlite or redis store when more
+    than one worker serves profile reads. Segment counts are maintained on
+    every write, so reading them never touches the profiles.
+    """
+
+    def __init__(self, max_size: int = MAX_PROFILES):
+        self.max_size = max_size
+        self.evictions = 0
+        self._profiles: 'OrderedDict[str, UserProfile]' = OrderedDict()
+        self._segments: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[UserProfile]:
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is not None:
+                self._profiles.move_to_end(user_id)
+            return profile
+
+    def put(self, profile: UserProfile) -> None:
+        self.put_many([profile])
+
+    def put_many(self, profiles: List[UserProfile]) -> None:
+        with self._lock:
+            for profile in profiles:
+                self._remove(profile.user_id)
+                self._profiles[profile.user_id] = profile
+                self._segments[profile.segment()] += 1
+            while len(self._profiles) > self.max_size:
+                self._remove(next(iter(self._profiles)))
+                self.evictions += 1
+
+    def update(self, user_id: str, apply: Callable[[UserProfile], Any]) -> Optional[UserProfile]:
+        """Atomically apply a change to an existing profile; None if there is none"""
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is None:
+                return None
+            self._uncount(profile.segment())
+            apply(profile)
+            self._segments[profile.segment()] += 1
+            self._profiles.move_to_end(user_id)
+            return profile
+
+    def delete(self, user_id: str) -> None:
+        with self._lock:
+            self._remove(user_id)
+
+    def segment_counts(self) -> Dict[Segment, int]:
+        with self._lock:
+            return dict(self._segments)
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def _remove(self, user_id: str) -> None:
+        profile = self._profiles.pop(user_id, None)
+        if profile is not None:
+            self._uncount(profile.segment())
+
+    def _uncount(self, segment: Segment) -> None:
+        self._segments[segment] -= 1
+        if not self._segments[segment]:
+            del self._segments[segment]
+
+
+class SQLiteProfileStore:
+    """
+    Profiles in a SQLite file shared by the workers of one host
+
+    Each thread opens its own connection (after a fork too), the database
+    runs in WAL mode so reads do not block the writer, and updates run in
+    an IMMEDIATE transaction so concurrent read-modify-writes from
+    different workers serialize instead of losing changes. The segment
+    fields are also stored as indexed columns, so segment counts are one
+    GROUP BY over the index.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._transaction() as connection:
+            # Segment columns are untyped so values keep the type they were sent with
+            connection.execute('CREATE TABLE IF NOT EXISTS profiles (user_id TEXT PRIMARY KEY, data TEXT NOT NULL, '
+                               f'{", ".join(SEGMENT_FIELDS)})')
+            self._add_segment_columns(connection)
+            connection.execute(f'CREATE INDEX IF NOT EXISTS profiles_segment ON profiles ({", ".join(SEGMENT_FIELDS)})')
+
+    def get(self, user_id: str) -> Optional[UserProfile]:
+        row = self._connection().execute('SELECT data FROM profiles WHERE user_id = ?', (str(user_id),)).fetchone()
+        return UserProfile.from_json(row[0]) if row is not None else None
+
+    def put(self, profile: UserProfile) -> None:
+        self.put_many([profile])
+
+    def put_many(self, profiles: List[UserProfile]) -> None:
+        """Store many profiles in one transaction"""
+        with self._transaction() as connection:
+            connection.executemany(
+                f'INSERT OR REPLACE INTO profiles (user_id, data, {", ".join(SEGMENT_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)',
+                [(str(profile.user_id), profile.to_json()) + profile.segment() for profile in profiles]
+            )
+
+    def update(self, user_id: str, apply: Callable[[UserProfile], Any]) -> Optional[UserProfile]:
+        """Atomically apply a change to an existing profile; None if there is none"""
+        with self._transaction() as connection:
+            row = connection.execute('SELECT data FROM profiles WHERE user_id = ?', (str(user_id),)).fetchone()
+            if row is None:
+                return None
+            profile = UserProfile.from_json(row[0])
+            apply(profile)
+            connection.execute(
+                f'UPDATE profiles SET data = ?, {", ".join(f"{field} = ?" for field in SEGMENT_FIELDS)} WHERE user_id = ?',
+                (profile.to_json(),) + profile.segment() + (str(user_id),)
+            )
+            return profile
+
+    def delete(self, user_id: str) -> None:
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM profiles WHERE user_id = ?', (str(user_id),))
+
+    def segment_counts(self) -> Dict[Segment, int]:
+        columns = ', '.join(SEGMENT_FIELDS)
+        rows = self._connection().execute(f'SELECT {columns}, COUNT(*) FROM profiles GROUP BY {columns}')
+        return {tuple(row[:-1]): row[-1] for row in rows}
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM profiles').fetchone()[0]
+
+    @staticmethod
+    def _add_segment_columns(connection: sqlite3.Connection) -> None:
+        """Upgrade databases created before the segment columns, filling them from the stored JSON"""
+        existing = {row[1] for row in connection.execute('PRAGMA table_info(profiles)')}
+        for field in SEGMENT_FIELDS:
+            if field not in existing:
+                connection.execute(f'ALTER TABLE profiles ADD COLUMN {field}')
+                # to_json rows are [version, user_id, *FIELDS, ...]
+                connection.execute(f"UPDATE profiles SET {field} = json_extract(data, '$[{FIELDS.index(field) + 2}]')")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE takes the write lock up front, so read-modify-writes never interleave
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not cross threads or forks
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            # Autocommit mode; transactions are explicit in _transaction
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+
+class RedisProfileStore:
+    """
+    Profiles shared across workers and pods in Redis
+
+    Accepts any client with the redis-py get/set/delete/pipeline API,
+    including services.local_redis.LocalRedis. Writes use WATCH/MULTI so
+    concurrent updates to one profile never lose changes, and adjust the
+    per-segment counts in the same transaction. ttl (seconds, optional)
+    expires profiles that are not written again; expired profiles stay in
+    the segment counts until they are recreated or deleted.
+    """
+
+    # Profiles per put_many transaction
+    BATCH_SIZE = 500
+
+    def __init__(self, client, prefix: str = 'oilwise:profile:', ttl: Optional[int] = None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.segments_key = prefix.rstrip(':') + 's:segments'
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> 'RedisProfileStore':
+        from services.local_redis import redis_client
+
+        return cls(redis_client(url), **kwargs)
+
+    def get(self, user_id: str) -> Optional[UserProfile]:
+        raw = self.client.get(self.prefix + str(user_id))
+        return UserProfile.from_json(raw) if raw is not None else None
+
+    def put(self, profile: UserProfile) -> None:
+        self._write(profile.user_id, lambda current: profile)
+
+    def put_many(self, profiles: List[UserProfile]) -> None:
+        """
+        Store many profiles, BATCH_SIZE at a time in one WATCH/MULTI/EXEC
+
+        Each batch watches its keys, reads them with one MGET and queues
+        every SET and segment count change in a single transaction. If
+        another writer changed some of the keys meanwhile, those profiles
+        are written one at a time with put() and the rest are retried.
+        """
+        # A later profile for the same user wins, as with successive puts
+        pending = {self.prefix + str(profile.user_id): profile for profile in profiles}
+        keys = list(pending)
+        for start in range(0, len(keys), self.BATCH_SIZE):
+            self._put_batch({key: pending[key] for key in keys[start:start + self.BATCH_SIZE]})
+
+    def update(self, user_id: str, apply: Callable[[UserProfile], Any]) -> Optional[UserProfile]:
+        """Atomically apply a change to an existing profile; None if there is none"""
+        def change(profile: Optional[UserProfile]) -> Optional[UserProfile]:
+            if profile is not None:
+                apply(profile)
+            return profile
+        return self._write(user_id, change)
+
+    def delete(self, user_id: str) -> None:
+        self._write(user_id, lambda current: None)
+
+    def segment_counts(self) -> Dict[Segment, int]:
+        counts = self.client.hgetall(self.segments_key)
+        return {tuple(json.loads(segment)): int(count) for segment, count in counts.items() if int(count) > 0}
+
+    def _put_batch(self, pending: Dict[str, UserProfile]) -> None:
+        from services.local_redis import WatchError
+
+        with self.client.pipeline() as pipe:
+            while pending:
+                keys = list(pending)
+                try:
+                    pipe.watch(*keys)
+                    current = pipe.mget(keys)
+                    counts = Counter()
+                    for raw in current:
+                        if raw is not None:
+                            counts[json.dumps(UserProfile.from_json(raw).segment())] -= 1
+                    for profile in pending.values():
+                        counts[json.dumps(profile.segment())] += 1
+
+                    pipe.multi()
+                    for key, profile in pending.items():
+                        pipe.set(key, profile.to_json(), ex=self.ttl)
+                    for segment, change in counts.items():
+                        if change:
+                            pipe.hincrby(self.segments_key, segment, change)
+                    pipe.execute()
+                    return
+                except WatchError:
+                    # Only the keys another writer changed fall back to per-key writes
+                    for key, before, after in zip(keys, current, self.client.mget(keys)):
+                        if before != after:
+                            self.put(pending.pop(key))
+
+    def _write(self, user_id: str, change: Callable[[Optional[UserProfile]], Optional[UserProfile]]):
+        """Replace a profile with change(current) (None deletes it), keeping the segment counts in step"""
+        from services.local_redis import WatchError
+
+        key = self.prefix + str(user_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    current = UserProfile.from_json(raw) if raw is not None else None
+                    # Taken before change() runs, which may modify the profile in place
+                    before = current.segment() if current is not None else None
+                    profile = change(current)
+                    if profile is None and current is None:
+                        pipe.unwatch()
+                        return None
+
+                    pipe.multi()
+                    if before is not None:
+                        pipe.hincrby(self.segments_key, json.dumps(before), -1)
+                    if profile is not None:
+                        pipe.set(key, profile.to_json(), ex=self.ttl)
+                        pipe.hincrby(self.segments_key, json.dumps(profile.segment()), 1)
+                    else:
+                        pipe.delete(key)
+                    pipe.execute()
+                    return profile
+                except WatchError:
+                    continue
+
+
+def create_profile_store(backend: Optional[str] = None):
+    """
+    Build the profile store selected by PROFILE_STORE_BACKEND
+
+    memory keeps up to PROFILE_STORE_MAX_SIZE profiles per worker, sqlite
+    shares them between the workers of one host (PROFILE_STORE_PATH) and
+    redis shares them across pods (REDIS_URL).
+    """
+    backend = (backend or os.getenv('PROFILE_STORE_BACKEND', 'memory')).lower()
+
+    if backend == 'memory':
+        return InMemoryProfileStore(int(os.getenv('PROFILE_STORE_MAX_SIZE', MAX_PROFILES)))
+    if backend == 'sqlite':
+        return SQLiteProfileStore(os.getenv('PROFILE_STORE_PATH', 'data/profiles.db'))
+    if backend == 'redis':
+        ttl = int(os.getenv('PROFILE_STORE_TTL_SECONDS', 0)) or None
+        return RedisProfileStore.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'), ttl=ttl)
+
+    raise ValueError(f"Unknown profile store backend: {backend}")
@@ -0,0 +1,361 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import struct
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Shared 50-dimensional feature space for users and recipes
+FEATURE_DIM = 50
+CUISINE_SLOTS = {'north_indian': 0, 'south_indian': 5, 'bengali': 10, 'gujarati': 15}
+RESTRICTION_SLOTS = {'vegetarian': 20, 'vegan': 21, 'gluten_free': 22}
+GOAL_SLOTS = {'weight_loss': 30, 'diabetes_management': 31, 'heart_health': 32}
+
+# Oil level tags, matching the backend Recipe.oilCategory enum
+OIL_LEVELS = ['low-oil', 'medium-oil', 'high-oil']
+# Grams of oil per serving used to tag recipes exported without oilCategory
+OIL_LEVEL_LIMITS = {'low-oil': 3, 'medium-oil': 7}
+MAX_DIETARY_TAGS = 64
+
+FORMAT_MAGIC = b'OWRCAT01'
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+
+# Built-in catalogue used when no compiled catalogue file is configured
+SAMPLE_RECIPES = [
+    {
+        'id': 'recipe_1',
+        'name': 'Low-Oil Dosa',
+        'cuisineType': 'South Indian',
+        'oil_content': 3,
+        'dietaryRestrictions': ['vegetarian', 'vegan'],
+        'healthBenefits': ['weight_loss'],
+    },
+    {
+        'id': 'recipe_2',
+        'name': 'Steamed Idli',
+        'cuisineType': 'South Indian',
+        'oil_content': 1,
+        'dietaryRestrictions': ['vegetarian', 'vegan', 'gluten_free'],
+        'healthBenefits': ['weight_loss', 'heart_health'],
+    },
+    {
+        'id': 'recipe_3',
+        'name': 'Grilled Tandoori Chicken',
+        'cuisineType': 'North Indian',
+        'oil_content': 2,
+        'dietaryRestrictions': ['gluten_free'],
+        'healthBenefits': ['diabetes_management'],
+    },
+]
+
+
+def normalize_tag(value: str) -> str:
+    """Normalize a backend label such as 'South Indian' to 'south_indian'"""
+    return '_'.join(str(value).strip().lower().replace('-', ' ').split())
+
+
+def encode_features(cuisine: str, restrictions: Iterable[str], goals: Iterable[str]) -> np.ndarray:
+    """Encode cuisine, dietary restrictions and health goals into the shared feature space"""
+    vector = np.zeros(FEATURE_DIM, dtype=np.float32)
+
+    if cuisine in CUISINE_SLOTS:
+        vector[CUISINE_SLOTS[cuisine]] = 1
+    for restriction in restrictions:
+        if restriction in RESTRICTION_SLOTS:
+            vector[RESTRICTION_SLOTS[restriction]] = 1
+    for goal in goals:
+        if goal in GOAL_SLOTS:
+            vector[GOAL_SLOTS[goal]] = 1
+
+    return vector
+
+
+class RecipeCatalogue:
+    """Read-only recipe catalogue backed by a compiled, memory-mapped file
+
+    Layout: magic, a uint32 header length and a JSON header, followed by
+    64-byte aligned sections holding the L2-normalized float32 features
+    matrix, the oil_content, cuisine_code, dietary bitmask and oil level
+    columns and a string table of recipe ids and names. Workers map the file read-only, so every process
+    on a node shares one copy through the page cache.
+    """
+
+    def __init__(self, buffer: np.ndarray, path: Optional[str] = None):
+        header, data_start = self._read_header(buffer)
+        self.header = header
+        self.path = path
+        self._buffer = buffer
+
+        # Plain ndarray views over the mapping, so results of arithmetic on
+        # the sections are ordinary arrays rather than memmap subclasses
+        data = np.asarray(buffer)
+        sections = {}
+        for name, spec in header['sections'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape'])) if spec['shape'] else 1
+            start = data_start + spec['offset']
+            view = data[start:start + count * dtype.itemsize].view(dtype)
+            sections[name] = view.reshape(spec['shape'])
+
+        self.features = sections['features']
+        self.oil_content = sections['oil_content']
+        self.cuisine_codes = sections['cuisine_codes']
+        self.dietary_masks = sections['dietary_masks']
+        self.oil_level_codes = sections['oil_level_codes']
+        self._string_offsets = sections['string_offsets']
+        self._strings = sections['strings']
+
+        self.cuisines = header['cuisines']
+        self.dietary_tags = header['dietary_tags']
+        self.version = header['version']
+
+    @classmethod
+    def open(cls, path: str) -> 'RecipeCatalogue':
+        """Memory-map a compiled catalogue file read-only"""
+        catalogue = cls(np.memmap(path, dtype=np.uint8, mode='r'), path)
+        logger.info(f"Loaded recipe catalogue {path} ({len(catalogue)} recipes, version {catalogue.version})")
+        return catalogue
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> 'RecipeCatalogue':
+        """Compile recipe rows into an in-memory catalogue"""
+        return cls(np.frombuffer(cls.compile(rows), dtype=np.uint8))
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict[str, Any]], output_path: str) -> Dict[str, Any]:
+        """Compile recipe rows and write them to a catalogue file"""
+        blob = cls.compile(rows)
+        tmp_path = f'{output_path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(blob)
+        # Atomic replace so running workers never map a half-written file
+        os.replace(tmp_path, output_path)
+        return cls._read_header(np.frombuffer(blob, dtype=np.uint8))[0]
+
+    @staticmethod
+    def compile(rows: Iterable[Dict[str, Any]]) -> bytes:
+        """Compile recipe rows into the binary catalogue format"""
+        recipes = [r for r in (normalize_recipe_row(row) for row in rows) if r is not None]
+        n = len(recipes)
+
+        cuisines = sorted({r['cuisine'] for r in recipes})
+        cuisine_lookup = {c: i for i, c in enumerate(cuisines)}
+
+        features = np.zeros((n, FEATURE_DIM), dtype=np.float32)
+        for i, r in enumerate(recipes):
+            features[i] = encode_features(r['cuisine'], r['dietary_restrictions'], r['health_goals'])
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        features /= norms
+
+        oil_content = np.array([r['oil_content'] for r in recipes], dtype=np.float32)
+        cuisine_codes = np.array([cuisine_lookup[r['cuisine']] for r in recipes], dtype=np.uint16)
+
+        dietary_tags = sorted({t for r in recipes for t in r['dietary_restrictions']})
+        if len(dietary_tags) > MAX_DIETARY_TAGS:
+            raise ValueError(f'At most {MAX_DIETARY_TAGS} distinct dietary restrictions are supported')
+        dietary_bits = {t: 1 << i for i, t in enumerate(dietary_tags)}
+        dietary_masks = np.array(
+            [sum(dietary_bits[t] for t in set(r['dietary_restrictions'])) for r in recipes], dtype=np.uint64
+        )
+        oil_level_codes = np.array([OIL_LEVELS.index(r['oil_level']) for r in recipes], dtype=np.uint8)
+
+        encoded = []
+        for r in recipes:
+            encoded.append(r['id'].encode('utf-8'))
+            encoded.append(r['name'].encode('utf-8'))
+        string_offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum([len(s) for s in encoded], out=string_offsets[1:])
+        strings = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        arrays = {
+            'features': features,
+            'oil_content': oil_content,
+            'cuisine_codes': cuisine_codes,
+            'dietary_masks': dietary_masks,
+            'oil_level_codes': oil_level_codes,
+            'string_offsets': string_offsets,
+            'strings': strings,
+        }
+
+        sections = {}
+        body = io.BytesIO()
+        digest = hashlib.sha256(json.dumps([cuisines, dietary_tags]).encode('utf-8'))
+        for name, array in arrays.items():
+            body.write(b'\0' * (-body.tell() % ALIGNMENT))
+            sections[name] = {'offset': body.tell(), 'dtype': array.dtype.str, 'shape': list(array.shape)}
+            data = np.ascontiguousarray(array).tobytes()
+            digest.update(data)
+            body.write(data)
+
+        header = {
+            'format_version': FORMAT_VERSION,
+            'n_recipes': n,
+            'dim': FEATURE_DIM,
+            'cuisines': cuisines,
+            'dietary_tags': dietary_tags,
+            'oil_levels': OIL_LEVELS,
+            'version': digest.hexdigest()[:16],
+            'sections': sections,
+        }
+        header_bytes = json.dumps(header).encode('utf-8')
+        prefix = FORMAT_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes
+        prefix += b'\0' * (RecipeCatalogue._data_start(len(header_bytes)) - len(prefix))
+
+        return prefix + body.getvalue()
+
+    def __len__(self) -> int:
+        return self.features.shape[0]
+
+    def recipe_id(self, row: int) -> str:
+        return self._string(2 * row)
+
+    def name(self, row: int) -> str:
+        return self._string(2 * row + 1)
+
+    def cuisine(self, row: int) -> str:
+        return self.cuisines[self.cuisine_codes[row]]
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Materialize the public fields of one recipe"""
+        oil_content = float(self.oil_content[row])
+        return {
+            'id': self.recipe_id(row),
+            'name': self.name(row),
+            'cuisine': self.cuisine(row),
+            'oil_content': int(oil_content) if oil_content.is_integer() else oil_content,
+        }
+
+    def _string(self, i: int) -> str:
+        start, stop = int(self._string_offsets[i]), int(self._string_offsets[i + 1])
+        return self._strings[start:stop].tobytes().decode('utf-8')
+
+    @staticmethod
+    def _data_start(header_len: int) -> int:
+        prefix_len = len(FORMAT_MAGIC) + 4 + header_len
+        return prefix_len + (-prefix_len % ALIGNMENT)
+
+    @staticmethod
+    def _read_header(buffer: np.ndarray) -> Tuple[Dict[str, Any], int]:
+        prefix_len = len(FORMAT_MAGIC) + 4
+        if buffer[:len(FORMAT_MAGIC)].tobytes() != FORMAT_MAGIC:
+            raise ValueError('Not a recipe catalogue file')
+
+        (header_len,) = struct.unpack('<I', buffer[len(FORMAT_MAGIC):prefix_len].tobytes())
+        header = json.loads(buffer[prefix_len:prefix_len + header_len].tobytes().decode('utf-8'))
+        if header.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalogue format version: {header.get('format_version')}")
+
+        return header, RecipeCatalogue._data_start(header_len)
+
+
+def normalize_recipe_row(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Normalize one exported row of the backend `recipes` table
+
+    Accepts the backend column names (cuisineType, oilQuantityGrams,
+    servings, dietaryRestrictions, healthBenefits, tags, oilCategory,
+    isActive) as well as the engine's own snake_case fields. Inactive
+    recipes are dropped.
+    """
+    if not _parse_bool(row.get('isActive', row.get('is_active', True))):
+        return None
+
+    if row.get('oil_content') not in (None, ''):
+        oil_content = float(row['oil_content'])
+    else:
+        oil_grams = float(row.get('oilQuantityGrams') or 0)
+        servings = float(row.get('servings') or 0)
+        oil_content = oil_grams / servings if servings > 0 else oil_grams
+
+    oil_level = row.get('oilCategory', row.get('oil_level'))
+    if oil_level not in OIL_LEVELS:
+        oil_level = oil_level_for(oil_content)
+
+    goals = _parse_list(row.get('healthBenefits', row.get('health_benefits'))) + _parse_list(row.get('tags'))
+
+    return {
+        'id': str(row['id']),
+        'name': str(row.get('name', '')),
+        'cuisine': normalize_tag(row.get('cuisineType', row.get('cuisine', 'unknown')) or 'unknown'),
+        'oil_content': oil_content,
+        'oil_level': oil_level,
+        'dietary_restrictions': [normalize_tag(v) for v in _parse_list(row.get('dietaryRestrictions', row.get('dietary_restrictions')))],
+        'health_goals': [normalize_tag(v) for v in goals],
+    }
+
+
+def oil_level_for(oil_content: float) -> str:
+    """Tag a recipe by its oil content per serving"""
+    for level, limit in OIL_LEVEL_LIMITS.items():
+        if oil_content <= limit:
+            return level
+    return 'high-oil'
+
+
+def load_rows(path: str) -> List[Dict[str, Any]]:
+    """Load a JSON or CSV export of the backend `recipes` table"""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    # Accept a bare list or the API envelope {"data": [...]}
+    return data['data'] if isinstance(data, dict) else data
+
+
+def _parse_list(value: Any) -> List[str]:
+    """Parse a jsonb list column that may arrive as a list, JSON text or 'a|b' text"""
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return [str(v) for v in value]
+
+    text = str(value).strip()
+    if text.startswith('['):
+        return [str(v) for v in json.loads(text)]
+    return [v for v in (part.strip() for part in text.replace('|', ',').split(',')) if v]
+
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() not in ('false', 'f', '0', 'no', '')
+    return bool(value)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Offline build command: python -m services.recipe_catalogue build recipes.json -o recipes.cat"""
+    parser = argparse.ArgumentParser(description='Compile the OilWise recipe catalogue')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Compile a JSON or CSV export of the recipes table')
+    build_parser.add_argument('input', help='Path to the recipes export (.json or .csv)')
+    build_parser.add_argument('-o', '--output', required=True, help='Path of the catalogue file to write')
+
+    info_parser = subparsers.add_parser('info', help='Print the header of a compiled catalogue')
+    info_parser.add_argument('path', help='Path to a compiled catalogue file')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        header = RecipeCatalogue.build(load_rows(args.input), args.output)
+    else:
+        header = RecipeCatalogue.open(args.path).header
+
+    json.dump({k: v for k, v in header.items() if k != 'sections'}, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import numpy as np
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RecipeIndex:
+    """Vectorized top-k scorer over a contiguous recipe feature matrix"""
+
+    SIMILARITY_WEIGHT = 0.7
+    OIL_WEIGHT = 0.3
+
+    # Upper bound on the (users x recipes) score block held in memory at once
+    MAX_BLOCK_ELEMENTS = 1 << 22
+
+    def __init__(self, features: np.ndarray, oil_content: np.ndarray, normalized: bool = False):
+        """
+        Build the index
+
+        Args:
+            features: (n_recipes, dim) recipe feature matrix
+            oil_content: (n_recipes,) oil content per recipe
+            normalized: Set when rows are already L2-normalized float32 so
+                they are used as-is without a copy
+        """
+        if normalized:
+            self.features = features
+        else:
+            self.features = self._normalize_rows(np.array(features, dtype=np.float32, ndmin=2))
+
+        oil_content = np.asarray(oil_content, dtype=np.float32)
+        if oil_content.shape != (self.features.shape[0],):
+            raise ValueError('oil_content must have one entry per recipe')
+
+        self.oil_content = oil_content
+        # The oil term does not depend on the user, so fold it in once. Scores
+        # are accumulated in float64 so the oil term keeps its exact value.
+        self.oil_bonus = (1 - oil_content.astype(np.float64) / 10) * self.OIL_WEIGHT
+
+    @classmethod
+    def from_recipes(cls, recipes: List[Dict[str, Any]]) -> 'RecipeIndex':
+        """Build an index from recipe dicts carrying 'features' and 'oil_content'"""
+        features = np.array([recipe['features'] for recipe in recipes], dtype=np.float32, ndmin=2)
+        oil_content = np.array([recipe['oil_content'] for recipe in recipes], dtype=np.float32)
+        return cls(features, oil_content)
+
+    def __len__(self) -> int:
+        return self.features.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.features.shape[1]
+
+    def top_k(self, user_vector: np.ndarray, k: int = 10,
+              rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score recipes against one user vector and keep the best k
+
+        Args:
+            user_vector: (dim,) user preference vector
+            k: Number of recipes to return
+            rows: Optional sorted candidate row ids; only these are scored
+
+        Returns:
+            (row ids, scores), both ordered by descending score
+        """
+        scores = self.scores(user_vector, rows)
+        top = self._select_top_k(scores, k)
+        return (top if rows is None else rows[top]), scores[top]
+
+    def scores(self, user_vector: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Exact blended similarity and oil score of every recipe (or the given rows) for one user"""
+        user_vector = self._normalize_rows(np.array(user_vector, dtype=np.float32, ndmin=2))[0]
+
+        if rows is None:
+            scores = (self.features @ user_vector).astype(np.float64)
+            scores *= self.SIMILARITY_WEIGHT
+            scores += self.oil_bonus
+        else:
+            scores = (self.features[rows] @ user_vector).astype(np.float64)
+            scores *= self.SIMILARITY_WEIGHT
+            scores += self.oil_bonus[rows]
+        return scores
+
+    def top_k_batch(self, user_matrix: np.ndarray, k: int = 10,
+                    rows_list: Optional[Sequence[Optional[np.ndarray]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score many user vectors at once with one matrix-matrix product per block
+
+        Args:
+            user_matrix: (n_users, dim) user preference vectors
+            k: Number of recipes to return per user
+            rows_list: Optional candidate row ids per user (None = all rows);
+                ineligible recipes score -inf
+
+        Returns:
+            (row ids, scores), each (n_users, min(k, n_recipes)) ordered by
+            descending score along each row
+        """
+        users = self._normalize_rows(np.array(user_matrix, dtype=np.float32, ndmin=2))
+        n_users = users.shape[0]
+        k = min(k, len(self))
+
+        rows = np.empty((n_users, k), dtype=np.int64)
+        scores = np.empty((n_users, k), dtype=np.float64)
+
+        block = max(1, self.MAX_BLOCK_ELEMENTS // max(1, len(self)))
+        for start in range(0, n_users, block):
+            stop = min(start + block, n_users)
+            block_scores = (users[start:stop] @ self.features.T).astype(np.float64)
+            block_scores *= self.SIMILARITY_WEIGHT
+            block_scores += self.oil_bonus
+
+            if rows_list is not None:
+                for i, candidates in enumerate(rows_list[start:stop]):
+                    if candidates is not None:
+                        eligible = np.zeros(len(self), dtype=bool)
+                        eligible[candidates] = True
+                        block_scores[i, ~eligible] = -np.inf
+
+            block_rows = self._select_top_k_rows(block_scores, k)
+            rows[start:stop] = block_rows
+            scores[start:stop] = np.take_along_axis(block_scores, block_rows, axis=1)
+
+        return rows, scores
+
+    @staticmethod
+    def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        """L2-normalize rows in place; all-zero rows stay zero"""
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        matrix /= norms
+        return np.ascontiguousarray(matrix)
+
+    @staticmethod
+    def _select_top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k largest scores, largest first"""
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k >= scores.shape[0]:
+            return np.argsort(-scores, kind='stable')
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind='stable')]
+
+    @staticmethod
+    def _select_top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+        """Row-wise indices of the k largest scores, largest first"""
+        if k <= 0:
+            return np.empty((scores.shape[0], 0), dtype=np.int64)
+        if k >= scores.shape[1]:
+            return np.argsort(-scores, axis=1, kind='stable')
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+        return np.take_along_axis(top, order, axis=1)
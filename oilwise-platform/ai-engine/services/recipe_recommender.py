@@ -1,16 +1,37 @@
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import logging
+import os
+
+from services.recipe_catalogue import (
+    RecipeCatalogue, SAMPLE_RECIPES, CUISINE_SLOTS, RESTRICTION_SLOTS, GOAL_SLOTS, FEATURE_DIM
+)
+from services.ann_index import IVFRecipeIndex
+from services.candidate_index import CandidateIndex
+from services.collaborative_filter import CollaborativeModel
+from services.recipe_index import RecipeIndex
+from services.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+STAGES = metrics.stages('recipe_recommender')
+RECOMMENDER_MODES = ('content', 'collaborative', 'blend')
+
 class RecipeRecommender:
     """AI-powered recipe recommendation engine"""
     
-    def __init__(self):
-        self.recipe_features = {}
-        self.user_profiles = {}
+    def __init__(self, catalogue_path: Optional[str] = None):
+        # Load the catalogue once; its features matrix is scored in place
+        self.catalogue = self._load_catalogue(catalogue_path or os.getenv('RECIPE_CATALOGUE_PATH'))
+        self.index_backend = os.getenv('RECIPE_INDEX_BACKEND', 'exact')
+        self.recipe_index = self._build_index(self.index_backend)
+        self.candidate_index = CandidateIndex(self.catalogue)
+        # content scores preferences only; collaborative and blend also use interaction factors for known users
+        self.mode = os.getenv('RECOMMENDER_MODE', 'content')
+        if self.mode not in RECOMMENDER_MODES:
+            raise ValueError(f"Unknown RECOMMENDER_MODE: {self.mode}")
+        self.blend_weight = float(os.getenv('RECOMMENDER_BLEND_WEIGHT', 0.5))
+        self.collaborative = self._load_collaborative(os.getenv('COLLABORATIVE_MODEL_PATH'))
         
     def get_recommendations(self, user_id: str, preferences: Dict[str, Any]) -> List[Dict]:
         """
@@ -24,104 +45,190 @@ class RecipeRecommender:
             List of recommended recipes
         """
         try:
-            # Extract user preferences
-            cuisine_types = preferences.get('cuisinePreferences', [])
-            dietary_restrictions = preferences.get('dietaryRestrictions', [])
-            health_goals = preferences.get('healthGoals', [])
-            
+            watch = STAGES.start()
             # Create user feature vector
-            user_vector = self._create_user_vector(
-                cuisine_types, 
-                dietary_restrictions, 
-                health_goals
-            )
+            user_vector = self._preferences_to_vector(preferences)
+            watch.lap('vector')
             
-            # Get recipe candidates (low-oil recipes)
-            recipe_candidates = self._get_recipe_candidates(cuisine_types)
+            # Prune to eligible recipes, then score them in one pass and keep the top 10
+            candidates = self._select_candidates(preferences)
+            watch.lap('candidates')
+            user_row = self.collaborative.user_row(user_id) if self.collaborative is not None else None
+            if user_row is None:
+                rows, scores = self.recipe_index.top_k(user_vector, k=10, rows=candidates)
+            else:
+                rows, scores = self._top_k_collaborative(user_vector, user_row, k=10, rows=candidates)
+            watch.lap('score_and_sort')
             
-            # Score recipes based on similarity
-            scored_recipes = self._score_recipes(user_vector, recipe_candidates)
-            
-            # Return top recommendations
-            return sorted(scored_recipes, key=lambda x: x['score'], reverse=True)[:10]
+            recipes = self._score_recipes(rows, scores)
+            watch.lap('results')
+            return recipes
             
         except Exception as e:
             logger.error(f"Error in recipe recommendation: {str(e)}")
             return []
     
+    def get_recommendations_batch(self, preferences_list: List[Dict[str, Any]], k: int = 10) -> List[List[Dict]]:
+        """
+        Get recipe recommendations for many users with one matrix product
+        
+        Args:
+            preferences_list: User preferences, one dict per user
+            k: Number of recipes per user
+            
+        Returns:
+            List of recommended recipe lists, in input order
+        """
+        try:
+            if not preferences_list:
+                return []
+            
+            watch = STAGES.start()
+            user_matrix = np.stack([self._preferences_to_vector(p) for p in preferences_list])
+            watch.lap('batch_vector')
+            candidates = [self._select_candidates(p) for p in preferences_list]
+            watch.lap('batch_candidates')
+            rows, scores = self.recipe_index.top_k_batch(user_matrix, k=k, rows_list=candidates)
+            watch.lap('batch_score_and_sort')
+            
+            # Users with fewer than k eligible recipes get -inf padding; drop it
+            eligible = np.isfinite(scores)
+            recipes = [self._score_recipes(r[e], s[e]) for r, s, e in zip(rows, scores, eligible)]
+            watch.lap('batch_results')
+            return recipes
+            
+        except Exception as e:
+            # One malformed preferences dict must not empty every user's results
+            logger.error(f"Error in batch recipe recommendation, falling back per user: {str(e)}")
+            return [self.get_recommendations(None, p)[:k] for p in preferences_list]
+    
+    @property
+    def cache_version(self) -> str:
+        """Changes whenever the same preferences could rank differently"""
+        version = f'{self.catalogue.version}:{self.index_backend}'
+        if self.collaborative is not None:
+            version += f':{self.mode}:{self.blend_weight}:{self.collaborative.version}'
+        return version
+    
+    def personalizes(self, user_id: Optional[str]) -> bool:
+        """Whether the user's recommendations use their interaction factors, not just preferences"""
+        return self.collaborative is not None and self.collaborative.user_row(user_id) is not None
+    
+    def cache_key(self, preferences: Dict[str, Any], user_id: Optional[str] = None) -> Optional[Dict[str, List[str]]]:
+        """
+        Canonical form of the preference fields recommendations depend on
+        
+        Order and duplicates within each list do not change the user vector
+        or the candidate rows, so lists are deduplicated and sorted; other
+        fields are ignored. The user id is part of the key only for users
+        the collaborative model knows. Returns None when the payload is not
+        the usual lists of strings, so unusual requests bypass the cache.
+        """
+        if not isinstance(preferences, dict):
+            return None
+        
+        key = {}
+        for field in ('cuisinePreferences', 'dietaryRestrictions', 'healthGoals', 'oilLevels'):
+            values = preferences.get(field, [])
+            if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+                return None
+            key[field] = sorted(set(values))
+        if self.personalizes(user_id):
+            key['user_id'] = str(user_id)
+        return key
+    
+    def _select_candidates(self, preferences: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Eligible recipe rows for a preferences payload (None = all recipes)"""
+        return self.candidate_index.select(
+            preferences.get('cuisinePreferences', []),
+            preferences.get('dietaryRestrictions', []),
+            preferences.get('oilLevels', [])
+        )
+    
+    def _preferences_to_vector(self, preferences: Dict[str, Any]) -> np.ndarray:
+        """Build the user feature vector from a preferences payload"""
+        return self._create_user_vector(
+            preferences.get('cuisinePreferences', []),
+            preferences.get('dietaryRestrictions', []),
+            preferences.get('healthGoals', [])
+        )
+    
     def _create_user_vector(self, cuisines: List[str], restrictions: List[str], goals: List[str]) -> np.ndarray:
         """Create a feature vector for user preferences"""
-        # This would be expanded with actual feature engineering
-        vector = np.zeros(50)  # 50-dimensional feature space
+        vector = np.zeros(FEATURE_DIM)
         
         # Encode cuisine preferences
-        cuisine_map = {'north_indian': 0, 'south_indian': 5, 'bengali': 10, 'gujarati': 15}
         for cuisine in cuisines:
-            if cuisine in cuisine_map:
-                vector[cuisine_map[cuisine]] = 1
+            if cuisine in CUISINE_SLOTS:
+                vector[CUISINE_SLOTS[cuisine]] = 1
         
         # Encode dietary restrictions
-        restriction_map = {'vegetarian': 20, 'vegan': 21, 'gluten_free': 22}
         for restriction in restrictions:
-            if restriction in restriction_map:
-                vector[restriction_map[restriction]] = 1
+            if restriction in RESTRICTION_SLOTS:
+                vector[RESTRICTION_SLOTS[restriction]] = 1
         
         # Encode health goals
-        goal_map = {'weight_loss': 30, 'diabetes_management': 31, 'heart_health': 32}
         for goal in goals:
-            if goal in goal_map:
-                vector[goal_map[goal]] = 1
+            if goal in GOAL_SLOTS:
+                vector[GOAL_SLOTS[goal]] = 1
         
         return vector
     
-    def _get_recipe_candidates(self, cuisines: List[str]) -> List[Dict]:
-        """Get candidate recipes based on cuisine preferences"""
-        # This would query the database for recipes
-        # For now, return mock data
-        return [
-            {
-                'id': 'recipe_1',
-                'name': 'Low-Oil Dosa',
-                'cuisine': 'south_indian',
-                'oil_content': 3,
-                'features': np.random.rand(50)
-            },
-            {
-                'id': 'recipe_2',
-                'name': 'Steamed Idli',
-                'cuisine': 'south_indian',
-                'oil_content': 1,
-                'features': np.random.rand(50)
-            },
-            {
-                'id': 'recipe_3',
-                'name': 'Grilled Tandoori Chicken',
-                'cuisine': 'north_indian',
-                'oil_content': 2,
-                'features': np.random.rand(50)
-            },
-        ]
+    def _top_k_collaborative(self, user_vector: np.ndarray, user_row: int, k: int,
+                             rows: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Top k by predicted preference, or in blend mode by its weighted sum with the content score"""
+        scores = self.collaborative.scores(user_row, rows)
+        if self.mode == 'blend':
+            scores *= self.blend_weight
+            scores += (1 - self.blend_weight) * self.recipe_index.scores(user_vector, rows)
+        top = RecipeIndex._select_top_k(scores, k)
+        return (top if rows is None else rows[top]), scores[top]
+    
+    def _load_collaborative(self, path: Optional[str]) -> Optional[CollaborativeModel]:
+        """Factors trained for this catalogue (python -m services.collaborative_filter train), if enabled"""
+        if self.mode == 'content':
+            return None
+        if not path:
+            logger.warning(f"RECOMMENDER_MODE={self.mode} but COLLABORATIVE_MODEL_PATH is not set, using content scores")
+            return None
+        return CollaborativeModel.load(path, self.catalogue.version)
+    
+    def _load_catalogue(self, path: Optional[str]) -> RecipeCatalogue:
+        """Memory-map the compiled catalogue, or fall back to the built-in sample recipes"""
+        if path:
+            return RecipeCatalogue.open(path)
+        
+        logger.warning("RECIPE_CATALOGUE_PATH not set, serving the built-in sample recipes")
+        return RecipeCatalogue.from_rows(SAMPLE_RECIPES)
+    
+    def _build_index(self, backend: str) -> RecipeIndex:
+        """Exact brute-force scorer, or an IVF / IVF-PQ approximate one for very large catalogues"""
+        features, oil_content = self.catalogue.features, self.catalogue.oil_content
+        
+        if backend == 'exact':
+            return RecipeIndex(features, oil_content, normalized=True)
+        if backend not in ('ivf', 'ivfpq'):
+            raise ValueError(f"Unknown RECIPE_INDEX_BACKEND: {backend}")
+        
+        trained = None
+        index_path = os.getenv('RECIPE_ANN_INDEX_PATH')
+        if index_path and os.path.exists(index_path):
+            trained = IVFRecipeIndex.load_state(index_path, self.catalogue.version)
+        
+        return IVFRecipeIndex(
+            features, oil_content, normalized=True,
+            n_probe=int(os.getenv('RECIPE_ANN_PROBES', 8)),
+            pq_subspaces=int(os.getenv('RECIPE_ANN_PQ_SUBSPACES', 10)) if backend == 'ivfpq' else 0,
+            trained=trained
+        )
     
-    def _score_recipes(self, user_vector: np.ndarray, recipes: List[Dict]) -> List[Dict]:
-        """Score recipes based on user preferences"""
+    def _score_recipes(self, rows: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        """Materialize response dicts for the already-ranked top rows only"""
         scored = []
         
-        for recipe in recipes:
-            # Calculate similarity
-            similarity = cosine_similarity([user_vector], [recipe['features']])[0][0]
-            
-            # Adjust score based on oil content (prefer lower oil)
-            oil_penalty = recipe['oil_content'] / 10
-            
-            final_score = (similarity * 0.7) + ((1 - oil_penalty) * 0.3)
-            
-            scored.append({
-                'id': recipe['id'],
-                'name': recipe['name'],
-                'cuisine': recipe['cuisine'],
-                'oil_content': recipe['oil_content'],
-                'score': float(final_score)
-            })
+        for row, score in zip(rows.tolist(), scores.tolist()):
+            recipe = self.catalogue.record(row)
+            recipe['score'] = score
+            scored.append(recipe)
         
         return scored
-
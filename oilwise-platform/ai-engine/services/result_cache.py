@@ -0,0 +1,233 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from services.json_encoder import response_encoder
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class ResultCache:
+    """
+    Two-tier cache for deterministic service results
+
+    Keys are a SHA-256 of the canonical JSON of the inputs, prefixed with the
+    cache name and a version (e.g. the recipe catalogue digest), so a new
+    catalogue or rule set never serves stale results: the local tier is
+    cleared when the version changes and the shared tier simply stops
+    matching old keys, which then age out by TTL.
+
+    Tiers:
+        local: bounded in-process LRU with a per-entry TTL
+        shared: optional Redis-compatible client (redis-py API, or
+            services.local_redis.LocalRedis as a local fake), so all
+            workers and pods reuse each other's results
+
+    Only successful results are stored: the services report failures as
+    values (a dict with an 'error' key, or the recommender's empty list)
+    rather than raising, and caching one would repeat it until the TTL.
+
+    Cached results are shared between callers and must be treated as
+    read-only. Hashing the inputs costs a few microseconds, so only cache
+    calls that are clearly slower than that.
+    """
+
+    def __init__(self, name: str, max_entries: int = 10000, ttl: float = 300,
+                 version: Callable[[], str] = lambda: '', shared_client=None,
+                 shared_ttl: Optional[float] = None, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = version
+        self.shared_client = shared_client
+        self.shared_ttl = shared_ttl or ttl
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.stats = {
+            'hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'shared_errors': 0,
+            'uncacheable': 0,
+            'failures_skipped': 0,
+        }
+
+    @classmethod
+    def from_env(cls, name: str, version: Callable[[], str]) -> 'ResultCache':
+        """
+        Cache configured from RESULT_CACHE_*; enabled only for the names in
+        RESULT_CACHE_ENDPOINTS. RESULT_CACHE_MAX_ENTRIES=0 disables the
+        local tier and RESULT_CACHE_SHARED_URL enables the shared one.
+        """
+        endpoints = {n.strip() for n in os.getenv('RESULT_CACHE_ENDPOINTS', 'recommend').split(',') if n.strip()}
+        shared_url = os.getenv('RESULT_CACHE_SHARED_URL')
+        shared_client = None
+        if shared_url:
+            from services.local_redis import redis_client
+
+            shared_client = redis_client(shared_url)
+
+        return cls(
+            name,
+            max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 10000)),
+            ttl=float(os.getenv('RESULT_CACHE_TTL_SECONDS', 300)),
+            version=version,
+            shared_client=shared_client,
+            shared_ttl=float(os.getenv('RESULT_CACHE_SHARED_TTL_SECONDS', 0)) or None,
+            enabled=name in endpoints,
+        )
+
+    def get_or_compute(self, inputs: Any, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached result for inputs, computing and storing it on a miss
+
+        Args:
+            inputs: JSON-serializable canonical form of everything the result
+                depends on, or None to bypass the cache
+            compute: Produces the result on a miss
+        """
+        key = self.key(inputs)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def key(self, inputs: Any) -> Optional[str]:
+        """Cache key for inputs, or None if disabled or they cannot be canonicalized"""
+        if not self.enabled or inputs is None:
+            return None
+        try:
+            canonical = json.dumps(inputs, sort_keys=True, separators=(',', ':'), allow_nan=False)
+        except (TypeError, ValueError):
+            return None
+        digest = hashlib.sha256(canonical.encode()).hexdigest()
+        return f'oilwise:cache:{self.name}:{self.version()}:{digest}'
+
+    def get(self, key: Optional[str]) -> Any:
+        """Cached value for key from the local then the shared tier; None on a miss"""
+        if key is None:
+            if self.enabled:
+                self.stats['uncacheable'] += 1
+            return None
+
+        value = self._get_local(key)
+        if value is not _MISSING:
+            self.stats['hits'] += 1
+            return value
+
+        value = self._get_shared(key)
+        if value is not _MISSING:
+            self.stats['shared_hits'] += 1
+            self._set_local(key, value)
+            return value
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key: Optional[str], value: Any) -> None:
+        """Store a computed result, unless it is a failure (see successful)"""
+        if key is None or value is None:
+            return
+        if not successful(value):
+            self.stats['failures_skipped'] += 1
+            return
+        self._set_local(key, value)
+        self._set_shared(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['shared_hits']) / lookups if lookups else 0.0
+        stats['entries'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        stats['enabled'] = self.enabled
+        stats['version'] = self.version()
+        stats['shared'] = self.shared_client is not None
+        return stats
+
+    def _get_local(self, key: str) -> Any:
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                self.stats['expirations'] += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def _set_local(self, key: str, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_version()
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def _check_version(self) -> None:
+        version = self.version()
+        if version != self._version:
+            if self._version is not None:
+                self.stats['invalidations'] += 1
+                logger.info(f"{self.name} cache version changed to {version}; cleared {len(self._entries)} entries")
+            self._entries.clear()
+            self._version = version
+
+    def _get_shared(self, key: str) -> Any:
+        if self.shared_client is None:
+            return _MISSING
+        try:
+            raw = self.shared_client.get(key)
+        except Exception as e:
+            # The shared tier is an optimization; never fail a request because of it
+            self.stats['shared_errors'] += 1
+            logger.warning(f"{self.name} shared cache read failed: {str(e)}")
+            return _MISSING
+        return _MISSING if raw is None else json.loads(raw)
+
+    def _set_shared(self, key: str, value: Any) -> None:
+        if self.shared_client is None:
+            return
+        try:
+            encoded = response_encoder.dumps(value, sort_keys=False).decode()
+            self.shared_client.set(key, encoded, ex=int(self.shared_ttl))
+        except Exception as e:
+            self.stats['shared_errors'] += 1
+            logger.warning(f"{self.name} shared cache write failed: {str(e)}")
+
+
+def successful(value: Any) -> bool:
+    """
+    False for the results services return from their exception paths: a
+    dict with an 'error' key, or an empty list (get_recommendations). An
+    empty list can also be a genuine answer, but one that is cheap to
+    recompute, so it is never cached either.
+    """
+    if isinstance(value, dict):
+        return 'error' not in value
+    if isinstance(value, list):
+        return len(value) > 0
+    return value is not None
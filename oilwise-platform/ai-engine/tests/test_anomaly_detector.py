@@ -0,0 +1,36 @@
+import pytest
+
+from services.anomaly_detector import AnomalyDetector
+
+
+@pytest.mark.parametrize('value', [None, 'n/a', '', [1], float('nan')])
+def test_non_numeric_single_reading_is_skipped(value):
+    detector = AnomalyDetector()
+    result = detector.process_readings([{'device_id': 'd1', 'value': value}])
+
+    assert result == {'processed': 1, 'skipped': 1, 'anomalies': []}
+    assert detector.device_state('d1') is None
+
+
+def test_non_numeric_readings_in_a_batch_are_skipped():
+    readings = [{'device_id': 'd1', 'value': 10.0}, {'device_id': 'd1', 'value': None},
+                {'device_id': 'd2'}, 'not a reading', {'device_id': 'd1', 'value': '12.5'}]
+    detector = AnomalyDetector()
+    result = detector.process_readings(readings)
+
+    assert result['processed'] == 5
+    assert result['skipped'] == 3
+    assert detector.device_state('d1')['count'] == 2
+    assert detector.device_state('d2') is None
+
+
+def test_skipped_readings_leave_the_detection_unchanged():
+    values = [10.0] * 30 + [80.0]
+    clean = AnomalyDetector().process_readings([{'device_id': 'd1', 'value': v} for v in values])
+    noisy = [{'device_id': 'd1', 'value': v} for v in values]
+    noisy[5:5] = [{'device_id': 'd1', 'value': None}, {'device_id': 'd1', 'value': 'error'}]
+    result = AnomalyDetector().process_readings(noisy)
+
+    assert [event['type'] for event in result['anomalies']] == ['spike']
+    assert result['anomalies'][0]['value'] == clean['anomalies'][0]['value']
+    assert result['anomalies'][0]['index'] == clean['anomalies'][0]['index'] + 2
@@ -0,0 +1,163 @@
+import sys
+
+import pytest
+
+from services import batch_jobs
+from services.batch_jobs import LEASES_KEY, BatchJobManager, JobsUnavailable
+from services.local_redis import LocalRedis
+
+
+class DoublingExecutor:
+    """Batch executor stand-in; on_chunk runs inside each chunk, as a concurrent request would"""
+
+    def __init__(self):
+        self.on_chunk = None
+
+    def run(self, batch_type, chunk):
+        if self.on_chunk is not None:
+            self.on_chunk()
+        return [{'value': item * 2} for item in chunk]
+
+
+@pytest.fixture
+def manager():
+    # No worker threads: the tests run each job with _run, so its timing is fixed
+    return BatchJobManager(DoublingExecutor(), LocalRedis(), workers=0, chunk_size=2, spill_items=100)
+
+
+def pop_and_lease(manager):
+    """What _work does before running a job"""
+    _, job_id = manager.client.blpop([batch_jobs.QUEUE_KEY], timeout=1)
+    manager.client.hset(LEASES_KEY, job_id, batch_jobs.time.time() + manager.lease)
+    return job_id
+
+
+def run_next(manager, token='runner'):
+    job_id = pop_and_lease(manager)
+    manager._run(job_id, token)
+    return job_id
+
+
+def expire_lease(manager, job_id):
+    manager.client.hset(LEASES_KEY, job_id, 0)
+
+
+@pytest.mark.parametrize('n_items', [5, 500])
+def test_cancel_leaves_completed_jobs_and_their_results(manager, n_items):
+    job_id = manager.submit('numbers', list(range(n_items)))['job_id']
+    run_next(manager)
+
+    assert manager.cancel(job_id)
+    assert manager.status(job_id)['status'] == 'completed'
+    page = manager.results(job_id, limit=n_items)
+    assert [row['value'] for row in page['data']] == [i * 2 for i in range(n_items)]
+
+
+def test_cancel_queued_job_drops_its_input(manager):
+    job_id = manager.submit('numbers', [1, 2, 3])['job_id']
+
+    assert manager.cancel(job_id)
+    assert manager.client.get(manager._key(job_id, 'input')) is None
+    run_next(manager)
+    assert manager.status(job_id)['status'] == 'cancelled'
+    assert manager.status(job_id)['done'] == 0
+
+
+@pytest.mark.parametrize('n_items', [5, 500])
+def test_cancel_during_a_chunk_stops_the_job_and_drops_its_results(manager, n_items):
+    job_id = manager.submit('numbers', list(range(n_items)))['job_id']
+    manager.executor.on_chunk = lambda: manager.cancel(job_id)
+    run_next(manager)
+
+    job = manager.status(job_id)
+    assert job['status'] == 'cancelled'
+    # The chunk that was running when the job was cancelled is not stored
+    assert job['done'] == 0
+    assert manager.results(job_id)['data'] == []
+    assert manager.results(job_id)['next_offset'] is None
+    assert not manager.client.keys(manager._key(job_id, '*'))
+
+
+def test_cancel_in_the_last_chunk_is_not_overwritten_by_completion(manager):
+    job_id = manager.submit('numbers', [1, 2])['job_id']
+    manager.executor.on_chunk = lambda: manager.cancel(job_id)
+    run_next(manager)
+
+    assert manager.status(job_id)['status'] == 'cancelled'
+    assert not manager.client.exists(manager._key(job_id, 'results'))
+
+
+def test_cancel_unknown_job(manager):
+    assert not manager.cancel('missing')
+
+
+def test_from_env_disables_the_local_queue_under_several_gunicorn_workers(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'gunicorn', sys)
+    monkeypatch.setenv('GUNICORN_WORKERS', '4')
+    monkeypatch.setenv('JOB_QUEUE_URL', 'local')
+    manager = BatchJobManager.from_env(DoublingExecutor())
+    with pytest.raises(JobsUnavailable, match='JOB_QUEUE_URL'):
+        manager.submit('numbers', [1])
+    with pytest.raises(JobsUnavailable):
+        manager.status('job')
+
+    monkeypatch.setenv('GUNICORN_WORKERS', '1')
+    assert BatchJobManager.from_env(DoublingExecutor()).unavailable is None
+
+
+def test_spilled_results_are_readable_from_another_worker(manager):
+    job_id = manager.submit('numbers', list(range(501)))['job_id']
+    run_next(manager)
+    # Another pod: its own manager on the same store
+    other = BatchJobManager(DoublingExecutor(), manager.client, workers=0, chunk_size=7)
+
+    page = other.results(job_id, offset=97, limit=250)
+    assert [row['value'] for row in page['data']] == [i * 2 for i in range(97, 347)]
+    assert other.results(job_id, offset=500)['data'] == [{'value': 1000}]
+
+
+def test_job_of_a_dead_worker_is_requeued_and_rerun(manager):
+    job_id = manager.submit('numbers', list(range(5)))['job_id']
+    pop_and_lease(manager)  # the worker dies before running it
+    manager._requeue_expired()
+    assert manager.client.llen(batch_jobs.QUEUE_KEY) == 0
+
+    expire_lease(manager, job_id)
+    manager._requeue_expired()
+    run_next(manager)
+
+    assert manager.status(job_id)['status'] == 'completed'
+    assert [row['value'] for row in manager.results(job_id)['data']] == [0, 2, 4, 6, 8]
+    assert not manager.client.hgetall(LEASES_KEY)
+
+
+@pytest.mark.parametrize('n_items', [5, 500])
+def test_stale_runner_stops_when_its_job_is_requeued(manager, n_items):
+    job_id = manager.submit('numbers', list(range(n_items)))['job_id']
+
+    def lease_runs_out():
+        manager.executor.on_chunk = None
+        expire_lease(manager, job_id)
+        manager._requeue_expired()
+
+    manager.executor.on_chunk = lease_runs_out
+    run_next(manager, token='stale')
+    assert manager.status(job_id)['status'] == 'queued'
+    run_next(manager, token='fresh')
+
+    job = manager.status(job_id)
+    assert (job['status'], job['done']) == ('completed', n_items)
+    page = manager.results(job_id, limit=n_items)
+    assert [row['value'] for row in page['data']] == [i * 2 for i in range(n_items)]
+
+
+def test_job_fails_after_max_attempts(manager):
+    job_id = manager.submit('numbers', [1, 2, 3])['job_id']
+    for attempt in range(manager.max_attempts):
+        manager.executor.on_chunk = lambda: (expire_lease(manager, job_id), manager._requeue_expired())
+        run_next(manager, token=f'runner-{attempt}')
+
+    job = manager.status(job_id)
+    assert job['status'] == 'failed'
+    assert 'stopped 3 times' in job['error']
+    assert manager.client.llen(batch_jobs.QUEUE_KEY) == 0
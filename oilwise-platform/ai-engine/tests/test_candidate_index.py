@@ -0,0 +1,15 @@
+from services.candidate_index import CANDIDATE_ROWS_CONSIDERED, CANDIDATE_ROWS_PRUNED, CANDIDATE_SELECTIONS, CandidateIndex
+from services.recipe_catalogue import SAMPLE_RECIPES, RecipeCatalogue
+
+
+def test_selection_counts_pruned_rows_in_the_metrics():
+    index = CandidateIndex(RecipeCatalogue.from_rows(SAMPLE_RECIPES))
+    before = CANDIDATE_SELECTIONS.value, CANDIDATE_ROWS_CONSIDERED.value, CANDIDATE_ROWS_PRUNED.value
+
+    rows = index.select(['south_indian'], [])
+    index.select([], [])
+
+    assert 0 < len(rows) < index.n_recipes
+    assert CANDIDATE_SELECTIONS.value - before[0] == 2
+    assert CANDIDATE_ROWS_CONSIDERED.value - before[1] == 2 * index.n_recipes
+    assert CANDIDATE_ROWS_PRUNED.value - before[2] == index.n_recipes - len(rows)
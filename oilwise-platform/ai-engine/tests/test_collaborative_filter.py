@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from services import collaborative_filter
+from services.collaborative_filter import CollaborativeModel, ImplicitALS, interaction_matrix, load_interactions
+from services.recipe_catalogue import SAMPLE_RECIPES, RecipeCatalogue
+
+scipy_sparse = pytest.importorskip('scipy.sparse')
+
+PREFERENCES = {'cuisine': ['south_indian'], 'dietary_restrictions': ['vegetarian'], 'health_goals': ['heart_health']}
+
+
+def random_interactions(n_users: int, n_items: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    matrix = scipy_sparse.random(n_users, n_items, density=0.2, random_state=seed, dtype=np.float32,
+                                 data_rvs=lambda n: rng.integers(1, 4, n))
+    return matrix.tocsr()
+
+
+def normal_equation_solution(als: ImplicitALS, interactions, y: np.ndarray) -> np.ndarray:
+    """Each row's (Y^T C_u Y + lambda I) x_u = Y^T C_u p_u, solved directly in float64"""
+    y = y.astype(np.float64)
+    base = y.T @ y + als.regularization * np.eye(als.factors)
+    solution = np.empty((interactions.shape[0], als.factors))
+    for u in range(interactions.shape[0]):
+        items = interactions.indices[interactions.indptr[u]:interactions.indptr[u + 1]]
+        confidence = als.alpha * interactions.data[interactions.indptr[u]:interactions.indptr[u + 1]]
+        a = base + (y[items].T * confidence) @ y[items]
+        b = ((1 + confidence)[:, None] * y[items]).sum(axis=0)
+        solution[u] = np.linalg.solve(a, b)
+    return solution
+
+
+@pytest.mark.parametrize('block_nnz', [collaborative_filter.BLOCK_NNZ, 7])
+def test_solve_matches_the_normal_equations(monkeypatch, block_nnz):
+    monkeypatch.setattr(collaborative_filter, 'BLOCK_NNZ', block_nnz)
+    interactions = random_interactions(40, 30)
+    als = ImplicitALS(factors=6, cg_steps=12)
+    rng = np.random.default_rng(1)
+    x = np.zeros((40, 6), dtype=np.float32)
+    y = rng.standard_normal((30, 6)).astype(np.float32)
+
+    als._solve(interactions, x, y)
+
+    expected = normal_equation_solution(als, interactions, y)
+    assert np.linalg.norm(x - expected) / np.linalg.norm(expected) < 5e-6
+
+
+def test_load_interactions_skips_rows_without_a_user(tmp_path):
+    catalogue = RecipeCatalogue.from_rows(SAMPLE_RECIPES)
+    path = tmp_path / 'interactions.csv'
+    path.write_text('user_id,recipe_id,weight\n'
+                    'u1,recipe_1,2\n'
+                    ',recipe_2,1\n'
+                    'u2,recipe_2,\n'
+                    ',recipe_3,5\n'
+                    'u1,unknown,1\n')
+
+    user_ids, users, items, weights = load_interactions(str(path), catalogue)
+
+    assert user_ids == ['u1', 'u2']
+    assert users.tolist() == [0, 1]
+    assert [catalogue.recipe_id(row) for row in items] == ['recipe_1', 'recipe_2']
+    assert weights.tolist() == [2.0, 1.0]
+
+
+def test_blend_mode_uses_content_scores_for_unknown_users(tmp_path, monkeypatch):
+    from services.recipe_recommender import RecipeRecommender
+
+    catalogue = RecipeCatalogue.from_rows(SAMPLE_RECIPES)
+    users, items = np.array([0, 0, 1]), np.array([0, 1, 2])
+    matrix = interaction_matrix(users, items, np.ones(3, dtype=np.float32), 2, len(catalogue))
+    als = ImplicitALS(factors=4, iterations=2).fit(matrix)
+    model_path = str(tmp_path / 'recipes.als.npz')
+    CollaborativeModel.from_training(als, ['u1', 'u2'], catalogue.version).save(model_path)
+
+    monkeypatch.delenv('RECIPE_CATALOGUE_PATH', raising=False)
+    monkeypatch.setenv('RECOMMENDER_MODE', 'content')
+    content = RecipeRecommender()
+    monkeypatch.setenv('RECOMMENDER_MODE', 'blend')
+    monkeypatch.setenv('COLLABORATIVE_MODEL_PATH', model_path)
+    blend = RecipeRecommender()
+
+    assert blend.personalizes('u1') and not blend.personalizes('stranger')
+    expected = content.get_recommendations('stranger', PREFERENCES)
+    assert expected
+    assert blend.get_recommendations('stranger', PREFERENCES) == expected
+    assert blend.get_recommendations(None, PREFERENCES) == expected
@@ -0,0 +1,99 @@
+import io
+import zipfile
+
+import numpy as np
+import pytest
+
+from services.columnar import ARROW_STREAM, JSON, NPY_ZIP, read_columns, response_format, write_columns
+
+
+def npy_bytes(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def npy_zip(members, compression=zipfile.ZIP_STORED) -> bytes:
+    """A zip of raw .npy members, as numpy.savez writes them"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=compression) as archive:
+        for name, data in members.items():
+            archive.writestr(f'{name}.npy', data)
+    return buffer.getvalue()
+
+
+def test_stored_npy_members_are_read_only_views_of_the_body():
+    bmi = np.linspace(18, 40, 1000)
+    body = write_columns({'bmi': bmi, 'cholesterol': np.arange(1000, dtype=np.int32)}, NPY_ZIP)
+    columns = read_columns(body, NPY_ZIP)
+
+    np.testing.assert_array_equal(columns['bmi'], bmi)
+    assert columns['cholesterol'].dtype == np.int32
+    assert np.shares_memory(columns['bmi'], np.frombuffer(body, dtype=np.uint8))
+    assert not columns['bmi'].flags.writeable
+
+
+def test_compressed_npy_members_are_copied():
+    bmi = np.linspace(18, 40, 100)
+    body = npy_zip({'bmi': npy_bytes(bmi)}, compression=zipfile.ZIP_DEFLATED)
+
+    np.testing.assert_array_equal(read_columns(body, NPY_ZIP)['bmi'], bmi)
+
+
+def test_truncated_npy_member_is_rejected():
+    body = npy_zip({'bmi': npy_bytes(np.arange(100, dtype=np.float64))[:-8]})
+
+    with pytest.raises(ValueError, match='truncated'):
+        read_columns(body, NPY_ZIP)
+
+
+@pytest.mark.parametrize('compression', [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_object_columns_are_rejected(compression):
+    body = npy_zip({'bmi': npy_bytes(np.array([22.0, 'x'], dtype=object))}, compression=compression)
+
+    with pytest.raises(ValueError):
+        read_columns(body, NPY_ZIP)
+
+
+def test_columns_of_different_lengths_are_rejected():
+    body = write_columns({'bmi': np.zeros(3), 'cholesterol': np.zeros(4)}, NPY_ZIP)
+
+    with pytest.raises(ValueError, match='differ in length'):
+        read_columns(body, NPY_ZIP)
+
+
+def test_arrow_nulls_become_nan():
+    pa = pytest.importorskip('pyarrow')
+    table = pa.table({'bmi': pa.array([22.5, None, 31.0]), 'cholesterol': pa.array([180, 250, None])})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    columns = read_columns(sink.getvalue().to_pybytes(), ARROW_STREAM)
+
+    np.testing.assert_array_equal(columns['bmi'], [22.5, np.nan, 31.0])
+    np.testing.assert_array_equal(columns['cholesterol'], [180.0, 250.0, np.nan])
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, NPY_ZIP),
+    ('*/*', NPY_ZIP),
+    ('application/json', JSON),
+    ('application/json;q=0.5, application/vnd.apache.arrow.stream', ARROW_STREAM),
+    ('application/x-arrow;q=0.2, application/json;q=0.9', JSON),
+    ('application/x-npz;q=bad, application/json;q=0.1', JSON),
+    ('text/html', NPY_ZIP),
+])
+def test_response_format_follows_the_accept_header(accept, expected):
+    assert response_format(accept, NPY_ZIP) == expected
+
+
+@pytest.mark.parametrize('column', [np.array(['a', 'b']), np.zeros((2, 2))])
+def test_batch_route_rejects_metric_columns_of_the_wrong_type_or_shape(column):
+    from app import app
+
+    body = write_columns({'bmi': column, 'cholesterol': np.array([180.0, 250.0])}, NPY_ZIP)
+    response = app.test_client().post('/api/batch/process?type=health_metrics', data=body,
+                                      content_type=NPY_ZIP)
+
+    assert response.status_code == 400
+    assert 'bmi' in response.get_json()['error']
@@ -0,0 +1,195 @@
+import numpy as np
+import pytest
+
+from services.consumption_predictor import ConsumptionPredictor
+from services.forecast_table import ForecastTable, ForecastTableSource, history_fingerprint, materialize
+
+RTOL = 1e-7
+ATOL = 1e-6
+
+
+@pytest.fixture
+def predictor():
+    return ConsumptionPredictor()
+
+
+def polyfit_reference(values, days):
+    """Slope, forecast and trend as the predictor computed them with np.polyfit"""
+    x = np.arange(len(values))
+    slope = np.polyfit(x, values, 1)[0]
+    forecast = np.maximum(np.poly1d(np.polyfit(x, values, 2))(np.arange(len(values), len(values) + days)), 0)
+    return slope, forecast
+
+
+def series():
+    rng = np.random.default_rng(0)
+    cases = {
+        'short': rng.uniform(10, 60, 3),
+        'short_ints': np.array([20.0, 35.0, 28.0, 41.0]),
+        'constant': np.full(30, 33.3),
+        'constant_short': np.full(3, 12.0),
+        'zeros': np.zeros(10),
+        'long': rng.uniform(0, 120, 2000),
+        'long_trend': 25 + 0.8 * np.arange(365) + rng.normal(0, 5, 365),
+        'falling': 80 - 1.5 * np.arange(60) + rng.normal(0, 2, 60),
+        'curved': 0.05 * (np.arange(90) - 45) ** 2 + rng.normal(0, 1, 90),
+    }
+    cases.update({f'random_{n}': rng.uniform(5, 100, n) for n in (5, 8, 13, 50, 200)})
+    return cases
+
+
+@pytest.mark.parametrize('name, values', sorted(series().items()))
+def test_closed_form_fit_matches_polyfit(predictor, name, values):
+    fit = predictor._fit_series(values)
+    slope, forecast = polyfit_reference(values, predictor.FORECAST_DAYS)
+
+    np.testing.assert_allclose(fit['slope'], slope, rtol=RTOL, atol=ATOL)
+    np.testing.assert_allclose(predictor._predict_next_days(fit, predictor.FORECAST_DAYS), forecast,
+                               rtol=RTOL, atol=ATOL)
+    stats = fit['statistics']
+    np.testing.assert_allclose([stats['mean'], stats['median'], stats['std_dev'], stats['min'], stats['max']],
+                               [values.mean(), np.median(values), values.std(), values.min(), values.max()],
+                               rtol=RTOL, atol=ATOL)
+
+
+@pytest.mark.parametrize('name, values', sorted(series().items()))
+def test_trend_matches_polyfit_away_from_the_threshold(predictor, name, values):
+    slope, _ = polyfit_reference(values, predictor.FORECAST_DAYS)
+    expected = 'increasing' if slope > 0.5 else 'decreasing' if slope < -0.5 else 'stable'
+    assert predictor._calculate_trend(predictor._fit_series(values)) == expected
+
+
+@pytest.mark.parametrize('n', [3, 4, 7, 10, 30, 365, 1000])
+@pytest.mark.parametrize('offset', [0, 10, 33.3, 1000])
+@pytest.mark.parametrize('direction', [1, -1])
+def test_slope_of_exactly_half_is_stable(predictor, n, offset, direction):
+    # np.polyfit lands either side of 0.5 on these lines depending on rounding; the threshold is exclusive
+    def history(slope):
+        values = offset + 1000 * (direction < 0) + direction * slope * np.arange(n)
+        return [{'oil_quantity': value} for value in values.tolist()]
+
+    assert predictor.predict('u', history(0.5))['trend'] == 'stable'
+    assert predictor.predict_many([{'user_id': 'u', 'data': history(0.5)}])[0]['trend'] == 'stable'
+    steeper = 'increasing' if direction > 0 else 'decreasing'
+    assert predictor.predict('u', history(0.5000001))['trend'] == steeper
+    assert predictor.predict_many([{'user_id': 'u', 'data': history(0.5000001)}])[0]['trend'] == steeper
+
+
+def test_batch_matches_single_predictions(predictor):
+    cases = series()
+    items = [{'user_id': name, 'data': [{'oil_quantity': v} for v in values.tolist()]}
+             for name, values in sorted(cases.items())]
+    batch = predictor.predict_many(items)
+    for item, result in zip(items, batch):
+        single = predictor.predict(item['user_id'], item['data'])
+        assert result['trend'] == single['trend']
+        assert result['recommendation'] == single['recommendation']
+        np.testing.assert_allclose(result['predictions']['next_7_days'], single['predictions']['next_7_days'],
+                                   rtol=RTOL, atol=ATOL)
+
+
+def test_batch_medians_are_exact_for_many_segments_and_wide_values(predictor):
+    # Offsetting segments by the value range would lose float64 precision here
+    rng = np.random.default_rng(1)
+    lengths = rng.integers(3, 8, 50000)
+    base = np.repeat(rng.uniform(-1e9, 1e9, len(lengths)), lengths)
+    values = base + rng.uniform(0, 1e-3, int(lengths.sum()))
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    batch = predictor.predict_batch([str(i) for i in range(len(lengths))], values, offsets)
+    expected = [np.median(values[start:stop]) for start, stop in zip(offsets[:-1], offsets[1:])]
+    np.testing.assert_array_equal(batch['median'], expected)
+
+
+def test_predict_many_reports_malformed_items_individually(predictor):
+    history = [{'oil_quantity': 30.0}, {'oil_quantity': 32.0}, {'oil_quantity': 35.0}]
+    items = [{'user_id': 'a', 'data': history}, 'not an item', {'data': history}, {'user_id': 'b', 'data': None}]
+    results = predictor.predict_many(items)
+
+    assert results[0] == predictor.predict('a', history)
+    assert 'error' in results[1]
+    assert results[2] == predictor.predict(None, history)
+    assert 'error' in results[3]
+
+
+@pytest.mark.parametrize('bad', [None, '5', float('nan'), float('inf'), [1]])
+def test_predict_rejects_readings_that_are_not_finite_numbers(predictor, bad):
+    history = [{'oil_quantity': 30.0}, {'oil_quantity': bad}, {'oil_quantity': 35.0}]
+    result = predictor.predict('a', history)
+
+    assert set(result) == {'error'}
+    assert 'oil_quantity' in result['error']
+
+
+def test_predict_many_reports_unusable_readings_per_item(predictor):
+    history = [{'oil_quantity': 30.0}, {'oil_quantity': 32.0}, {'oil_quantity': 35.0}]
+    items = [{'user_id': str(i), 'data': history[:1] + [{'oil_quantity': bad}] + history[1:]}
+             for i, bad in enumerate([10.0, None, 'x', '5', float('nan'), 12.0])]
+    results = predictor.predict_many(items)
+
+    assert results == [predictor.predict(item['user_id'], item['data']) for item in items]
+    assert ['error' in result for result in results] == [False, True, True, True, True, False]
+
+
+def assert_same_prediction(actual, expected):
+    """Equal labels and structure; numbers equal up to rounding of the last bits"""
+    if isinstance(expected, dict):
+        assert actual.keys() == expected.keys()
+        for key in expected:
+            assert_same_prediction(actual[key], expected[key])
+    elif isinstance(expected, list):
+        assert len(actual) == len(expected)
+        for a, e in zip(actual, expected):
+            assert_same_prediction(a, e)
+    elif isinstance(expected, float):
+        np.testing.assert_allclose(actual, expected, rtol=RTOL, atol=ATOL)
+    else:
+        assert actual == expected
+
+
+def history_table(predictor, path, cases):
+    """Materialize a forecast table for the cases, keyed by case name"""
+    user_ids = sorted(cases)
+    lengths = [len(cases[user_id]) for user_id in user_ids]
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    values = np.concatenate([cases[user_id] for user_id in user_ids])
+    materialize(user_ids, values, offsets, str(path), predictor=predictor)
+
+
+def test_forecast_table_hits_match_live_predictions(predictor, tmp_path, monkeypatch):
+    cases = series()
+    history_table(predictor, tmp_path / 'forecasts.fct', cases)
+    source = ForecastTableSource(str(tmp_path / 'forecasts.fct'), ConsumptionPredictor.MODEL_VERSION)
+    tabled = ConsumptionPredictor(forecast_source=source)
+    # Every prediction below must come from the table
+    monkeypatch.setattr(tabled, '_fit_series', lambda values: pytest.fail('predicted live'))
+
+    for name, values in sorted(cases.items()):
+        data = [{'oil_quantity': v} for v in values.tolist()]
+        assert_same_prediction(tabled.predict(name, data), predictor.predict(name, data))
+
+
+def test_forecast_table_for_another_model_version_is_not_served(predictor, tmp_path):
+    values = np.array([20.0, 35.0, 28.0, 41.0])
+    batch = predictor.predict_batch(['a'], values, np.array([0, len(values)]))
+    # A table whose stored forecast would be wrong if it were served
+    batch['predictions'] = np.zeros_like(batch['predictions'])
+    path = str(tmp_path / 'forecasts.fct')
+    ForecastTable.build(batch, np.array([history_fingerprint(values)], dtype=np.uint64),
+                        ConsumptionPredictor.MODEL_VERSION + 1, path)
+    source = ForecastTableSource(path, ConsumptionPredictor.MODEL_VERSION)
+    tabled = ConsumptionPredictor(forecast_source=source)
+    data = [{'oil_quantity': v} for v in values.tolist()]
+
+    assert source.current() is None
+    assert tabled.predict('a', data) == predictor.predict('a', data)
+
+
+def test_changed_history_is_predicted_live(predictor, tmp_path):
+    cases = {'a': np.array([20.0, 35.0, 28.0, 41.0])}
+    history_table(predictor, tmp_path / 'forecasts.fct', cases)
+    source = ForecastTableSource(str(tmp_path / 'forecasts.fct'), ConsumptionPredictor.MODEL_VERSION)
+    tabled = ConsumptionPredictor(forecast_source=source)
+    data = [{'oil_quantity': v} for v in [20.0, 35.0, 28.0, 41.0, 60.0]]
+
+    assert source.current().lookup('a', history_fingerprint(np.array([r['oil_quantity'] for r in data]))) is None
+    assert tabled.predict('a', data) == predictor.predict('a', data)
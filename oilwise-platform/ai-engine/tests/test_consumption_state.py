@@ -0,0 +1,33 @@
+import os
+
+from services.consumption_state import FileStateStore
+
+
+def test_file_store_keeps_similar_user_ids_apart(tmp_path):
+    store = FileStateStore(str(tmp_path))
+    user_ids = ['a/b', 'a b', 'a_b', '../a_b', 'a\\b']
+    for i, user_id in enumerate(user_ids):
+        store.update(user_id, lambda state, i=i: state.update([float(i)] * (i + 1)))
+
+    for i, user_id in enumerate(user_ids):
+        assert store.get(user_id).n == i + 1
+    assert all(os.path.dirname(path) == str(tmp_path) for path in map(store._path, user_ids))
+
+
+def test_file_store_delete_keeps_the_lock_file(tmp_path):
+    store = FileStateStore(str(tmp_path))
+    store.update('user', lambda state: state.update([10.0, 12.0]))
+    store.delete('user')
+
+    assert store.get('user') is None
+    assert os.path.exists(store._path('user') + '.lock')
+    assert store.update('user', lambda state: state.update([5.0])).n == 1
+
+
+def test_append_without_a_user_id_is_rejected():
+    from app import app
+
+    response = app.test_client().post('/api/consumption/append', json={'readings': [{'oil_quantity': 5.0}]})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'error': 'user_id is required'}
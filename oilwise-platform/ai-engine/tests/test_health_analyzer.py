@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from services.health_analyzer import HealthAnalyzer
+
+# Values sitting exactly on every threshold, and just below it
+BOUNDARY_VALUES = {
+    'bmi': [30, 35, 29.999, 34.999, 30.0, 35.0],
+    'daily_oil_intake': [33.3, 49.95, 66.6, 66.61, 0, 33.30001],
+    'blood_pressure_systolic': [140, 160, 139.9, 159.9],
+    'blood_pressure_diastolic': [90, 100, 89.9, 99.9, 0],
+    'cholesterol': [200, 240, 199.9, 239.9],
+}
+RANGES = {
+    'bmi': (15, 45),
+    'daily_oil_intake': (5, 120),
+    'blood_pressure_systolic': (95, 190),
+    'blood_pressure_diastolic': (60, 120),
+    'cholesterol': (140, 300),
+}
+
+
+@pytest.fixture
+def analyzer():
+    return HealthAnalyzer()
+
+
+def random_rows(n_rows, seed):
+    """Rows with missing metrics, ints, floats, boundary values and extra keys"""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n_rows):
+        metrics = {}
+        for name, (low, high) in RANGES.items():
+            roll = rng.random()
+            if roll < 0.15:
+                continue
+            if roll < 0.3:
+                metrics[name] = rng.choice(BOUNDARY_VALUES[name])
+            elif roll < 0.55:
+                metrics[name] = rng.randint(low, high)
+            else:
+                metrics[name] = rng.uniform(low, high)
+        if rng.random() < 0.2:
+            metrics['age'] = rng.randint(18, 80)
+        rows.append(metrics)
+    return rows
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_batch_matches_scalar_on_random_rows(analyzer, seed):
+    rows = random_rows(2000, seed)
+    assert analyzer.assess_risk_batch(rows) == [analyzer.assess_risk(row) for row in rows]
+
+
+@pytest.mark.parametrize('name', sorted(BOUNDARY_VALUES))
+def test_batch_matches_scalar_on_band_boundaries(analyzer, name):
+    rows = [{name: value} for value in BOUNDARY_VALUES[name]]
+    if name == 'blood_pressure_diastolic':
+        # Diastolic only counts alongside systolic
+        rows += [{'blood_pressure_systolic': 120, name: value} for value in BOUNDARY_VALUES[name]]
+    assert analyzer.assess_risk_batch(rows) == [analyzer.assess_risk(row) for row in rows]
+
+
+def test_batch_matches_scalar_on_every_boundary_combination(analyzer):
+    rows = [
+        {'bmi': bmi, 'daily_oil_intake': oil, 'blood_pressure_systolic': systolic, 'cholesterol': cholesterol}
+        for bmi in BOUNDARY_VALUES['bmi']
+        for oil in BOUNDARY_VALUES['daily_oil_intake']
+        for systolic in BOUNDARY_VALUES['blood_pressure_systolic']
+        for cholesterol in BOUNDARY_VALUES['cholesterol']
+    ]
+    assert analyzer.assess_risk_batch(rows) == [analyzer.assess_risk(row) for row in rows]
+
+
+def test_batch_matches_scalar_on_malformed_rows(analyzer):
+    rows = [{'bmi': 'n/a'}, {'blood_pressure_systolic': 150, 'blood_pressure_diastolic': None}, {}, {'bmi': 31}]
+    assert analyzer.assess_risk_batch(rows) == [analyzer.assess_risk(row) for row in rows]
@@ -0,0 +1,35 @@
+import json
+
+import numpy as np
+import pytest
+
+from services.json_encoder import ResponseEncoder, numpy_default
+
+pytest.importorskip('orjson')
+
+PAYLOADS = [
+    {'a': np.float32(0.1)},
+    {'values': np.array([0.1, 1 / 3, 2.5], dtype=np.float32), 'half': np.float16(0.1)},
+    {'scores': np.linspace(0, 1, 7), 'counts': np.arange(5, dtype=np.int8), 'mask': np.array([True, False])},
+    {'none': None, 'nan': float('nan')},
+    {'none': None, 'values': [1.0, (2.0, float('-inf'))]},
+    {'none': None, 'array': np.array([1.0, np.nan]), 'scalar': np.float64('inf')},
+    {'strided': np.arange(12, dtype=np.float64).reshape(3, 4)[:, 1], 'big_endian': np.arange(3, dtype='>f8')},
+]
+
+
+def stdlib_dumps(obj) -> bytes:
+    return json.dumps(obj, default=numpy_default, sort_keys=True, separators=(',', ':')).encode()
+
+
+@pytest.mark.parametrize('payload', PAYLOADS)
+def test_orjson_bytes_match_the_standard_library(payload):
+    assert ResponseEncoder('orjson').dumps(payload) == stdlib_dumps(payload)
+
+
+def test_none_without_non_finite_floats_stays_on_the_fast_path():
+    encoder = ResponseEncoder('orjson')
+    payload = {'data': [{'risk_score': 0.5, 'note': None, 'scores': np.array([0.25, 1.0])}] * 3}
+
+    assert encoder.dumps(payload) == stdlib_dumps(payload)
+    assert encoder.stats == {'fast': 1, 'fallback': 0}
@@ -0,0 +1,74 @@
+from collections import Counter
+
+from services.local_redis import LocalRedis, WatchError
+from services.profile_store import RedisProfileStore, UserProfile
+
+
+class CountingRedis(LocalRedis):
+    """
+    LocalRedis that counts transactions and can play another writer
+
+    conflict(), if set, runs once just before the next EXEC, which then
+    fails with WatchError as a real Redis would after the watched key changed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.transactions = 0
+        self.conflict = None
+
+    def pipeline(self):
+        pipe = super().pipeline()
+        execute = pipe.execute
+
+        def checked_execute():
+            self.transactions += 1
+            if self.conflict is not None:
+                conflict, self.conflict = self.conflict, None
+                pipe.reset()
+                conflict()
+                raise WatchError()
+            return execute()
+
+        pipe.execute = checked_execute
+        return pipe
+
+
+def profile(i: int, state: str = 'Kerala') -> UserProfile:
+    return UserProfile(f'user-{i}', state=state, district=f'd{i % 3}', age_group='adult', bmi_category='normal')
+
+
+def expected_counts(store: RedisProfileStore, user_ids) -> Counter:
+    return Counter(store.get(user_id).segment() for user_id in user_ids)
+
+
+def test_put_many_is_one_transaction_per_batch():
+    store = RedisProfileStore(CountingRedis())
+    store.put_many([profile(i) for i in range(RedisProfileStore.BATCH_SIZE + 10)])
+
+    assert store.client.transactions == 2
+    assert store.get('user-3').state == 'Kerala'
+    assert sum(store.segment_counts().values()) == RedisProfileStore.BATCH_SIZE + 10
+
+
+def test_put_many_replaces_profiles_and_moves_their_segment_counts():
+    store = RedisProfileStore(CountingRedis())
+    store.put_many([profile(i) for i in range(10)])
+    store.put_many([profile(i, state='Goa') for i in range(5)] + [profile(4, state='Assam')])
+
+    user_ids = [f'user-{i}' for i in range(10)]
+    assert store.get('user-4').state == 'Assam'
+    assert store.segment_counts() == expected_counts(store, user_ids)
+
+
+def test_put_many_writes_conflicting_keys_one_at_a_time():
+    store = RedisProfileStore(CountingRedis())
+    store.put_many([profile(i) for i in range(10)])
+    store.client.conflict = lambda: store.put(profile(2, state='Punjab'))
+    store.put_many([profile(i, state='Goa') for i in range(10)])
+
+    user_ids = [f'user-{i}' for i in range(10)]
+    assert {store.get(user_id).state for user_id in user_ids} == {'Goa'}
+    assert store.segment_counts() == expected_counts(store, user_ids)
+    # the failed batch, the conflicting put, user-2 on its own and the retried batch
+    assert store.client.transactions == 1 + 4
@@ -0,0 +1,31 @@
+import pytest
+
+from services.local_redis import LocalRedis
+from services.result_cache import ResultCache
+
+
+@pytest.fixture(params=['local', 'shared'])
+def cache(request):
+    if request.param == 'local':
+        return ResultCache('test')
+    return ResultCache('test', max_entries=0, shared_client=LocalRedis())
+
+
+@pytest.mark.parametrize('failure', [{'error': 'Invalid metrics'}, []])
+def test_failures_are_recomputed(cache, failure):
+    results = iter([failure, [{'id': 1}]])
+    compute = lambda: next(results)
+
+    assert cache.get_or_compute({'user': 1}, compute) == failure
+    assert cache.get_or_compute({'user': 1}, compute) == [{'id': 1}]
+    assert cache.get_or_compute({'user': 1}, compute) == [{'id': 1}]
+    assert cache.stats['failures_skipped'] == 1
+
+
+def test_successful_results_are_cached(cache):
+    calls = []
+    compute = lambda: calls.append(1) or {'risk_level': 'low', 'risk_score': 0}
+
+    for _ in range(3):
+        assert cache.get_or_compute({'bmi': 22}, compute) == {'risk_level': 'low', 'risk_score': 0}
+    assert len(calls) == 1